@@ -114,6 +114,8 @@ PROGRAM calc_etadot
   INTEGER MDPDETA,METAPAR
   REAL RLO0, RLO1, RLA0, RLA1
   CHARACTER*300 MLEVELIST
+  CHARACTER*300 MCACHEDIR
+  LOGICAL LEGCACHED
 
   INTEGER MAUF, MANF,IFAX(10)
 
@@ -126,9 +128,11 @@ PROGRAM calc_etadot
     MLEVEL,MLEVELIST,MNAUF,METAPAR, &
     RLO0, RLO1, RLA0, RLA1, &
     MOMEGA,MOMEGADIFF,MGAUSS,MSMOOTH,META,METADIFF,&
-    MDPDETA
+    MDPDETA,MCACHEDIR
 
   LTEST=1
+! no cache for the Legendre tables unless a directory is given
+  MCACHEDIR=''
 
   CALL POSNAM (4,'NAMGEN')
   READ (4,NAMGEN)
@@ -213,11 +217,16 @@ PROGRAM calc_etadot
 
     PI=ACOS(-1.D0)
 
+!! The tables only depend on the grid, try to read them from the cache
+    CALL LEGREAD(MCACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1, &
+      BREITE,Z,GBREITE,WEIGHT,P,PP,LEGCACHED)
+
+    IF (.NOT. LEGCACHED) THEN
 !$OMP PARALLEL DO
-    DO 20 J=1,MAXB
-      BREITE(J)=SIN((RLA1-(J-1.D0)*(RLA1-RLA0)/(MAXB-1))* PI/180.D0)
-      CALL PLGNFA(MNAUF,BREITE(J),Z(0,J))
-20  CONTINUE
+      DO 20 J=1,MAXB
+        BREITE(J)=SIN((RLA1-(J-1.D0)*(RLA1-RLA0)/(MAXB-1))* PI/180.D0)
+        CALL PLGNFA(MNAUF,BREITE(J),Z(0,J))
+20    CONTINUE
 !$OMP END PARALLEL DO
 
 ! Avoid possible Pole problem
@@ -226,19 +235,23 @@ PROGRAM calc_etadot
 
 !* Initialisation of fields for FFT and Legendre transformation
 ! to Gaussian grid and back to phase space
-    X1=-1.D0
-    X2=1.D0
-    CALL GAULEG(X1,X2,GBREITE,WEIGHT,NGJ)
+      X1=-1.D0
+      X2=1.D0
+      CALL GAULEG(X1,X2,GBREITE,WEIGHT,NGJ)
 
 !$OMP PARALLEL DO PRIVATE(M)
-    DO J=1,NGJ/2
-      CALL PLGNFA(MNAUF,GBREITE(J),P(:,J))
-      DO M=0,(MNAUF+3)*(MNAUF+4)/2
-        PP(J,M)=P(M,J)
+      DO J=1,NGJ/2
+        CALL PLGNFA(MNAUF,GBREITE(J),P(:,J))
+        DO M=0,(MNAUF+3)*(MNAUF+4)/2
+          PP(J,M)=P(M,J)
+        END DO
       END DO
-    END DO
 !$OMP END PARALLEL DO
 
+      CALL LEGWRITE(MCACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1, &
+        BREITE,Z,GBREITE,WEIGHT,P)
+    END IF ! LEGCACHED
+
 !       MPAR(1)=152
     FILENAME='fort.12' 
 !!  read LNSP in SH
@@ -273,6 +286,8 @@ PROGRAM calc_etadot
 
 !!  Transformieren des Windes auf das Gaussgitter  
     CALL PHGR213(XMN,UGVG,GWSAVE,GIFAX,P,MLAT,MNAUF,NGI,NGJ,2*MLEVEL)
+! JSPPOLE is taken from EMOSLIB, which does not guarantee thread safety,
+! therefore this loop stays serial
     DO K=1,MLEVEL
 ! North Pole
       CALL JSPPOLE(XMN(:,K),1,MNAUF,.TRUE.,CUA(:,:,K))
@@ -282,9 +297,11 @@ PROGRAM calc_etadot
       CALL JSPPOLE(XMN(:,MLEVEL+K),-1,MNAUF,.TRUE.,CVA(:,3:4,K))
     END DO
 
+!$OMP PARALLEL DO
     DO K=1,2*MLEVEL
       IF (MSMOOTH .ne. 0) CALL SPFILTER(XMN(:,K),MNAUF,MSMOOTH)
     END DO
+!$OMP END PARALLEL DO
     CALL PHGCUT(XMN,UV,WSAVE,IFAX,Z,MNAUF,MNAUF,MAUF,MANF,MAXL,MAXB,2*MLEVEL)
 
 
@@ -309,9 +326,11 @@ PROGRAM calc_etadot
     CALL GRPH213(XMN,ETAG,GWSAVE,GIFAX,PP,WEIGHT,MLAT,MNAUF,NGI,NGJ,MLEVEL)
      CALL STATIS(MAXL,MAXB,1,ETAG,RMS,MW,SIG)
      WRITE(*,'(A,T20,3p,3F12.4)') 'STATISTICS ETAG-PS: ',RMS,MW,SIG
+!$OMP PARALLEL DO
     DO K=1,MLEVEL
       IF (MSMOOTH .ne. 0) CALL SPFILTER(XMN(:,K),MNAUF,MSMOOTH)
     END DO
+!$OMP END PARALLEL DO
 
     CALL PHGCUT(XMN,ETA,WSAVE,IFAX,Z,MNAUF,MNAUF,MAUF,MANF,MAXL,MAXB,MLEVEL)
     CALL STATIS(MAXL,MAXB,1,ETA,RMS,MW,SIG)
@@ -333,9 +352,11 @@ PROGRAM calc_etadot
       CALL OMEGA(PSG,DPSDL,DPSDM,DG,UGVG(:,1),UGVG(:,MLEVEL+1), &
         GBREITE,ETAG,MLAT,AK,BK,NGI ,NGJ,MLEVEL)
       CALL GRPH213(XMN,ETAG,GWSAVE,GIFAX,PP,WEIGHT,MLAT,MNAUF,NGI,NGJ,MLEVEL)
+!$OMP PARALLEL DO
       DO K=1,MLEVEL
         IF (MSMOOTH .ne. 0) CALL SPFILTER(XMN(:,K),MNAUF,MSMOOTH)
       END DO
+!$OMP END PARALLEL DO
       CALL PHGCUT(XMN,OM,WSAVE,IFAX,Z,MNAUF,MNAUF,MAUF,MANF,MAXL,MAXB,MLEVEL)
 
     END IF ! MOMEGA
@@ -793,13 +814,19 @@ SUBROUTINE STATIS (NI,NJ,NK,PHI,RMS,MW,SIG)
   RMS=0.
   MW=0.
 ! 10.86 sinstead of 11.04 sec
-      DO 10 K=1,NK
-    DO 10 J=1,NJ
-  DO 10 I=1,NI
+! the statistics are only printed, so the changed order of the summation
+! in the parallel reduction does not affect the output fields
+!$OMP PARALLEL DO PRIVATE(I,K,P) REDUCTION(+:RMS,MW)
+  DO J=1,NJ
+    DO K=1,NK
+      DO I=1,NI
         P=PHI(I,J,K)
         RMS=RMS+P*P
         MW=MW+P
-10 CONTINUE
+      END DO
+    END DO
+  END DO
+!$OMP END PARALLEL DO
 
   RMS=SQRT(RMS/N)
   MW=MW/N
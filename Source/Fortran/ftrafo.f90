@@ -395,6 +395,7 @@ CONTAINS
     IMPLICIT NONE
 
     INTEGER NI,NJ,NK,I,J,K,MLAT(NJ),L
+    INTEGER IND(NJ)
 
     REAL A(NK+1),B(NK+1)
     REAL PS(NI),DPSDL(NI),DPSDM(NI)
@@ -403,11 +404,18 @@ CONTAINS
 
     REAL DIVT1,DIVT2,POB,PUN,DPSDT,COSB
 
-    L=0
+! offset of each latitude in the field, so that latitudes are independent
+    IND(1)=0
+    DO 5 J=2,NJ
+      IND(J)=IND(J-1)+MLAT(J-1)
+5   CONTINUE
+
+!$OMP PARALLEL DO SCHEDULE(DYNAMIC) &
+!$OMP PRIVATE(I,K,L,COSB,DIVT1,DIVT2,POB,PUN,DPSDT)
     DO 4 J=1,NJ
       COSB=(1.0-BREITE(J)*BREITE(J))
       DO 3 I=1,MLAT(J)
-        L=L+1
+        L=IND(J)+I
         DIVT1=0.0
         DIVT2=0.0
         DO 1 K=1,NK
@@ -431,6 +439,7 @@ CONTAINS
         PS(L)=DPSDT*PS(L)
 3     CONTINUE
 4   CONTINUE
+!$OMP END PARALLEL DO
 
     RETURN
 
@@ -451,6 +460,7 @@ CONTAINS
     IMPLICIT NONE
 
     INTEGER I,J,K,L,NGI,NGJ,MKK,MLAT(NGJ)
+    INTEGER IND(NGJ)
 
     REAL PS(NGI),DPSDL(NGI),DPSDM(NGI),A(MKK+1),B(MKK+1)
     REAL DIV(NGI,MKK),U(NGI,MKK),V(NGI,MKK),E(NGI,MKK)
@@ -459,11 +469,18 @@ CONTAINS
     REAL DIVT1,DIVT2,POB,PUN,DP,X,Y,COSB
     REAL DIVT3(MKK+2)
 
-    L=0
+! offset of each latitude in the field, so that latitudes are independent
+    IND(1)=0
+    DO 5 J=2,NGJ
+      IND(J)=IND(J-1)+MLAT(J-1)
+5   CONTINUE
+
+!$OMP PARALLEL DO SCHEDULE(DYNAMIC) &
+!$OMP PRIVATE(I,K,L,COSB,DIVT1,DIVT2,DIVT3,POB,PUN,DP,X,Y)
     DO 4 J=1,NGJ
       COSB=(1.0-BREITE(J)*BREITE(J))
       DO 3 I=1,MLAT(J)
-        L=L+1
+        L=IND(J)+I
         DIVT1=0.0
         DIVT2=0.0
         DIVT3(1)=0.0
@@ -496,6 +513,7 @@ CONTAINS
 1       CONTINUE
 3     CONTINUE
 4   CONTINUE
+!$OMP END PARALLEL DO
 
     RETURN
 
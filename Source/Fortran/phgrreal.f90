@@ -513,4 +513,169 @@ CONTAINS
     
   END SUBROUTINE SPFILTER
 
+  SUBROUTINE LEGNAME(CACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1,FNAME)
+
+!! Name of the cache file for the Legendre functions and Gaussian weights
+! The name contains everything the tables depend on:
+! MNAUF, NGJ, MAXB and RLA0, RLA1 in thousandths of a degree
+
+    IMPLICIT NONE
+
+    CHARACTER*(*) CACHEDIR,FNAME
+    INTEGER MNAUF,NGJ,MAXB
+    REAL RLA0,RLA1
+
+    WRITE(FNAME,'(A,A,I0,A,I0,A,I0,A,I0,A,I0,A)') TRIM(CACHEDIR), &
+      '/LEGENDRE_T',MNAUF,'_NG',NGJ,'_B',MAXB, &
+      '_',NINT(RLA0*1000.D0),'_',NINT(RLA1*1000.D0),'.bin'
+
+    RETURN
+
+  END SUBROUTINE LEGNAME
+
+  SUBROUTINE LEGREAD(CACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1, &
+    BREITE,Z,GBREITE,WEIGHT,P,PP,FOUND)
+
+!! Read the Legendre functions Z (regular latitudes), P and PP
+!! (Gaussian latitudes), the Gaussian latitudes and weights from the cache
+! FOUND is .FALSE. if no cache directory is given or the file is missing,
+! does not match the header or is incomplete.
+! In this case the tables have to be calculated.
+
+    IMPLICIT NONE
+
+    CHARACTER*(*) CACHEDIR
+    INTEGER MNAUF,NGJ,MAXB
+    REAL RLA0,RLA1
+    REAL BREITE(MAXB),Z(0:((MNAUF+3)*(MNAUF+4))/2,MAXB)
+    REAL GBREITE(NGJ),WEIGHT(NGJ)
+    REAL P(0:((MNAUF+3)*(MNAUF+4))/2,NGJ/2)
+    REAL PP(NGJ/2,0:((MNAUF+3)*(MNAUF+4))/2)
+    LOGICAL FOUND
+
+    CHARACTER*400 FNAME
+    INTEGER LUNIT,IOS,HMNAUF,HNGJ,HMAXB
+    REAL HRLA0,HRLA1
+
+    FOUND=.FALSE.
+    IF (LEN_TRIM(CACHEDIR) .EQ. 0) RETURN
+
+    CALL LEGNAME(CACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1,FNAME)
+    INQUIRE(FILE=TRIM(FNAME),EXIST=FOUND)
+    IF (.NOT. FOUND) RETURN
+
+    OPEN(NEWUNIT=LUNIT,FILE=TRIM(FNAME),ACCESS='STREAM', &
+      FORM='UNFORMATTED',STATUS='OLD',ACTION='READ',IOSTAT=IOS)
+    IF (IOS .EQ. 0) THEN
+      READ(LUNIT,IOSTAT=IOS) HMNAUF,HNGJ,HMAXB,HRLA0,HRLA1
+      IF (IOS .EQ. 0) THEN
+        IF (HMNAUF .NE. MNAUF .OR. HNGJ .NE. NGJ .OR. HMAXB .NE. MAXB &
+          .OR. HRLA0 .NE. RLA0 .OR. HRLA1 .NE. RLA1) IOS=-1
+      END IF
+      IF (IOS .EQ. 0) READ(LUNIT,IOSTAT=IOS) BREITE,Z,GBREITE,WEIGHT,P
+! an invalid file is left in place, LEGWRITE replaces it
+      CLOSE(LUNIT)
+    END IF
+
+    FOUND=(IOS .EQ. 0)
+    IF (FOUND) THEN
+      PP=TRANSPOSE(P)
+      WRITE(*,*) 'LEGENDRE TABLES READ FROM CACHE ',TRIM(FNAME)
+    ELSE
+      WRITE(*,*) 'IGNORING INVALID LEGENDRE CACHE ',TRIM(FNAME)
+    END IF
+
+    RETURN
+
+  END SUBROUTINE LEGREAD
+
+  SUBROUTINE LEGWRITE(CACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1, &
+    BREITE,Z,GBREITE,WEIGHT,P)
+
+!! Write the tables calculated by PLGNFA and GAULEG to the cache file,
+!! so that later runs with the same grid only have to read them
+! PP is not stored as it is just the transpose of P.
+! The tables are written to a temporary file of this process, which is
+! renamed to the cache file when it is complete. Thus concurrent runs
+! never read a partially written cache file.
+! Errors are ignored, the cache is only a speed-up.
+
+    USE ISO_C_BINDING, ONLY: C_INT, C_CHAR, C_NULL_CHAR, C_SIZE_T
+
+    IMPLICIT NONE
+
+    INTERFACE
+      INTEGER(C_INT) FUNCTION C_RENAME(OLD,NEW) BIND(C,NAME='rename')
+        IMPORT C_INT, C_CHAR
+        CHARACTER(KIND=C_CHAR) OLD(*),NEW(*)
+      END FUNCTION C_RENAME
+      INTEGER(C_INT) FUNCTION C_GETPID() BIND(C,NAME='getpid')
+        IMPORT C_INT
+      END FUNCTION C_GETPID
+      INTEGER(C_INT) FUNCTION C_GETHOSTNAME(NAME,LEN) &
+        BIND(C,NAME='gethostname')
+        IMPORT C_INT, C_CHAR, C_SIZE_T
+        CHARACTER(KIND=C_CHAR) NAME(*)
+        INTEGER(C_SIZE_T), VALUE :: LEN
+      END FUNCTION C_GETHOSTNAME
+    END INTERFACE
+
+    CHARACTER*(*) CACHEDIR
+    INTEGER MNAUF,NGJ,MAXB
+    REAL RLA0,RLA1
+    REAL BREITE(MAXB),Z(0:((MNAUF+3)*(MNAUF+4))/2,MAXB)
+    REAL GBREITE(NGJ),WEIGHT(NGJ)
+    REAL P(0:((MNAUF+3)*(MNAUF+4))/2,NGJ/2)
+
+    CHARACTER*400 FNAME
+    CHARACTER*500 TMPNAME
+    CHARACTER(KIND=C_CHAR) HOST(256)
+    CHARACTER*256 HOSTNAME
+    INTEGER LUNIT,IOS,I
+
+    IF (LEN_TRIM(CACHEDIR) .EQ. 0) RETURN
+
+    CALL LEGNAME(CACHEDIR,MNAUF,NGJ,MAXB,RLA0,RLA1,FNAME)
+
+! the name of the temporary file is unique also for runs on other hosts
+! which share the cache directory
+    HOST=C_NULL_CHAR
+    HOSTNAME=''
+    IF (C_GETHOSTNAME(HOST,INT(SIZE(HOST)-1,C_SIZE_T)) .EQ. 0) THEN
+      DO I=1,SIZE(HOST)-1
+        IF (HOST(I) .EQ. C_NULL_CHAR) EXIT
+        HOSTNAME(I:I)=HOST(I)
+      END DO
+    END IF
+    WRITE(TMPNAME,'(A,A,A,A,I0)') TRIM(FNAME),'.tmp.',TRIM(HOSTNAME), &
+      '.',C_GETPID()
+
+    OPEN(NEWUNIT=LUNIT,FILE=TRIM(TMPNAME),ACCESS='STREAM', &
+      FORM='UNFORMATTED',STATUS='REPLACE',ACTION='WRITE',IOSTAT=IOS)
+    IF (IOS .NE. 0) RETURN
+
+    WRITE(LUNIT,IOSTAT=IOS) MNAUF,NGJ,MAXB,RLA0,RLA1
+    IF (IOS .EQ. 0) WRITE(LUNIT,IOSTAT=IOS) BREITE,Z,GBREITE,WEIGHT,P
+    IF (IOS .EQ. 0) THEN
+      CLOSE(LUNIT,IOSTAT=IOS)
+    ELSE
+      CLOSE(LUNIT,STATUS='DELETE')
+      RETURN
+    END IF
+
+! the rename is atomic; a cache file of a concurrent run has the same
+! content and is replaced
+    IF (IOS .EQ. 0) IOS=C_RENAME(TRIM(TMPNAME)//C_NULL_CHAR, &
+      TRIM(FNAME)//C_NULL_CHAR)
+    IF (IOS .EQ. 0) THEN
+      WRITE(*,*) 'LEGENDRE TABLES WRITTEN TO CACHE ',TRIM(FNAME)
+    ELSE
+      OPEN(NEWUNIT=LUNIT,FILE=TRIM(TMPNAME),STATUS='OLD',IOSTAT=IOS)
+      IF (IOS .EQ. 0) CLOSE(LUNIT,STATUS='DELETE')
+    END IF
+
+    RETURN
+
+  END SUBROUTINE LEGWRITE
+
 END MODULE PHTOGR
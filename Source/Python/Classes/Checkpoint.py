@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import json
+import hashlib
+
+# software specific modules from flex_extract
+#pylint: disable=wrong-import-position
+sys.path.append('../')
+from Mods.tools import silent_remove
+#pylint: enable=wrong-import-position
+
+# ------------------------------------------------------------------------------
+# CLASS
+# ------------------------------------------------------------------------------
+
+class Checkpoint(object):
+    """Record of the completed units of work of the preparation of a run.
+
+    A unit is e.g. the deaccumulation of an ensemble member, the creation
+    of a FLEXPART input file or its post-processing. Each completed unit
+    is appended as a line to the file checkpoint.<ppid>.jsonl in the input
+    directory, with a hash of its inputs and the size and modification
+    time of its output files. If the preparation of the run stopped, a
+    rerun with the same ppid skips the units whose inputs are unchanged
+    and whose output files are still intact. The retrieval is recorded as
+    well, so that a rerun keeps the retrieved files, which are the inputs
+    of the other units.
+
+    The first line of the file holds a hash of the settings of the run. A
+    file of a run with other settings is discarded. The lines are appended
+    with a single write, so that the worker processes can add their units
+    to the same file.
+
+    Attributes
+    ----------
+    path : str
+        Path to the checkpoint file.
+
+    signature : str
+        Hash of the settings of the run.
+
+    units : dict
+        The record of each completed unit, with the keys "inputs" and
+        "outputs".
+    """
+
+    # the settings which do not change the results
+    volatile = ['etadot_workers', 'etadot_threads', 'autotune',
+                'member_workers', 'postproc_workers', 'job_workers',
+                'disk_budget', 'debug', 'request', 'profiling',
+                'memory_profiling', 'checkpoint', 'mailfail', 'mailops']
+
+    # --------------------------------------------------------------------------
+    # CLASS METHODS
+    # --------------------------------------------------------------------------
+    def __init__(self, c):
+        """Reads the completed units of a previous attempt of the run, if
+        its settings were the same. Otherwise a new checkpoint file is
+        started.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        Return
+        ------
+
+        """
+
+        self.path = os.path.join(os.path.abspath(c.inputdir),
+                                 'checkpoint.' + str(c.ppid) + '.jsonl')
+        self.signature = mk_signature(c, self.volatile)
+        self.units = {}
+
+        if os.path.isfile(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            lines = data.decode(errors='replace').splitlines()
+            if lines and _parse(lines[0]).get('signature') == self.signature:
+                for line in lines[1:]:
+                    # the last line is incomplete if the run was killed
+                    # while writing it
+                    record = _parse(line)
+                    if 'unit' in record:
+                        self.units[record.pop('unit')] = record
+                # the incomplete line is cut off, so that the next unit
+                # starts on a line of its own
+                if not data.endswith(b'\n'):
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(data.rfind(b'\n') + 1)
+                return
+
+        # the header is written at once, so that no workers append to an
+        # outdated file
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(json.dumps({'signature': self.signature}) + '\n')
+        os.rename(self.path + '.tmp', self.path)
+
+        return
+
+    @property
+    def resumed(self):
+        """True if units of the preparation of a previous attempt of the
+        run were completed. The retrieval of the current attempt precedes
+        the preparation, therefore it is not counted."""
+        return any(unit != 'retrieval' for unit in self.units)
+
+    def record(self, unit):
+        """Returns the record of a completed unit.
+
+        Parameters
+        ----------
+        unit : str
+            The name of the unit, e.g. "create.EN12010100".
+
+        Return
+        ------
+        record : dict
+            The inputs and outputs of the unit, None if it was not
+            completed.
+        """
+
+        return self.units.get(unit)
+
+    def done(self, unit, inputs=None, then=None):
+        """Checks whether a unit was completed and need not be repeated.
+
+        Parameters
+        ----------
+        unit : str
+            The name of the unit.
+
+        inputs : str, optional
+            The hash of the current inputs of the unit, which has to be
+            the same as the recorded one. Default value is None, which
+            skips this check.
+
+        then : list of str, optional
+            The units which consumed the outputs of the unit. If all of
+            them were completed, the outputs need not exist any more.
+            Default value is None.
+
+        Return
+        ------
+        done : bool
+            True if the unit can be skipped.
+        """
+
+        record = self.units.get(unit)
+        if record is None:
+            return False
+        if inputs is not None and record['inputs'] != inputs:
+            return False
+        if file_stats(sorted(record['outputs'])) == \
+           [record['outputs'][path] for path in sorted(record['outputs'])]:
+            return True
+
+        return bool(then) and all(self.done(later) for later in then)
+
+    def complete(self, unit, outputs, inputs=None):
+        """Records a completed unit.
+
+        Parameters
+        ----------
+        unit : str
+            The name of the unit.
+
+        outputs : list of str
+            Paths of the files created by the unit.
+
+        inputs : str, optional
+            The hash of the inputs of the unit. Default value is None.
+
+        Return
+        ------
+
+        """
+
+        outputs = sorted(outputs)
+        record = {'inputs': inputs,
+                  'outputs': dict(zip(outputs, file_stats(outputs)))}
+        self.units[unit] = record
+
+        line = json.dumps(dict(record, unit=unit), sort_keys=True) + '\n'
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+        return
+
+    def remove(self):
+        """Removes the checkpoint file after the run was completed.
+
+        Parameters
+        ----------
+
+        Return
+        ------
+
+        """
+
+        silent_remove(self.path)
+        self.units = {}
+
+        return
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def file_stats(paths):
+    '''Returns the size and modification time of files.
+
+    Parameters
+    ----------
+    paths : list of str
+        Paths to the files.
+
+    Return
+    ------
+    stats : list of list of int
+        Size and modification time in nanoseconds for each file, None for
+        a missing file.
+    '''
+
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stats.append(None)
+            continue
+        stats.append([stat.st_size, stat.st_mtime_ns])
+
+    return stats
+
+def mk_hash(*items):
+    '''Creates a hash of the inputs of a unit.
+
+    Parameters
+    ----------
+    items : list
+        Values which can be written as JSON, e.g. the file stats of the
+        input files or the records of preceding units.
+
+    Return
+    ------
+    hash : str
+        The SHA-1 hash of the values.
+    '''
+
+    return hashlib.sha1(json.dumps(items, sort_keys=True).encode()
+                        ).hexdigest()
+
+def mk_signature(c, volatile=()):
+    '''Creates a hash of the settings of a run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    volatile : list of str, optional
+        The settings which are left out.
+
+    Return
+    ------
+    signature : str
+        The hash of the settings.
+    '''
+
+    return mk_hash(sorted((key, str(value))
+                          for key, value in vars(c).items()
+                          if key not in volatile))
+
+def _parse(line):
+    '''Reads a line of the checkpoint file.
+
+    Parameters
+    ----------
+    line : str
+        A line of the checkpoint file.
+
+    Return
+    ------
+    record : dict
+        The content of the line, empty if it is not valid.
+    '''
+
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {}
+
+    return record if isinstance(record, dict) else {}
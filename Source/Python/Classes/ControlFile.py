@@ -46,13 +46,18 @@ import sys
 sys.path.append('../')
 import _config
 from Mods.tools import my_error
+from Mods.errors import ControlFileError
 from Mods.checks import (check_grid, check_area, check_levels, check_purefc,
                          check_step, check_mail, check_queue, check_pathes,
                          check_dates, check_maxstep, check_type, check_request,
                          check_basetime, check_public, check_acctype,
                          check_acctime, check_accmaxstep, check_time,
                          check_logicals_type, check_len_type_time_step,
-                         check_addpar, check_job_chunk, check_number)
+                         check_addpar, check_job_chunk, check_number,
+                         check_workers, check_packing, check_disk_budget,
+                         check_statedir, check_streaming, check_positive,
+                         check_profiling, check_work_queue,
+                         check_bounded_disk)
 #pylint: enable=wrong-import-position
 
 # ------------------------------------------------------------------------------
@@ -73,7 +78,8 @@ class ControlFile(object):
     ----------
     controlfile : str
         The name of the control file to be processed. Default value is the
-        filename passed to the init function when initialised.
+        filename passed to the init function when initialised, None if
+        the settings come from a dictionary.
 
     start_date : str
         The first day of the retrieval period. Default value is None.
@@ -210,6 +216,14 @@ class ControlFile(object):
     format : str
         The format of the GRIB data. Default value is 'GRIB1'.
 
+    packing : str
+        Packing settings per parameter for the output files, e.g.
+        '130:16/Q:24:grid_second_order/ALL:24'. Each setting gives the
+        parameter (name, id or ALL), the bits per value and optionally
+        the packing type (grid_simple, grid_second_order or, for GRIB2,
+        grid_ccsds; the eccodes library of FLEXPART must support it).
+        Default value is None, which keeps the packing of ACCURACY.
+
     addpar : str
         List of additional surface level ECMWF parameter to be retrieved.
         Default value is None.
@@ -299,7 +313,8 @@ class ControlFile(object):
 
     request : int
         Switch to select between just retrieving the data (0), writing the mars
-        parameter values to a csv file (1) or doing both (2).
+        parameter values to a csv file (1), doing both (2) or only planning
+        the run with an estimate of its size and duration (3).
         Default value is 0.
 
     public : int
@@ -327,22 +342,130 @@ class ControlFile(object):
         Switch to select the calculation of extra ensemble members for the
         ELDA stream. It doubles the amount of retrieved ensemble members.
 
+    cachedir : str
+        Path to a directory where the Fortran program stores the Legendre
+        tables and Gaussian weights of a grid, so that subsequent runs on
+        the same grid can read them instead of recalculating them.
+        Default value is None, which disables the cache.
+
+    etadot_workers : int
+        Number of calc_etadot processes which run concurrently, each for
+        another time step. Default value is 1.
+
+    etadot_threads : int
+        Number of OpenMP threads for each calc_etadot process.
+        Default value is None, which keeps the OMP_NUM_THREADS setting of
+        the environment.
+
+    autotune : int
+        Switch to select the number of calc_etadot processes and threads
+        by a short calibration (1) instead of taking etadot_workers and
+        etadot_threads (0). The result is stored per grid in the cache
+        directory (or the Run directory) and reused. Default value is 0.
+
+    member_workers : int
+        Number of processes which work concurrently on the ensemble
+        members, each member in its own scratch directory, and on the
+        time steps when doubling the ELDA members. Default value is 1.
+
+    postproc_workers : int
+        Number of processes which convert the output files concurrently.
+        The same number of threads transfers the files with ectrans and
+        ecp. Default value is 1.
+
+    job_workers : int
+        Number of processes which retrieve and prepare the job chunks of
+        JOB_CHUNK days at the same time on the local side, each in its own
+        input directory. Not used with RRINT 1 or in incremental mode,
+        which need the whole period. Default value is None, which is the
+        number of cores.
+
+    bounded_disk : int
+        Switch to retrieve and prepare the data in periods of JOB_CHUNK
+        (or DATE_CHUNK) days, one after the other, and to remove the
+        retrieved and flux files as soon as they are processed (1), instead
+        of retrieving the whole period first (0). Not available with
+        RRINT 1 or in incremental mode, which need the whole period.
+        Default value is 0.
+
+    disk_budget : int
+        Disk space in MB for the intermediate files in the input directory
+        in bounded-disk mode. The retrieval of the next period pauses while
+        it is exceeded. Default value is None, which retrieves only the
+        next period in advance.
+
+    statedir : str
+        Path to a directory where the state of the flux deaccumulation is
+        kept for the next run (incremental mode). A run which starts the
+        day after the previous one ended continues with this state and
+        retrieves only the new flux data. Not available with RRINT 1, in
+        pure forecast mode or with BASETIME. Default value is None, which
+        disables the incremental mode.
+
+    streaming : int
+        Switch for the streaming mode of operational runs with BASETIME (1).
+        Each time step is retrieved as soon as it is available and its
+        FLEXPART input file is moved to the output directory at once,
+        instead of retrieving the whole cycle first (0). Default value is 0.
+
+    stream_poll : int
+        Seconds between two requests for a time step which is not yet
+        available in streaming mode. Default value is 60.
+
+    stream_timeout : int
+        Minutes after the start of the streaming mode until which the
+        requests for missing time steps are repeated. Default value is 180.
+
+    profiling : int
+        Records the stages of the run with wall-clock and CPU time, bytes
+        read and written and message counts, and writes a JSON summary
+        into the input directory (1). With 2 each stage is also profiled
+        with cProfile. Default value is 0, which switches it off.
+
+    memory_profiling : int
+        Records the peak memory of the stages with the high-water mark of
+        the resident set size and with tracemalloc, the peak resident set
+        size of the Fortran program and the largest allocation sites of the
+        stages in the profiling summary (1). Default value is 0, which
+        switches it off.
+
+    checkpoint : int
+        Records each completed unit of the preparation, like the
+        deaccumulation of an ensemble member or a FLEXPART input file, in
+        a checkpoint file in the input directory (1). If the preparation
+        stops, a rerun with the same ppid skips the units whose inputs are
+        unchanged and whose output files are intact. The retrieval is
+        skipped as well if its files are intact. Default value is 0,
+        which switches it off.
+
+    work_queue : str
+        Path to a queue directory on a file system shared by several
+        workers, e.g. on different nodes, which extract the period
+        together. Each worker claims periods of JOB_CHUNK days (DATE_CHUNK
+        days without JOB_CHUNK), retrieves and prepares them and moves the
+        files to the output directory. Not available with RRINT 1, in
+        bounded-disk, streaming or incremental mode. Default value is None,
+        which disables the work-queue mode.
+
     logicals : list of str
         List of the names of logical switches which controls the flow
         of the program. Default list is ['gauss', 'omega', 'omegadiff', 'eta',
         'etadiff', 'dpdeta', 'cwc', 'wrf', 'ecstorage',
-        'ectrans', 'debug', 'request', 'public', 'purefc', 'rrint', 'doubleelda']
+        'ectrans', 'debug', 'request', 'public', 'purefc', 'rrint', 'doubleelda',
+        'autotune', 'bounded_disk', 'streaming', 'memory_profiling',
+        'checkpoint']
     '''
 
-    def __init__(self, filename):
+    def __init__(self, filename=None):
         '''Initialises the instance of ControlFile class and defines
         all class attributes with default values. Afterwards calls
         function __read_controlfile__ to read parameter from Control file.
 
         Parameters
         ----------
-        filename : str
-            Name of CONTROL file.
+        filename : str, optional
+            Name of CONTROL file. If it is None, only the default values
+            are set. Default value is None.
 
         Return
         ------
@@ -389,6 +512,7 @@ class ControlFile(object):
         self.dpdeta = 1
         self.smooth = 0
         self.format = 'GRIB1'
+        self.packing = None
         self.addpar = None
         self.prefix = 'EN'
         self.cwc = 0
@@ -418,16 +542,61 @@ class ControlFile(object):
         self.purefc = 0
         self.rrint = 0
         self.doubleelda = 0
+        self.cachedir = None
+        self.etadot_workers = 1
+        self.etadot_threads = None
+        self.autotune = 0
+        self.member_workers = 1
+        self.postproc_workers = 1
+        self.job_workers = None
+        self.bounded_disk = 0
+        self.disk_budget = None
+        self.statedir = None
+        self.streaming = 0
+        self.stream_poll = 60
+        self.stream_timeout = 180
+        self.profiling = 0
+        self.memory_profiling = 0
+        self.checkpoint = 0
+        self.work_queue = None
 
         self.logicals = ['gauss', 'omega', 'omegadiff', 'eta', 'etadiff',
                          'dpdeta', 'cwc', 'wrf', 'ecstorage',
                          'ectrans', 'debug', 'oper', 'request', 'public',
-                         'purefc', 'rrint', 'doubleelda']
+                         'purefc', 'rrint', 'doubleelda', 'autotune',
+                         'bounded_disk', 'streaming', 'memory_profiling',
+                         'checkpoint']
 
-        self._read_controlfile()
+        if filename is not None:
+            self._read_controlfile()
 
         return
 
+    @classmethod
+    def from_dict(cls, settings):
+        '''Creates a ControlFile instance from a dictionary instead of
+        a CONTROL file.
+
+        The names and values are interpreted as in a CONTROL file, e.g.
+        "class" is stored as "marsclass", values of None or "None" as None
+        and lists or tuples as lists of strings.
+
+        Parameters
+        ----------
+        settings : dict
+            Contains the CONTROL parameter names (case insensitive) and
+            their values.
+
+        Return
+        ------
+        c : ControlFile
+            Contains the default values overwritten by the settings.
+        '''
+        c = cls()
+        c.assign_dict_to_control(settings)
+
+        return c
+
     def _read_controlfile(self):
         '''Read CONTROL file and assign all CONTROL file variables.
 
@@ -448,7 +617,8 @@ class ControlFile(object):
             print('Either it does not exist or its syntax is wrong.')
             print('Try "' + sys.argv[0].split('/')[-1] + \
                       ' -h" to print usage information')
-            sys.exit(1)
+            raise ControlFileError('Could not read CONTROL file "' +
+                                   cfile + '"', code=1)
 
         # go through every line and store parameter
         for ldata in fdata:
@@ -460,41 +630,63 @@ class ControlFile(object):
                 ldata = ldata.split('#')[0]
             data = ldata.split()
             if len(data) > 1:
-                if 'm_' in data[0].lower():
-                    data[0] = data[0][2:]
-                if data[0].lower() == 'class':
-                    data[0] = 'marsclass'
-                if data[0].lower() == 'day1':
-                    data[0] = 'start_date'
-                if data[0].lower() == 'day2':
-                    data[0] = 'end_date'
-                if len(data) == 2:
-                    if '$' in data[1]:
-                        setattr(self, data[0].lower(), data[1])
-                        while '$' in data[1]:
-                            i = data[1].index('$')
-                            j = data[1].find('{')
-                            k = data[1].find('}')
-                            var = os.getenv(data[1][j+1:k])
-                            if var is not None:
-                                data[1] = data[1][:i] + var + data[1][k+1:]
-                            else:
-                                my_error('Could not find variable '
-                                         + data[1][j+1:k] + ' while reading ' +
-                                         self.controlfile)
-                        setattr(self, data[0].lower() + '_expanded', data[1])
-                    else:
-                        if data[1].lower() != 'none':
-                            setattr(self, data[0].lower(), data[1])
-                        else:
-                            setattr(self, data[0].lower(), None)
-                elif len(data) > 2:
-                    setattr(self, data[0].lower(), (data[1:]))
+                self._set_parameter(data[0], data[1:])
             else:
                 pass
 
         return
 
+    def _set_parameter(self, name, values):
+        '''Assigns a single CONTROL parameter.
+
+        Parameters
+        ----------
+        name : str
+            Name of the parameter as in the CONTROL file.
+
+        values : list of str
+            The values of the parameter. A single value is stored as
+            string, more values as list.
+
+        Return
+        ------
+
+        '''
+        data = [name] + list(values)
+
+        if 'm_' in data[0].lower():
+            data[0] = data[0][2:]
+        if data[0].lower() == 'class':
+            data[0] = 'marsclass'
+        if data[0].lower() == 'day1':
+            data[0] = 'start_date'
+        if data[0].lower() == 'day2':
+            data[0] = 'end_date'
+        if len(data) == 2:
+            if '$' in data[1]:
+                setattr(self, data[0].lower(), data[1])
+                while '$' in data[1]:
+                    i = data[1].index('$')
+                    j = data[1].find('{')
+                    k = data[1].find('}')
+                    var = os.getenv(data[1][j+1:k])
+                    if var is not None:
+                        data[1] = data[1][:i] + var + data[1][k+1:]
+                    else:
+                        my_error('Could not find variable '
+                                 + data[1][j+1:k] + ' while reading ' +
+                                 str(self.controlfile), ControlFileError)
+                setattr(self, data[0].lower() + '_expanded', data[1])
+            else:
+                if data[1].lower() != 'none':
+                    setattr(self, data[0].lower(), data[1])
+                else:
+                    setattr(self, data[0].lower(), None)
+        elif len(data) > 2:
+            setattr(self, data[0].lower(), (data[1:]))
+
+        return
+
     def __str__(self):
         '''Prepares a string which have all the ControlFile class attributes
         with its associated values. Each attribute is printed in one line and
@@ -551,6 +743,32 @@ class ControlFile(object):
 
         return
 
+    def assign_dict_to_control(self, settings):
+        '''Overwrites the existing ControlFile instance attributes with
+        the settings of a dictionary, interpreted as in a CONTROL file.
+
+        Parameters
+        ----------
+        settings : dict
+            Contains the CONTROL parameter names (case insensitive) and
+            their values.
+
+        Return
+        ------
+
+        '''
+
+        for name, value in settings.items():
+            if isinstance(value, (list, tuple)):
+                values = [str(v) for v in value]
+            elif isinstance(value, bool):
+                values = [str(int(value))]
+            else:
+                values = [str(value)]
+            self._set_parameter(name, values)
+
+        return
+
     def assign_envs_to_control(self, envs):
         '''Assigns the ECMWF environment parameter.
 
@@ -648,6 +866,40 @@ class ControlFile(object):
 
         self.number = check_number(self.number)
 
+        self.etadot_workers = check_workers(self.etadot_workers)
+
+        self.etadot_threads = check_workers(self.etadot_threads)
+
+        self.member_workers = check_workers(self.member_workers)
+
+        self.postproc_workers = check_workers(self.postproc_workers)
+
+        self.job_workers = check_workers(self.job_workers)
+
+        self.packing = check_packing(self.packing, self.format)
+
+        self.disk_budget = check_disk_budget(self.disk_budget)
+
+        self.bounded_disk = check_bounded_disk(self.bounded_disk, self.rrint,
+                                               self.statedir)
+
+        self.statedir = check_statedir(self.statedir, self.rrint,
+                                       self.purefc, self.basetime)
+
+        self.streaming = check_streaming(self.streaming, self.basetime,
+                                         self.rrint, self.bounded_disk)
+
+        self.stream_poll = check_positive(self.stream_poll, 'STREAM_POLL')
+
+        self.stream_timeout = check_positive(self.stream_timeout,
+                                             'STREAM_TIMEOUT')
+
+        self.profiling = check_profiling(self.profiling)
+
+        self.work_queue = check_work_queue(self.work_queue, self.rrint,
+                                           self.bounded_disk, self.streaming,
+                                           self.statedir)
+
         return
 
     def to_list(self):
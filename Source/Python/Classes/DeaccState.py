@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import glob
+import json
+import shutil
+from datetime import datetime, timedelta
+
+# software specific modules from flex_extract
+#pylint: disable=wrong-import-position
+sys.path.append('../')
+from Mods.tools import (silent_remove, make_dir,
+                        generate_retrieval_period_boundary)
+#pylint: enable=wrong-import-position
+
+# ------------------------------------------------------------------------------
+# CLASS
+# ------------------------------------------------------------------------------
+
+class DeaccState(object):
+    """State of the deaccumulation of the flux data at the end of a run.
+
+    The disaggregation of a flux time step needs the neighbouring
+    accumulation intervals. Therefore each run retrieves an extra day of
+    flux data at both ends. In incremental mode the last intervals of a
+    run are stored in the state directory, together with the flux files
+    which were completed beyond the end of the run. The next run on the
+    following days continues the deaccumulation with this state. It
+    retrieves only the flux data after the last day of the previous run,
+    and its results are identical to those of one long run.
+
+    The state directory contains the file deacc_state.json, a file
+    deacc_state<member>.npz with the last intervals of each ensemble
+    member (the member part is empty without ensemble members) and the
+    flux files.
+
+    Attributes
+    ----------
+    path : str
+        Path to the state directory.
+
+    lastdate : str
+        The last date of the flux data of the previous run, e.g. '20120104'.
+        None if there is no state.
+
+    signature : dict
+        The settings of the previous run which must not change between
+        the runs. None if there is no state.
+    """
+
+    filename = 'deacc_state.json'
+
+    # --------------------------------------------------------------------------
+    # CLASS METHODS
+    # --------------------------------------------------------------------------
+    def __init__(self, path):
+        """Reads the state from the state directory, if there is one.
+
+        Parameters
+        ----------
+        path : str
+            Path to the state directory.
+
+        Return
+        ------
+
+        """
+
+        self.path = os.path.abspath(path)
+        self.lastdate = None
+        self.signature = None
+
+        statefile = os.path.join(self.path, self.filename)
+        if os.path.isfile(statefile):
+            with open(statefile) as f:
+                state = json.load(f)
+            self.lastdate = state['lastdate']
+            self.signature = state['signature']
+
+        return
+
+    def usable(self, c):
+        """Checks whether the run continues the previous one.
+
+        The run has to start at the last date of the flux data of the
+        previous run, which is the day after its end date, and the
+        settings must not have changed.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        Return
+        ------
+        usable : bool
+            True if the deaccumulation can continue with the state.
+        """
+
+        return self.lastdate == c.start_date and \
+            self.signature == mk_signature(c)
+
+    def restore(self, inputdir):
+        """Copies the flux files of the state to the input directory.
+
+        Parameters
+        ----------
+        inputdir : str
+            Path to the directory of the flux files of the current run.
+
+        Return
+        ------
+
+        """
+
+        for fluxfile in glob.glob(os.path.join(self.path, 'flux*')):
+            shutil.copy(fluxfile, inputdir)
+
+        return
+
+    def load_window(self, suffix, pars):
+        """Reads the last intervals of an ensemble member.
+
+        Parameters
+        ----------
+        suffix : str
+            The ensemble member part of the file names, e.g. '.N001', or an
+            empty string without ensemble members.
+
+        pars : list of int
+            The parameter ids of the flux fields.
+
+        Return
+        ------
+        orig_vals : dict of list of array
+            The last accumulated fields per parameter.
+
+        deac_vals : dict of list of array
+            The last deaccumulated fields per parameter.
+        """
+        import numpy as np
+
+        orig_vals = dict((p, []) for p in pars)
+        deac_vals = dict((p, []) for p in pars)
+
+        windowfile = os.path.join(self.path, 'deacc_state' + suffix + '.npz')
+        if not os.path.isfile(windowfile):
+            return orig_vals, deac_vals
+
+        with np.load(windowfile) as window:
+            for key in sorted(window.files,
+                              key=lambda k: int(k.split('_')[2])):
+                kind, par, _ = key.split('_')
+                if kind == 'orig':
+                    orig_vals[int(par)].append(window[key])
+                else:
+                    deac_vals[int(par)].append(window[key])
+
+        return orig_vals, deac_vals
+
+    def save(self, c):
+        """Replaces the state by the one of the current run.
+
+        The last intervals were stored by EcFlexpart.deacc_fluxes in the
+        input directory of the run. The flux files after the end of the run
+        are kept as well, except for the empty ones, which are completed
+        by the next run.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line, with the input directory of the run.
+
+        Return
+        ------
+
+        """
+
+        if not os.path.isdir(self.path):
+            make_dir(self.path)
+        for oldfile in glob.glob(os.path.join(self.path, 'deacc_state*')) + \
+                       glob.glob(os.path.join(self.path, 'flux*')):
+            silent_remove(oldfile)
+
+        for windowfile in glob.glob(os.path.join(c.inputdir,
+                                                 'deacc_state*.npz')):
+            shutil.move(windowfile, self.path)
+
+        _, end_period = generate_retrieval_period_boundary(c)
+        for fluxfile in glob.glob(os.path.join(c.inputdir, 'flux*')):
+            if _flux_time(fluxfile) > end_period and \
+               os.path.getsize(fluxfile) > 0:
+                shutil.copy(fluxfile, self.path)
+
+        self.lastdate = (datetime.strptime(c.end_date, '%Y%m%d') +
+                         timedelta(days=1)).strftime('%Y%m%d')
+        self.signature = mk_signature(c)
+
+        # the description is written last, so that an incomplete state
+        # is not used
+        statefile = os.path.join(self.path, self.filename)
+        with open(statefile + '.tmp', 'w') as f:
+            json.dump({'lastdate': self.lastdate,
+                       'signature': self.signature}, f, indent=1)
+        os.rename(statefile + '.tmp', statefile)
+
+        return
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def save_window(inputdir, suffix, orig_vals, deac_vals):
+    '''Stores the last intervals of an ensemble member in the input
+    directory of the run.
+
+    Parameters
+    ----------
+    inputdir : str
+        Path to the input directory of the run.
+
+    suffix : str
+        The ensemble member part of the file names, e.g. '.N001', or an
+        empty string without ensemble members.
+
+    orig_vals : dict of list of array
+        The accumulated fields per parameter. The last one is stored.
+
+    deac_vals : dict of list of array
+        The deaccumulated fields per parameter. The last three are stored.
+
+    Return
+    ------
+
+    '''
+    import numpy as np
+
+    window = {}
+    for par in orig_vals:
+        for i, values in enumerate(orig_vals[par][-1:]):
+            window['orig_{}_{}'.format(par, i)] = values
+        for i, values in enumerate(deac_vals[par][-3:]):
+            window['deac_{}_{}'.format(par, i)] = values
+
+    np.savez(os.path.join(inputdir, 'deacc_state' + suffix + '.npz'),
+             **window)
+
+    return
+
+def mk_signature(c):
+    '''Collects the settings which determine the flux data.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    signature : dict
+        The settings as strings.
+    '''
+
+    return dict((key, str(getattr(c, key, None)))
+                for key in ['marsclass', 'stream', 'number', 'dtime', 'grid',
+                            'area', 'gauss', 'acctype', 'acctime',
+                            'accmaxstep'])
+
+def _flux_time(fluxfile):
+    '''Returns the time of a flux file, e.g. flux2012010406.N001.
+
+    Parameters
+    ----------
+    fluxfile : str
+        Path to the flux file.
+
+    Return
+    ------
+    time : datetime
+        The date and hour of the flux fields.
+    '''
+
+    return datetime.strptime(os.path.basename(fluxfile)[4:14], '%Y%m%d%H')
@@ -63,9 +63,20 @@ from __future__ import print_function
 
 import os
 import sys
+import copy
 import glob
+import fnmatch
+import hashlib
+import time
 import shutil
+import subprocess
+import threading
 from datetime import datetime, timedelta
+from collections import OrderedDict
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
 
 # software specific classes and modules from flex_extract
 #pylint: disable=wrong-import-position
@@ -75,10 +86,20 @@ from Classes.GribUtil import GribUtil
 from Mods.tools import (init128, to_param_id, silent_remove, product,
                         my_error, get_informations, get_dimensions,
                         execute_subprocess, to_param_id_with_tablenumber,
-                        generate_retrieval_period_boundary)
+                        generate_retrieval_period_boundary, make_dir,
+                        move_file)
+from Mods.errors import FlexExtractError, ProcessingError
 from Classes.MarsRetrieval import MarsRetrieval
-from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace
+from Classes.DeaccState import DeaccState, save_window
+from Classes.Checkpoint import file_stats, mk_hash
+from Classes.Manifest import Manifest, describe_file
+from Mods.autotune import (available_cores, grid_signature, candidate_splits,
+                           autotune_file, read_autotune, write_autotune,
+                           calibrate)
 import Mods.disaggregation as disaggregation
+from Mods.profiling import (span, count, file_sizes, memory_checkpoint,
+                            wait_process)
 #pylint: enable=wrong-import-position
 # ------------------------------------------------------------------------------
 # CLASS
@@ -102,6 +123,10 @@ class EcFlexpart(object):
     inputdir : str
         Path to the directory where the retrieved data is stored.
 
+    ppid : str
+        Identifies the run in the names of the retrieved files. Default
+        value is the parent process id.
+
     dataset : str
         For public datasets there is the specific naming and parameter
         dataset which has to be used to characterize the type of
@@ -172,6 +197,28 @@ class EcFlexpart(object):
     outputfilelist : list of str
         The final list of FLEXPART ready input files.
 
+    packing : dict
+        The bits per value and packing type for the output files per
+        parameter id, 'ALL' for all other parameters. Empty if the
+        packing is not changed.
+
+    packing_stats : dict
+        Input bytes, output bytes and maximum absolute quantization error
+        per parameter id of the repacked messages.
+
+    requests : list of dict
+        Collects the parameters of the MARS requests instead of submitting
+        them, if it is not None.
+
+    checkpoint : Checkpoint
+        Records the completed units of work, so that a rerun can skip
+        them. None if no checkpoint is kept.
+
+    manifest : dict
+        The valid time, ensemble member, number of GRIB messages and
+        checksum of each output file, collected while the files are
+        written for the output manifest.
+
     types : dictionary
         Determines the combination of type of fields, time and forecast step
         to be retrieved.
@@ -217,6 +264,7 @@ class EcFlexpart(object):
         self.mreq_count = 0
 
         self.inputdir = c.inputdir
+        self.ppid = str(getattr(c, 'ppid', None) or os.getppid())
         self.dataset = c.dataset
         self.basetime = c.basetime
         self.dtime = c.dtime
@@ -238,6 +286,11 @@ class EcFlexpart(object):
         self.area = c.area
         self.purefc = c.purefc
         self.outputfilelist = []
+        self.requests = None
+        self.checkpoint = None
+        self.manifest = {}
+        self.packing = self._mk_packing(c.packing)
+        self.packing_stats = {}
 
         # Define the different types of field combinations (type, time, step)
         self.types = {}
@@ -256,6 +309,37 @@ class EcFlexpart(object):
             self._create_field_types(c.type, c.time, c.step)
         return
 
+    def _mk_packing(self, packing):
+        '''Converts the packing settings of the CONTROL file into a
+        dictionary with parameter ids as keys.
+
+        Parameters
+        ----------
+        packing : str
+            The packing settings, e.g. '130:16/Q:24:grid_second_order/ALL:24'.
+
+        Return
+        ------
+        settings : dict
+            The bits per value and the packing type (or None to keep the
+            packing type) per parameter id or 'ALL'.
+        '''
+        settings = {}
+        if not packing:
+            return settings
+
+        table128 = init128(_config.PATH_GRIBTABLE)
+        for setting in packing.split('/'):
+            parts = setting.split(':')
+            packtype = parts[2] if len(parts) == 3 else None
+            if parts[0].upper() == 'ALL':
+                settings['ALL'] = (int(parts[1]), packtype)
+            else:
+                for pid in to_param_id(parts[0], table128):
+                    settings[pid] = (int(parts[1]), packtype)
+
+        return settings
+
     def _create_field_types(self, ftype, ftime, fstep):
         '''Create the combination of field type, time and forecast step.
 
@@ -492,7 +576,7 @@ class EcFlexpart(object):
             The target filename for the grib data.
         '''
         targetname = (self.inputdir + '/' + ftype + param + '.' + date + '.' +
-                      str(os.getppid()) + '.' + str(os.getpid()) + '.grb')
+                      self.ppid + '.' + str(os.getpid()) + '.grb')
 
         return targetname
 
@@ -523,6 +607,11 @@ class EcFlexpart(object):
         # increase number of mars requests
         self.mreq_count += 1
 
+        # the requests are only collected, e.g. for the streaming mode
+        if self.requests is not None:
+            self.requests.append(dict(par_dict))
+            return
+
         MR = MarsRetrieval(self.server,
                            self.public,
                            marsclass=par_dict['marsclass'],
@@ -544,22 +633,27 @@ class EcFlexpart(object):
                            expver=par_dict['expver'],
                            param=par_dict['param'])
 
+        target = par_dict['target']
         if request == 0:
             MR.display_info()
-            MR.data_retrieve()
+            with span('request', target=os.path.basename(target)):
+                MR.data_retrieve()
+                count(bytes_written=file_sizes([target]))
         elif request == 1:
             MR.print_infodata_csv(self.inputdir, self.mreq_count)
         elif request == 2:
             MR.print_infodata_csv(self.inputdir, self.mreq_count)
             MR.display_info()
-            MR.data_retrieve()
+            with span('request', target=os.path.basename(target)):
+                MR.data_retrieve()
+                count(bytes_written=file_sizes([target]))
         else:
             print('Failure')
 
         return
 
 
-    def _mk_index_values(self, inputdir, inputfiles, keys):
+    def _mk_index_values(self, inputdir, inputfiles, keys, per_file=False):
         '''Creates an index file for a set of grib parameter keys.
         The values from the index keys are returned in a list.
 
@@ -571,11 +665,16 @@ class EcFlexpart(object):
         inputfiles : UioFiles
             Contains a list of files.
 
+        per_file : bool, optional
+            Creates a separate index for each file instead of a common
+            index file, so that the files can be removed one after the
+            other. Default value is False.
+
         Return
         ------
-        iid : codes_index
+        iid : codes_index or dict
             This is a grib specific index structure to access
-            messages in a file.
+            messages in a file. With per_file, the index of each file.
 
         index_vals : list of list  of str
             Contains the values from the keys used for a distinct selection
@@ -585,21 +684,31 @@ class EcFlexpart(object):
             index_vals[1]: ('0', '1200', '1800', '600') ; time
             index_vals[2]: ('0', '12', '3', '6', '9') ; stepRange
         '''
-        from eccodes import codes_index_get
+        from eccodes import codes_index_get, codes_index_new_from_file
 
         iid = None
         index_keys = keys
 
         indexfile = os.path.join(inputdir, _config.FILE_GRIB_INDEX)
         silent_remove(indexfile)
-        grib = GribUtil(inputfiles.files)
         # creates new index file
-        iid = grib.index(index_keys=index_keys, index_file=indexfile)
+        with span('index', files=len(inputfiles.files)):
+            if per_file:
+                iid = OrderedDict((ifile, codes_index_new_from_file(
+                    ifile, index_keys)) for ifile in inputfiles.files)
+            else:
+                grib = GribUtil(inputfiles.files)
+                iid = grib.index(index_keys=index_keys, index_file=indexfile)
+            count(bytes_read=file_sizes(inputfiles.files))
 
         # read the values of index keys
         index_vals = []
         for key in index_keys:
-            key_vals = codes_index_get(iid, key)
+            if per_file:
+                key_vals = set(val for fiid in iid.values()
+                               for val in codes_index_get(fiid, key))
+            else:
+                key_vals = codes_index_get(iid, key)
             # have to sort the key values for correct order,
             # therefore convert to int first
             key_vals = [int(k) for k in key_vals]
@@ -614,7 +723,45 @@ class EcFlexpart(object):
         return iid, index_vals
 
 
-    def retrieve(self, server, dates, public, request, inputdir='.'):
+    def _mk_last_use(self, iids, index_keys, index_vals):
+        '''Determines for each input file the last combination of the index
+        values which it contains, in the order of processing.
+
+        The combinations are processed in the order of the product of the
+        index values, so that the file is not needed any more as soon as
+        the processing has passed the highest position of each of its
+        index values.
+
+        Parameters
+        ----------
+        iids : dict
+            The index of each input file.
+
+        index_keys : list of str
+            The names of the index keys, e.g. ["date", "time", "step"].
+
+        index_vals : list of list of str
+            The sorted values of the index keys of all files.
+
+        Return
+        ------
+        lastuse : dict
+            The positions of the last combination in the lists of
+            index values, e.g. (2, 1, 0), for each input file.
+        '''
+        from eccodes import codes_index_get
+
+        lastuse = {}
+        for ifile, iid in iids.items():
+            lastuse[ifile] = tuple(
+                max(vals.index(str(int(val)))
+                    for val in codes_index_get(iid, key))
+                for key, vals in zip(index_keys, index_vals))
+
+        return lastuse
+
+    def retrieve(self, server, dates, public, request, inputdir='.',
+                 requests=None):
         '''Finalizing the retrieval information by setting final details
         depending on grid type.
         Prepares MARS retrievals per grid type and submits them.
@@ -643,11 +790,17 @@ class EcFlexpart(object):
             Path to the directory where the retrieved data is about
             to be stored. The default is the current directory ('.').
 
+        requests : list, optional
+            If a list is passed, the parameters of the MARS requests are
+            appended to it as dictionaries instead of submitting them.
+            Default value is None.
+
         Return
         ------
 
         '''
         self.dates = dates
+        self.requests = requests
         self.server = server
         self.public = public
         self.inputdir = inputdir
@@ -829,11 +982,42 @@ class EcFlexpart(object):
         return
 
 
+    def _grid_dimensions(self):
+        '''Calculates the number of grid points of the output grid in
+        longitude and latitude direction.
+
+        Parameters
+        ----------
+
+        Return
+        ------
+        maxl : int
+            Number of grid points in longitude direction.
+
+        maxb : int
+            Number of grid points in latitude direction.
+        '''
+        import numpy as np
+
+        area = np.asarray(self.area.split('/')).astype(float)
+        grid = np.asarray(self.grid.split('/')).astype(float)
+
+        if area[1] > area[3]:
+            area[1] -= 360
+        maxl = int(round((area[3] - area[1]) / grid[1])) + 1
+        maxb = int(round((area[0] - area[2]) / grid[0])) + 1
+
+        return maxl, maxb
+
     def write_namelist(self, c):
         '''Creates a namelist file in the temporary directory and writes
         the following values to it: maxl, maxb, mlevel,
         mlevelist, mnauf, metapar, rlo0, rlo1, rla0, rla1,
-        momega, momegadiff, mgauss, msmooth, meta, metadiff, mdpdeta
+        momega, momegadiff, mgauss, msmooth, meta, metadiff, mdpdeta,
+        mcachedir
+
+        The cache directory for the Legendre tables of the Fortran
+        program is created if it is set and does not exist yet.
 
         Parameters
         ----------
@@ -861,12 +1045,16 @@ class EcFlexpart(object):
 
             self.inputdir = c.inputdir
             area = np.asarray(self.area.split('/')).astype(float)
-            grid = np.asarray(self.grid.split('/')).astype(float)
-
             if area[1] > area[3]:
                 area[1] -= 360
-            maxl = int(round((area[3] - area[1]) / grid[1])) + 1
-            maxb = int(round((area[0] - area[2]) / grid[0])) + 1
+            maxl, maxb = self._grid_dimensions()
+
+            # the Fortran program runs within the inputdir
+            cachedir = ''
+            if c.cachedir:
+                cachedir = os.path.abspath(c.cachedir)
+                if not os.path.isdir(cachedir):
+                    make_dir(cachedir)
 
             stream = namelist_template.generate(
                 maxl=str(maxl),
@@ -885,19 +1073,22 @@ class EcFlexpart(object):
                 msmooth=str(c.smooth),
                 meta=str(c.eta),
                 metadiff=str(c.etadiff),
-                mdpdeta=str(c.dpdeta)
+                mdpdeta=str(c.dpdeta),
+                mcachedir=cachedir
             )
         except UndefinedError as e:
             print('... ERROR ' + str(e))
 
-            sys.exit('\n... error occured while trying to generate namelist ' +
-                     _config.TEMPFILE_NAMELIST)
+            raise ProcessingError('\n... error occured while trying to '
+                                  'generate namelist ' +
+                                  _config.TEMPFILE_NAMELIST)
         except OSError as e:
             print('... ERROR CODE: ' + str(e.errno))
             print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-            sys.exit('\n... error occured while trying to generate template ' +
-                     _config.TEMPFILE_NAMELIST)
+            raise ProcessingError('\n... error occured while trying to '
+                                  'generate template ' +
+                                  _config.TEMPFILE_NAMELIST)
 
         try:
             namelistfile = os.path.join(self.inputdir, _config.FILE_NAMELIST)
@@ -908,13 +1099,86 @@ class EcFlexpart(object):
             print('... ERROR CODE: ' + str(e.errno))
             print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-            sys.exit('\n... error occured while trying to write ' +
-                     namelistfile)
+            raise ProcessingError('\n... error occured while trying to '
+                                  'write ' + namelistfile)
 
         return
 
 
-    def deacc_fluxes(self, inputfiles, c):
+    def _run_members(self, method, inputfiles, c, members):
+        '''Runs a processing method for each ensemble member in a pool of
+        MEMBER_WORKERS processes.
+
+        Each member is processed in its own scratch directory, with its
+        own grib index and temporary files. The output files are written
+        to the input directory as in the sequential run and the output
+        file names are collected in the order of the members.
+
+        Parameters
+        ----------
+        method : str
+            Name of the method, "deacc_fluxes" or "create".
+
+        inputfiles : UioFiles
+            Contains the list of files to be processed.
+
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        members : list of str
+            The ensemble member numbers.
+
+        Return
+        ------
+
+        '''
+        from multiprocessing import Pool
+
+        nworkers = min(c.member_workers, len(members))
+        print('... process {} ensemble members with {} workers'.format(
+            len(members), nworkers))
+
+        # the members are already processed in parallel, therefore each
+        # member runs a single calc_etadot process and the cores are
+        # divided among the workers
+        cm = copy.copy(c)
+        cm.etadot_workers = 1
+        cm.autotune = 0
+        if not cm.etadot_threads:
+            cm.etadot_threads = max(1, available_cores() // nworkers)
+
+        tasks = []
+        for number in members:
+            workdir = os.path.join(c.inputdir, 'member.' + str(c.ppid) +
+                                   '.' + number)
+            tasks.append((self, method, inputfiles, cm, number, workdir))
+
+        pool = Pool(nworkers)
+        try:
+            results = pool.map(_process_member, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        for task, (outputfiles, stats, manifest, error) in zip(tasks,
+                                                                results):
+            if error:
+                raise ProcessingError('... ERROR in ensemble member ' +
+                                      task[4] + ':\n' + error)
+            self.outputfilelist.extend(outputfiles)
+            self.manifest.update(manifest)
+            if inputfiles.workspace is not None:
+                for outputfile in outputfiles:
+                    inputfiles.workspace.add(outputfile)
+            _merge_packing_stats(self.packing_stats, stats)
+            if not c.debug:
+                shutil.rmtree(task[5], ignore_errors=True)
+
+        return
+
+    def deacc_fluxes(self, inputfiles, c, members=None, workdir=None,
+                     windows=None):
         '''De-accumulate and disaggregate flux data.
 
         Goes through all flux fields in ordered time and de-accumulate
@@ -932,6 +1196,23 @@ class EcFlexpart(object):
             Contains all the parameters of CONTROL file and
             command line.
 
+        members : list of str, optional
+            The ensemble members to be processed. Default value is None,
+            which processes all members, in parallel if MEMBER_WORKERS
+            is larger than 1.
+
+        workdir : str, optional
+            Path to the directory for the index and temporary files.
+            Default value is None, which is the input directory.
+
+        windows : dict, optional
+            The last intervals of each ensemble member of a previous call,
+            with which the deaccumulation continues, e.g. for the time steps
+            which arrived meanwhile in streaming mode. It is updated with the
+            last intervals of this call. The members are then processed in
+            this process. Default value is None, which starts the
+            deaccumulation with the first time step.
+
         Return
         ------
 
@@ -940,7 +1221,10 @@ class EcFlexpart(object):
         from eccodes import (codes_index_select, codes_get,
                              codes_get_values, codes_set_values, codes_set,
                              codes_write, codes_release, codes_new_from_index,
-                             codes_index_release)
+                             codes_index_release, codes_get_message_size)
+
+        if workdir is None:
+            workdir = c.inputdir
 
         table128 = init128(_config.PATH_GRIBTABLE)
         # get ids from the flux parameter names
@@ -955,9 +1239,6 @@ class EcFlexpart(object):
         if '/' in self.number:
             # more than one ensemble member is selected
             index_keys = ["number", "date", "time", "step"]
-            # maximum ensemble number retrieved
-            # + 1 for the control run (ensemble number 0)
-            maxnum = int(self.number.split('/')[-1]) + 1
             # remember the index of the number values
             index_number = index_keys.index('number')
             # empty set to save ensemble numbers which were already processed
@@ -972,9 +1253,43 @@ class EcFlexpart(object):
         # get sorted lists of the index values
         # this is very important for disaggregating
         # the flux data in correct order
-        iid, index_vals = self._mk_index_values(c.inputdir,
+        iid, index_vals = self._mk_index_values(workdir,
                                                 inputfiles,
                                                 index_keys)
+
+        # the members which were completed by a previous attempt of the
+        # run are skipped
+        if self.checkpoint:
+            inputs = mk_hash(file_stats(inputfiles.files))
+        if '/' in self.number:
+            if members is None:
+                members = index_vals[index_number]
+                if self.checkpoint:
+                    members = [number for number in members
+                               if not self.checkpoint.done(
+                                   'deaccumulation.N{:0>3}'.format(
+                                       int(number)), inputs)]
+                if not members:
+                    print('... deaccumulation was completed before')
+                    codes_index_release(iid)
+                    return
+                if c.member_workers > 1 and len(members) > 1 and \
+                   windows is None:
+                    codes_index_release(iid)
+                    if c.rrint:
+                        self._create_rr_grib_dummy(inputfiles.files[0],
+                                                   c.inputdir)
+                    self._run_members('deacc_fluxes', inputfiles, c, members)
+                    return
+            index_vals[index_number] = members
+            # number of ensemble members to be processed,
+            # the flux arrays are indexed by the position of the member
+            maxnum = len(members)
+        elif self.checkpoint and self.checkpoint.done('deaccumulation',
+                                                      inputs):
+            print('... deaccumulation was completed before')
+            codes_index_release(iid)
+            return
         # index_vals looks like e.g.:
         # index_vals[0]: ('20171106', '20171107', '20171108') ; date
         # index_vals[1]: ('0', '600', '1200', '1800') ; time
@@ -986,9 +1301,13 @@ class EcFlexpart(object):
                 start_date = datetime.strptime(c.start_date + '00', '%Y%m%d%H')
                 end_date = datetime.strptime(c.end_date + '23', '%Y%m%d%H')
             else:
-                sdate_str = c.start_date + '{:0>2}'.format(index_vals[1][0])
+                # the times of the index are in the format HHMM
+                times = index_vals[index_keys.index('time')]
+                sdate_str = c.start_date + \
+                            '{:0>2}'.format(int(times[0]) // 100)
                 start_date = datetime.strptime(sdate_str, '%Y%m%d%H')
-                edate_str = c.end_date + '{:0>2}'.format(index_vals[1][-1])
+                edate_str = c.end_date + \
+                            '{:0>2}'.format(int(times[-1]) // 100)
                 end_date = datetime.strptime(edate_str, '%Y%m%d%H')
                 end_date = end_date + timedelta(hours=c.maxstep)
 
@@ -1015,12 +1334,28 @@ class EcFlexpart(object):
             date_list = []
             step_list = []
 
+        # in incremental mode the deaccumulation continues with the last
+        # intervals of the previous run
+        state = None
+        if c.statedir:
+            state = DeaccState(c.statedir)
+            if not state.usable(c):
+                state = None
+
         # initialize dictionaries to store flux values per parameter
         orig_vals = {}
         deac_vals = {}
         for p in pars:
             orig_vals[p] = []
             deac_vals[p] = []
+        # the last intervals of each ensemble member
+        if windows is None:
+            windows = {}
+        if '' in windows:
+            orig_vals, deac_vals = windows['']
+        elif state and not maxnum:
+            orig_vals, deac_vals = state.load_window('', pars)
+        windows[''] = (orig_vals, deac_vals)
 
         # "product" genereates each possible combination between the
         # values of the index keys
@@ -1030,6 +1365,11 @@ class EcFlexpart(object):
 
             print('CURRENT PRODUCT: ', prod)
 
+            # the flux data up to the last date of the previous run
+            # are already contained in the state
+            if state and prod[index_keys.index('date')] <= state.lastdate:
+                continue
+
             # the whole process has to be done for each seperate ensemble member
             # therefore, for each new ensemble member we delete old flux values
             # and start collecting flux data from the beginning time step
@@ -1045,6 +1385,12 @@ class EcFlexpart(object):
                 for p in pars:
                     orig_vals[p] = []
                     deac_vals[p] = []
+                suffix = '.N{:0>3}'.format(int(prod[index_number]))
+                if suffix in windows:
+                    orig_vals, deac_vals = windows[suffix]
+                elif state:
+                    orig_vals, deac_vals = state.load_window(suffix, pars)
+                windows[suffix] = (orig_vals, deac_vals)
 
             for i in range(len(index_keys)):
                 codes_index_select(iid, index_keys[i], prod[i])
@@ -1126,6 +1472,8 @@ class EcFlexpart(object):
                 else:
                     fak = 3600.
 
+                count(messages=1, bytes_read=codes_get_message_size(gid))
+
                 # get parameter values and reshape
                 values = codes_get_values(gid)
                 values = (np.reshape(values, (nj, ni))).flatten() / fak
@@ -1260,13 +1608,43 @@ class EcFlexpart(object):
             g_handle.close()
             h_handle.close()
 
+        # the flux arrays of all time steps are alive here
+        memory_checkpoint('deacc_fluxes')
+
         codes_index_release(iid)
 
+        # the last intervals are the state for the next run in
+        # incremental mode
+        if c.statedir:
+            for suffix, (orig_vals, deac_vals) in windows.items():
+                if maxnum and not suffix:
+                    continue
+                save_window(c.inputdir, suffix, orig_vals, deac_vals)
+
         if c.rrint:
-            self._create_rr_grib_dummy(inputfiles.files[0], c.inputdir)
+            # in a member worker the dummy was already created
+            if workdir == c.inputdir:
+                self._create_rr_grib_dummy(inputfiles.files[0], c.inputdir)
 
-            self._prep_new_rrint(dims[0], dims[1], dims[2], lsp_np,
-                                 cp_np, maxnum, index_keys, index_vals, c)
+            with span('rrint'):
+                self._prep_new_rrint(dims[0], dims[1], dims[2], lsp_np,
+                                     cp_np, maxnum, index_keys, index_vals,
+                                     c)
+
+        # the flux files of the members are complete now
+        if self.checkpoint:
+            if maxnum:
+                suffixes = ['.N{:0>3}'.format(int(number))
+                            for number in members]
+            else:
+                suffixes = ['']
+            for suffix in suffixes:
+                outputs = glob.glob(os.path.join(c.inputdir,
+                                                 'flux*' + suffix)) + \
+                          glob.glob(os.path.join(c.inputdir, 'deacc_state' +
+                                                 suffix + '.npz'))
+                self.checkpoint.complete('deaccumulation' + suffix, outputs,
+                                         inputs)
 
         return
 
@@ -1298,7 +1676,7 @@ class EcFlexpart(object):
             Shape (ni * nj, nt).
 
         maxnum : int
-            The maximum number of ensemble members. It is None
+            The number of ensemble members. It is None
             if there are no or just one ensemble.
 
         index_keys : dictionary
@@ -1347,6 +1725,8 @@ class EcFlexpart(object):
                 lsp_new_np[0, ix, :] = disaggregation.IA3(lsp_np[ix, :])[:-1]
                 cp_new_np[0, ix, :] = disaggregation.IA3(cp_np[ix, :])[:-1]
 
+        memory_checkpoint('_prep_new_rrint')
+
         # write to grib files (full/orig times to flux file and inbetween
         # times with step 1 and 2, respectively)
         print('... write disaggregated precipitation to files.')
@@ -1360,6 +1740,8 @@ class EcFlexpart(object):
             inumb = 0
         else:
             inumb = 0
+        # perturbation number of the ensemble member
+        pnumb = 0
 
         # index variable of disaggregated fields
         it = 0
@@ -1391,7 +1773,8 @@ class EcFlexpart(object):
             # and start collecting flux data from the beginning time step
             if maxnum and prod[index_number] not in ens_numbers:
                 ens_numbers.add(prod[index_number])
-                inumb = int(prod[index_number])
+                inumb = len(ens_numbers) - 1
+                pnumb = int(prod[index_number])
                 it = 0
 
             # if necessary, add ensemble member number to filename suffix
@@ -1414,14 +1797,14 @@ class EcFlexpart(object):
                               wherekeynames=['paramId'], wherekeyvalues=[142],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, 0, lsp_new_np[inumb, :, it]]
                              )
             fluxfile.set_keys(tmpfile, filemode='ab',
                               wherekeynames=['paramId'], wherekeyvalues=[143],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, 0, cp_new_np[inumb, :, it]]
                              )
 
@@ -1430,14 +1813,14 @@ class EcFlexpart(object):
                               wherekeynames=['paramId'], wherekeyvalues=[142],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, '1', lsp_new_np[inumb, :, it+1]]
                              )
             fluxfile.set_keys(tmpfile, filemode='ab',
                               wherekeynames=['paramId'], wherekeyvalues=[143],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, '1', cp_new_np[inumb, :, it+1]]
                              )
 
@@ -1446,14 +1829,14 @@ class EcFlexpart(object):
                               wherekeynames=['paramId'], wherekeyvalues=[142],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, '2', lsp_new_np[inumb, :, it+2]]
                              )
             fluxfile.set_keys(tmpfile, filemode='ab',
                               wherekeynames=['paramId'], wherekeyvalues=[143],
                               keynames=['perturbationNumber', 'date', 'time',
                                         'stepRange', 'values'],
-                              keyvalues=[inumb, int(date.strftime('%Y%m%d')),
+                              keyvalues=[pnumb, int(date.strftime('%Y%m%d')),
                                          date.hour*100, '2', cp_new_np[inumb, :, it+2]]
                              )
 
@@ -1484,7 +1867,365 @@ class EcFlexpart(object):
 
         return
 
-    def create(self, inputfiles, c):
+    def _mk_etadot_workdir(self, c, basedir, slot):
+        '''Creates the working directory for an additional concurrent
+        calc_etadot process and provides the namelist file in it.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        basedir : str
+            Path to the directory in which the working directory is created.
+
+        slot : int
+            Number of the concurrent process.
+
+        Return
+        ------
+        workdir : str
+            Path to the working directory.
+        '''
+        workdir = os.path.join(basedir,
+                               'etadot.' + str(c.ppid) + '.' + str(slot))
+        if not os.path.isdir(workdir):
+            make_dir(workdir)
+        shutil.copy(os.path.join(c.inputdir, _config.FILE_NAMELIST), workdir)
+
+        return workdir
+
+    def _start_calc_etadot(self, c, workdir, threads, capture=False):
+        '''Starts the Fortran program in a working directory with the
+        fort.* input files of a single time step.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        workdir : str
+            Path to the working directory.
+
+        threads : int
+            Number of OpenMP threads. If None, the OMP_NUM_THREADS setting
+            of the environment is kept.
+
+        capture : boolean, optional
+            Decides if the output of the program is written to a log file
+            in the working directory instead of the standard output.
+            Default value is False.
+
+        Return
+        ------
+        proc : subprocess.Popen
+            The running process.
+
+        log : file
+            The open log file or None.
+        '''
+        env = os.environ.copy()
+        if threads:
+            env['OMP_NUM_THREADS'] = str(threads)
+
+        log = None
+        if capture:
+            log = open(os.path.join(workdir, 'calc_etadot.log'), 'w')
+
+        # write out all output to log file before starting fortran programm
+        sys.stdout.flush()
+
+        try:
+            proc = subprocess.Popen([os.path.join(c.exedir,
+                                                  _config.FORTRAN_EXECUTABLE)],
+                                    cwd=workdir, env=env, stdout=log,
+                                    stderr=subprocess.STDOUT if log else None)
+        except OSError as e:
+            print('... ERROR CODE: ' + str(e.errno))
+            print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
+
+            raise ProcessingError('... FORTRAN PROGRAM FAILED!')
+
+        return proc, log
+
+    def _wait_calc_etadot(self, proc, log, verbose=True):
+        '''Waits for a Fortran program run to finish and checks the
+        return code. A captured output is printed.
+
+        Parameters
+        ----------
+        proc : subprocess.Popen
+            The running process.
+
+        log : file
+            The open log file or None.
+
+        verbose : boolean, optional
+            Decides if the captured output is printed also if the program
+            was successful. Default value is True.
+
+        Return
+        ------
+
+        '''
+        wait_process(proc)
+
+        if log:
+            log.close()
+            if verbose or proc.returncode != 0:
+                with open(log.name) as f:
+                    print(f.read())
+
+        if proc.returncode != 0:
+            print('... ERROR CODE: ' + str(proc.returncode))
+            if log:
+                print('... ERROR MESSAGE:\n \t ' + 'calc_etadot failed in ' +
+                      os.path.dirname(log.name))
+
+            raise ProcessingError('... FORTRAN PROGRAM FAILED!')
+
+        return
+
+    def _finish_calc_etadot(self, c, proc, log, workdir, fnout, suffix, cdate,
+                            orolsm, inputs=None):
+        '''Waits for the Fortran program of a time step and creates the
+        FLEXPART input file from its output, the flux data and the
+        invariant fields.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        proc : subprocess.Popen
+            The running process.
+
+        log : file
+            The open log file or None.
+
+        workdir : str
+            Path to the working directory of the process.
+
+        fnout : str
+            Path of the final output file.
+
+        suffix : str
+            Date and time part of the output file name.
+
+        cdate : str
+            Date of the time step.
+
+        orolsm : str
+            Path to the file with the invariant fields.
+
+        inputs : str, optional
+            The hash of the inputs of the time step for the checkpoint.
+            Default value is None.
+
+        Return
+        ------
+        workdir : str
+            Path to the working directory, which can be reused.
+        '''
+        # the CPU time of the program is counted for its child processes
+        with span('calc_etadot', step=suffix):
+            self._wait_calc_etadot(proc, log)
+
+        # create outputfile and copy all data from intermediate files
+        # to the outputfile (final GRIB input files for FLEXPART)
+        fluxfile = self._flux_file(c, cdate, suffix)
+        if not c.cwc:
+            flist = [os.path.join(workdir, 'fort.15'),
+                     os.path.join(c.inputdir, fluxfile),
+                     os.path.join(workdir, 'fort.16'),
+                     orolsm]
+        else:
+            flist = [os.path.join(workdir, 'fort.15'),
+                     os.path.join(workdir, 'fort.22'),
+                     os.path.join(c.inputdir, fluxfile),
+                     os.path.join(workdir, 'fort.16'),
+                     orolsm]
+
+        # with GRIB2 format the messages are converted on the way, so that
+        # the output file is written only once,
+        # the same holds for repacking the messages and for the checksum
+        # of the manifest
+        digest = hashlib.sha1()
+        messages = 0
+        with span('assembly', step=suffix):
+            with open(fnout, 'wb') as fout:
+                for f in flist:
+                    if c.format.lower() == 'grib2' or self.packing:
+                        messages += _copy_grib(f, fout,
+                                               c.format.lower() == 'grib2',
+                                               self.packing,
+                                               self.packing_stats, digest)
+                    else:
+                        messages += _copy_file(f, fout, digest)
+            count(bytes_read=file_sizes(flist),
+                  bytes_written=file_sizes([fnout]))
+        self.manifest.setdefault(os.path.basename(fnout), {}).update(
+            messages=messages, sha1=digest.hexdigest())
+
+        if self.checkpoint:
+            self.checkpoint.complete('create.' + os.path.basename(fnout),
+                                     [fnout], inputs)
+
+        # in bounded-disk mode the flux data of the time step are not
+        # needed any more
+        if c.bounded_disk and not c.debug:
+            silent_remove(os.path.join(c.inputdir, fluxfile))
+
+        if c.omega:
+            # the file is replaced at once, since it can be shared by
+            # several runs
+            omegafile = os.path.join(c.outputdir, 'OMEGA')
+            with open(omegafile + '.' + str(os.getpid()), 'wb') as fout:
+                shutil.copyfileobj(open(os.path.join(workdir, 'fort.25'),
+                                        'rb'), fout)
+            os.rename(fout.name, omegafile)
+
+        return workdir
+
+    def _flux_file(self, c, cdate, suffix):
+        '''Returns the name of the flux file of a time step.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        cdate : str
+            Date of the time step.
+
+        suffix : str
+            Date and time part of the output file name.
+
+        Return
+        ------
+        fluxfile : str
+            The name of the flux file, e.g. flux2012010100.
+        '''
+        if c.marsclass == 'EP':
+            return 'flux' + suffix
+
+        return 'flux' + cdate[0:2] + suffix
+
+    def _calibrate_calc_etadot(self, c, workdir, workers, threads):
+        '''Measures the time per time step for a number of concurrent
+        calc_etadot processes with a number of threads each.
+
+        All processes work on copies of the input files of the time step
+        in the working directory.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        workdir : str
+            Path to the working directory with the fort.* input files.
+
+        workers : int
+            Number of concurrent processes.
+
+        threads : int
+            Number of OpenMP threads per process.
+
+        Return
+        ------
+        seconds : float
+            Wall clock time per time step.
+        '''
+        caldirs = []
+        for i in range(workers):
+            caldir = os.path.join(c.inputdir, 'autotune.' + str(c.ppid) +
+                                  '.' + str(i))
+            shutil.rmtree(caldir, ignore_errors=True)
+            make_dir(caldir)
+            for f in glob.glob(os.path.join(workdir, 'fort.*')):
+                if os.path.basename(f) in ['fort.15', 'fort.25', 'fort.26']:
+                    continue
+                try:
+                    os.link(f, os.path.join(caldir, os.path.basename(f)))
+                except OSError:
+                    shutil.copy(f, caldir)
+            caldirs.append(caldir)
+
+        start = time.time()
+        procs = [self._start_calc_etadot(c, caldir, threads, capture=True)
+                 for caldir in caldirs]
+        for proc, log in procs:
+            self._wait_calc_etadot(proc, log, verbose=False)
+        seconds = (time.time() - start) / workers
+
+        for caldir in caldirs:
+            shutil.rmtree(caldir, ignore_errors=True)
+
+        return seconds
+
+    def _etadot_split(self, c, workdir, nsteps):
+        '''Determines the number of concurrent calc_etadot processes and the
+        number of OpenMP threads per process.
+
+        Without autotuning the values from the CONTROL file are taken.
+        Otherwise the split stored for the grid signature is used or, if
+        there is none yet, a calibration with the time step in the working
+        directory is done and its result stored.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        workdir : str
+            Path to the working directory with the fort.* input files of
+            the first time step.
+
+        nsteps : int
+            Maximum number of time steps.
+
+        Return
+        ------
+        workers : int
+            Number of concurrent processes.
+
+        threads : int
+            Number of OpenMP threads per process or None.
+        '''
+        if not c.autotune:
+            return c.etadot_workers, c.etadot_threads
+
+        ncores = available_cores()
+        maxl, maxb = self._grid_dimensions()
+        signature = grid_signature(maxl, maxb, self.resol, self.level,
+                                   c.gauss, ncores)
+        tunefile = autotune_file(c.cachedir)
+
+        split = read_autotune(tunefile, signature)
+        if split:
+            print('... use {} workers x {} threads from {}'.format(
+                split[0], split[1], tunefile))
+            return split
+
+        splits = candidate_splits(ncores, nsteps)
+        if len(splits) == 1:
+            return splits[0]
+
+        split, timings = calibrate(
+            lambda w, t: self._calibrate_calc_etadot(c, workdir, w, t),
+            splits)
+        write_autotune(tunefile, signature, split, timings)
+
+        return split
+
+    def create(self, inputfiles, c, members=None, workdir=None):
         '''An index file will be created which depends on the combination
         of "date", "time" and "stepRange" values. This is used to iterate
         over all messages in each grib file which were passed through the
@@ -1508,20 +2249,33 @@ class EcFlexpart(object):
             Contains all the parameters of CONTROL file and
             command line.
 
+        members : list of str, optional
+            The ensemble members to be processed. Default value is None,
+            which processes all members, in parallel if MEMBER_WORKERS
+            is larger than 1.
+
+        workdir : str, optional
+            Path to the directory for the index and the fort.* files.
+            Default value is None, which is the input directory.
+
         Return
         ------
 
         '''
-        from eccodes import (codes_index_select, codes_get,
-                             codes_get_values, codes_set_values, codes_set,
-                             codes_write, codes_release, codes_new_from_index,
-                             codes_index_release)
+        from eccodes import (codes_get, codes_get_values, codes_set_values,
+                             codes_set, codes_write, codes_release,
+                             codes_index_release, codes_get_message_size)
+
+        if workdir is None:
+            workdir = c.inputdir
 
-        # generate start and end timestamp of the retrieval period
-        start_period = datetime.strptime(c.start_date + c.time[0], '%Y%m%d%H')
-        start_period = start_period + timedelta(hours=int(c.step[0]))
-        end_period = datetime.strptime(c.end_date + c.time[-1], '%Y%m%d%H')
-        end_period = end_period + timedelta(hours=int(c.step[-1]))
+        # in bounded-disk mode the retrieved files are removed as soon as
+        # they are processed, unless the members are processed in parallel
+        # from the same files
+        eager = c.bounded_disk and not c.debug and members is None
+
+        # generate start and end timestamp of the output period
+        start_period, end_period = self.output_period(c)
 
         # @WRF
         # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
@@ -1552,14 +2306,61 @@ class EcFlexpart(object):
             index_keys = ["number", "date", "time", "step"]
         else:
             index_keys = ["date", "time", "step"]
-        iid, index_vals = self._mk_index_values(c.inputdir,
+        # in bounded-disk mode each file is indexed on its own, so that
+        # its index is released together with the file
+        iid, index_vals = self._mk_index_values(workdir,
                                                 inputfiles,
-                                                index_keys)
+                                                index_keys,
+                                                per_file=eager)
+        iids = iid if eager else OrderedDict([(None, iid)])
         # index_vals looks like e.g.:
         # index_vals[0]: ('20171106', '20171107', '20171108') ; date
         # index_vals[1]: ('0', '600', '1200', '1800') ; time
         # index_vals[2]: ('0', '12', '3', '6', '9') ; stepRange
 
+        # the member number is added to the output file names
+        # if there is more than one ensemble member
+        numbersuffix = False
+        if 'number' in index_keys:
+            index_number = index_keys.index('number')
+            if members is None:
+                members = index_vals[index_number]
+                if c.member_workers > 1 and len(members) > 1:
+                    for iid in iids.values():
+                        codes_index_release(iid)
+                    self._run_members('create', inputfiles, c, members)
+                    self._print_packing_report()
+                    return
+                numbersuffix = len(members) > 1
+            else:
+                numbersuffix = True
+            index_vals[index_number] = members
+
+        # concurrent calc_etadot processes; the number of workers and
+        # threads is determined with the first time step
+        workers = threads = None
+        nsteps = 1
+        for vals in index_vals:
+            nsteps *= len(vals)
+        workdirs = [workdir]
+        freedirs = [workdir]
+        running = []
+
+        # the file with the invariant fields is the same for all time steps
+        workspace = inputfiles.workspace
+        if workspace is None:
+            workspace = Workspace(c.inputdir)
+        orolsm = workspace.select(grid='OG_OROLSM__SL', ppid=c.ppid)[0]
+
+        lastuse = {}
+        if eager:
+            lastuse = self._mk_last_use(iids, index_keys, index_vals)
+
+        # the inputs of the time steps for the checkpoint
+        inputs = None
+        if self.checkpoint:
+            rawstats = file_stats(inputfiles.files + [orolsm])
+
         # "product" genereates each possible combination between the
         # values of the index keys
         for prod in product(*index_vals):
@@ -1568,21 +2369,39 @@ class EcFlexpart(object):
 
             print('current product: ', prod)
 
-            for i in range(len(index_keys)):
-                codes_index_select(iid, index_keys[i], prod[i])
+            # remove the files whose last combination was processed
+            position = tuple(vals.index(val)
+                             for vals, val in zip(index_vals, prod))
+            for ifile in sorted(lastuse):
+                if lastuse[ifile] < position:
+                    codes_index_release(iids.pop(ifile))
+                    silent_remove(ifile)
+                    workspace.remove(ifile)
+                    del lastuse[ifile]
+
+            messages = _index_messages(iids.values(), index_keys, prod)
 
             # get first id from current product
-            gid = codes_new_from_index(iid)
+            gid = next(messages, None)
 
             # if there is no data for this specific time combination / product
             # skip the rest of the for loop and start with next timestep/product
             if not gid:
                 continue
 #============================================================================================
+            # the first time step is always processed in the inputdir,
+            # further concurrent calc_etadot processes get their own
+            # working directory
+            if not freedirs:
+                freedirs.append(self._mk_etadot_workdir(c, workdirs[0],
+                                                        len(workdirs)))
+                workdirs.append(freedirs[-1])
+            workdir = freedirs.pop(0)
+
             # remove old fort.* files and open new ones
             # they are just valid for a single product
             for k, f in fdict.items():
-                fortfile = os.path.join(c.inputdir, 'fort.' + k)
+                fortfile = os.path.join(workdir, 'fort.' + k)
                 silent_remove(fortfile)
                 fdict[k] = open(fortfile, 'wb')
 #============================================================================================
@@ -1594,20 +2413,37 @@ class EcFlexpart(object):
             timestamp += timedelta(hours=int(cstep))
             cdate_hour = datetime.strftime(timestamp, '%Y%m%d%H')
 
-            # if basetime is used, adapt start/end date period
-            if c.basetime is not None:
-                time_delta = timedelta(hours=12-int(c.dtime))
-                start_period = datetime.strptime(c.end_date + str(c.basetime),
-                                               '%Y%m%d%H') - time_delta
-                end_period = datetime.strptime(c.end_date + str(c.basetime),
-                                             '%Y%m%d%H')
-
             # skip all temporary times
             # which are outside the retrieval period
             if timestamp < start_period or \
                timestamp > end_period:
+                freedirs.insert(0, workdir)
                 continue
 
+            # the time steps which were completed by a previous attempt of
+            # the run are skipped, also if they were post-processed already
+            if self.checkpoint:
+                suffix = self.output_suffix(c, cdate, ctime, cstep,
+                                            prod[index_number] if numbersuffix
+                                            else None)
+                name = c.prefix + suffix
+                fluxfile = os.path.join(c.inputdir,
+                                        self._flux_file(c, cdate, suffix))
+                inputs = mk_hash(rawstats, file_stats([fluxfile]))
+                if self.checkpoint.done('create.' + name, inputs,
+                                        then=['postprocessing.' + name]):
+                    print('... ' + name + ' was completed before')
+                    for f in fdict.values():
+                        f.close()
+                    codes_release(gid)
+                    freedirs.insert(0, workdir)
+                    self.outputfilelist.append(name)
+                    self.manifest[name] = {
+                        'valid_time': cdate_hour,
+                        'member': int(prod[index_number]) if numbersuffix
+                                  else None}
+                    workspace.add(os.path.join(c.inputdir, name))
+                    continue
 
             # @WRF
             # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
@@ -1620,156 +2456,135 @@ class EcFlexpart(object):
             #                    'WRF' + cdate + '.' + ctime + '.000.grb2'), 'wb')
             #        olddate = cdate[:]
 #============================================================================================
-            # savedfields remembers which fields were already used.
-            savedfields = []
-            # sum of cloud liquid and ice water content
-            scwc = None
-            while 1:
-                if not gid:
-                    break
-                paramId = codes_get(gid, 'paramId')
-                gridtype = codes_get(gid, 'gridType')
-                if paramId == 77: # ETADOT
-                    codes_write(gid, fdict['21'])
-                elif paramId == 130: # T
-                    codes_write(gid, fdict['11'])
-                elif paramId == 131 or paramId == 132: # U, V wind component
-                    codes_write(gid, fdict['10'])
-                elif paramId == 133 and gridtype != 'reduced_gg': # Q
-                    codes_write(gid, fdict['17'])
-                elif paramId == 133 and gridtype == 'reduced_gg': # Q, gaussian
-                    codes_write(gid, fdict['18'])
-                elif paramId == 135: # W
-                    codes_write(gid, fdict['19'])
-                elif paramId == 152: # LNSP
-                    codes_write(gid, fdict['12'])
-                elif paramId == 155 and gridtype == 'sh': # D
-                    codes_write(gid, fdict['13'])
-                elif paramId == 246 or paramId == 247: # CLWC, CIWC
-                    # sum cloud liquid water and ice
-                    if scwc is None:
-                        scwc = codes_get_values(gid)
-                    else:
-                        scwc += codes_get_values(gid)
-                        codes_set_values(gid, scwc)
-                        codes_set(gid, 'paramId', 201031)
-                        codes_write(gid, fdict['22'])
-                        scwc = None
-                # @WRF
-                # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
-                #
-                # UNDER CONSTRUCTION !!!
-                #
-                #elif c.wrf and paramId in [129, 138, 155] and \
-                #      levtype == 'hybrid': # Z, VO, D
-                #    # do not do anything right now
-                #    # these are specific parameter for WRF
-                #    pass
-                else:
-                    if paramId not in savedfields:
-                        # SD/MSL/TCC/10U/10V/2T/2D/Z/LSM/SDOR/CVL/CVH/SR
-                        # and all ADDPAR parameter
-                        codes_write(gid, fdict['16'])
-                        savedfields.append(paramId)
+            with span('routing', step=cdate_hour):
+                # savedfields remembers which fields were already used.
+                savedfields = []
+                # sum of cloud liquid and ice water content
+                scwc = None
+                while 1:
+                    if not gid:
+                        break
+                    paramId = codes_get(gid, 'paramId')
+                    gridtype = codes_get(gid, 'gridType')
+                    count(messages=1,
+                          bytes_read=codes_get_message_size(gid))
+                    if paramId == 77: # ETADOT
+                        codes_write(gid, fdict['21'])
+                    elif paramId == 130: # T
+                        codes_write(gid, fdict['11'])
+                    elif paramId == 131 or paramId == 132: # U, V wind component
+                        codes_write(gid, fdict['10'])
+                    elif paramId == 133 and gridtype != 'reduced_gg': # Q
+                        codes_write(gid, fdict['17'])
+                    elif paramId == 133 and gridtype == 'reduced_gg': # Q, gaussian
+                        codes_write(gid, fdict['18'])
+                    elif paramId == 135: # W
+                        codes_write(gid, fdict['19'])
+                    elif paramId == 152: # LNSP
+                        codes_write(gid, fdict['12'])
+                    elif paramId == 155 and gridtype == 'sh': # D
+                        codes_write(gid, fdict['13'])
+                    elif paramId == 246 or paramId == 247: # CLWC, CIWC
+                        # sum cloud liquid water and ice
+                        if scwc is None:
+                            scwc = codes_get_values(gid)
+                        else:
+                            scwc += codes_get_values(gid)
+                            codes_set_values(gid, scwc)
+                            codes_set(gid, 'paramId', 201031)
+                            codes_write(gid, fdict['22'])
+                            scwc = None
+                    # @WRF
+                    # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
+                    #
+                    # UNDER CONSTRUCTION !!!
+                    #
+                    #elif c.wrf and paramId in [129, 138, 155] and \
+                    #      levtype == 'hybrid': # Z, VO, D
+                    #    # do not do anything right now
+                    #    # these are specific parameter for WRF
+                    #    pass
                     else:
-                        print('duplicate ' + str(paramId) + ' not written')
-                # @WRF
-                # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
-                #
-                # UNDER CONSTRUCTION !!!
-                #
-                #try:
-                #    if c.wrf:
-                #        # model layer
-                #        if levtype == 'hybrid' and \
-                #           paramId in [129, 130, 131, 132, 133, 138, 155]:
-                #            codes_write(gid, fwrf)
-                #        # sfc layer
-                #        elif paramId in wrfpars:
-                #            codes_write(gid, fwrf)
-                #except AttributeError:
-                #    pass
+                        if paramId not in savedfields:
+                            # SD/MSL/TCC/10U/10V/2T/2D/Z/LSM/SDOR/CVL/CVH/SR
+                            # and all ADDPAR parameter
+                            codes_write(gid, fdict['16'])
+                            savedfields.append(paramId)
+                        else:
+                            print('duplicate ' + str(paramId) + ' not written')
+                    # @WRF
+                    # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
+                    #
+                    # UNDER CONSTRUCTION !!!
+                    #
+                    #try:
+                    #    if c.wrf:
+                    #        # model layer
+                    #        if levtype == 'hybrid' and \
+                    #           paramId in [129, 130, 131, 132, 133, 138, 155]:
+                    #            codes_write(gid, fwrf)
+                    #        # sfc layer
+                    #        elif paramId in wrfpars:
+                    #            codes_write(gid, fwrf)
+                    #except AttributeError:
+                    #    pass
 
-                codes_release(gid)
-                gid = codes_new_from_index(iid)
+                    codes_release(gid)
+                    gid = next(messages, None)
 #============================================================================================
-            for f in fdict.values():
-                f.close()
+                for f in fdict.values():
+                    f.close()
+                count(bytes_written=file_sizes(f.name
+                                               for f in fdict.values()))
 #============================================================================================
             # call for Fortran program to convert e.g. reduced_gg grids to
             # regular_ll and calculate detadot/dp
-            pwd = os.getcwd()
-            os.chdir(c.inputdir)
-            if os.stat('fort.21').st_size == 0 and c.eta:
+            if os.stat(os.path.join(workdir, 'fort.21')).st_size == 0 and c.eta:
                 print('Parameter 77 (etadot) is missing, most likely it is '
                       'not available for this type or date / time\n')
                 print('Check parameters CLASS, TYPE, STREAM, START_DATE\n')
                 my_error('fort.21 is empty while parameter eta '
-                         'is set to 1 in CONTROL file')
-# ============================================================================================
-            # write out all output to log file before starting fortran programm
-            sys.stdout.flush()
-
-            # Fortran program creates file fort.15 (with u,v,etadot,t,sp,q)
-            execute_subprocess([os.path.join(c.exedir,
-                                             _config.FORTRAN_EXECUTABLE)],
-                               error_msg='FORTRAN PROGRAM FAILED!')#shell=True)
+                         'is set to 1 in CONTROL file', ProcessingError)
 
-            os.chdir(pwd)
+            if workers is None:
+                workers, threads = self._etadot_split(c, workdir, nsteps)
 # ============================================================================================
             # create name of final output file, e.g. EN13040500 (ENYYMMDDHH)
-            # for CERA-20C we need all 4 digits for the year sinc 1900 - 2010
-            if c.purefc:
-                if c.marsclass == 'EP':
-                    suffix = cdate[0:8] + '.' + ctime + '.' + cstep
-                else:
-                    suffix = cdate[2:8] + '.' + ctime + '.' + cstep
-            else:
-                if c.marsclass == 'EP':
-                    suffix = cdate_hour[0:10]
-                else:
-                    suffix = cdate_hour[2:10]
-
-            # if necessary, add ensemble member number to filename suffix
-            if 'number' in index_keys:
-                index_number = index_keys.index('number')
-                if len(index_vals[index_number]) > 1:
-                    suffix = suffix + '.N{:0>3}'.format(int(prod[index_number]))
+            # if necessary, with the ensemble member number
+            suffix = self.output_suffix(c, cdate, ctime, cstep,
+                                        prod[index_number] if numbersuffix
+                                        else None)
 
             fnout = os.path.join(c.inputdir, c.prefix + suffix)
             print("outputfile = " + fnout)
             # collect for final processing
             self.outputfilelist.append(os.path.basename(fnout))
+            self.manifest[os.path.basename(fnout)] = {
+                'valid_time': cdate_hour,
+                'member': int(prod[index_number]) if numbersuffix else None}
+            workspace.add(fnout)
             # # get additional precipitation subgrid data if available
             # if c.rrint:
                 # self.outputfilelist.append(os.path.basename(fnout + '_1'))
                 # self.outputfilelist.append(os.path.basename(fnout + '_2'))
 # ============================================================================================
-            # create outputfile and copy all data from intermediate files
-            # to the outputfile (final GRIB input files for FLEXPART)
-            orolsm = os.path.basename(glob.glob(c.inputdir +
-                                                '/OG_OROLSM__SL.*.' +
-                                                c.ppid +
-                                                '*')[0])
-            if c.marsclass == 'EP':
-                fluxfile = 'flux' + suffix
-            else:
-                fluxfile = 'flux' + cdate[0:2] + suffix
-            if not c.cwc:
-                flist = ['fort.15', fluxfile, 'fort.16', orolsm]
-            else:
-                flist = ['fort.15', 'fort.22', fluxfile, 'fort.16', orolsm]
+            # Fortran program creates file fort.15 (with u,v,etadot,t,sp,q)
+            # the output of concurrent processes is collected in log files
+            proc, log = self._start_calc_etadot(c, workdir, threads,
+                                                capture=workers > 1)
+            running.append((proc, log, workdir, fnout, suffix, cdate, orolsm,
+                            inputs))
 
-            with open(fnout, 'wb') as fout:
-                for f in flist:
-                    shutil.copyfileobj(open(os.path.join(c.inputdir, f), 'rb'),
-                                       fout)
+            # wait for the oldest process, so that the output files are
+            # completed in the order of the time steps
+            if len(running) >= workers:
+                freedirs.append(self._finish_calc_etadot(c, *running.pop(0)))
 
-            if c.omega:
-                with open(os.path.join(c.outputdir, 'OMEGA'), 'wb') as fout:
-                    shutil.copyfileobj(open(os.path.join(c.inputdir, 'fort.25'),
-                                            'rb'), fout)
-# ============================================================================================
+        while running:
+            freedirs.append(self._finish_calc_etadot(c, *running.pop(0)))
+
+        for workdir in workdirs[1:]:
+            shutil.rmtree(workdir, ignore_errors=True)
 
         # @WRF
         # THIS IS NOT YET CORRECTLY IMPLEMENTED !!!
@@ -1779,16 +2594,132 @@ class EcFlexpart(object):
         #if c.wrf:
         #    fwrf.close()
 
-        codes_index_release(iid)
+        for iid in iids.values():
+            codes_index_release(iid)
+
+        # member workers report together in the main process
+        if workdir == c.inputdir:
+            self._print_packing_report()
 
         return
 
+    def output_period(self, c):
+        '''Determines the period of the FLEXPART input files.
 
-    def calc_extra_elda(self, path, prefix):
+        Fields outside the period were only retrieved for processing
+        reasons, e.g. the disaggregation of the fluxes.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        Return
+        ------
+        start_period : datetime
+            The first time step of the FLEXPART input files.
+
+        end_period : datetime
+            The last time step of the FLEXPART input files.
+        '''
+        # if basetime is used, the period ends with the basetime
+        if c.basetime is not None:
+            end_period = datetime.strptime(c.end_date + str(c.basetime),
+                                           '%Y%m%d%H')
+            start_period = end_period - timedelta(hours=12-int(c.dtime))
+            return start_period, end_period
+
+        return generate_retrieval_period_boundary(c)
+
+    def output_suffix(self, c, cdate, ctime, cstep, number=None):
+        '''Creates the suffix of the name of a FLEXPART input file,
+        which follows the prefix, e.g. 13040500 for EN13040500.
+
+        For pure forecasts the suffix consists of the date, time and step
+        of the fields, otherwise of the valid time. For CERA-20C all four
+        digits of the year are needed, since it spans 1900 - 2010.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        cdate : str
+            The date of the fields, YYYYMMDD.
+
+        ctime : str
+            The time of the fields, HH.
+
+        cstep : str
+            The forecast step of the fields, e.g. 003.
+
+        number : str, optional
+            The ensemble member, which is added to the suffix.
+            Default value is None.
+
+        Return
+        ------
+        suffix : str
+            The suffix of the file name.
+        '''
+        if c.purefc:
+            if c.marsclass == 'EP':
+                suffix = cdate[0:8] + '.' + ctime + '.' + cstep
+            else:
+                suffix = cdate[2:8] + '.' + ctime + '.' + cstep
+        else:
+            timestamp = datetime.strptime(cdate + ctime, '%Y%m%d%H') + \
+                        timedelta(hours=int(cstep))
+            if c.marsclass == 'EP':
+                suffix = timestamp.strftime('%Y%m%d%H')
+            else:
+                suffix = timestamp.strftime('%y%m%d%H')
+
+        if number is not None:
+            suffix = suffix + '.N{:0>3}'.format(int(number))
+
+        return suffix
+
+    def _print_packing_report(self):
+        '''Prints the size reduction and the maximum quantization error
+        per parameter of the repacked output fields.
+
+        Parameters
+        ----------
+
+        Return
+        ------
+
+        '''
+        if not self.packing_stats:
+            return
+
+        print('\nPacking report:')
+        print('{:>8} {:>14} {:>14} {:>10} {:>14}'.format(
+            'paramId', 'bytes before', 'bytes after', 'reduction',
+            'max. error'))
+        total = [0, 0]
+        for paramId in sorted(self.packing_stats):
+            insize, outsize, error = self.packing_stats[paramId]
+            total[0] += insize
+            total[1] += outsize
+            print('{:>8} {:>14} {:>14} {:>9.1f}% {:>14.6g}'.format(
+                paramId, insize, outsize, 100. * (1. - float(outsize) / insize),
+                error))
+        print('{:>8} {:>14} {:>14} {:>9.1f}%\n'.format(
+            'total', total[0], total[1], 100. * (1. - float(total[1]) / total[0])))
+
+        return
+
+
+    def calc_extra_elda(self, path, prefix, workers=1):
         ''' Calculates extra ensemble members for ELDA - Stream.
 
         This is a specific feature which doubles the number of ensemble members
-        for the ELDA Stream.
+        for the ELDA Stream. The time steps are processed in parallel, each
+        control forecast file is read only once for all members.
 
         Parameters
         ----------
@@ -1798,58 +2729,74 @@ class EcFlexpart(object):
         prefix : str
             The prefix of the output filenames as defined in Control file.
 
+        workers : int, optional
+            Number of processes which work concurrently on the time steps.
+            Default value is 1.
+
         Return
         ------
 
         '''
-        from eccodes import (codes_grib_new_from_file, codes_get_array,
-                             codes_set_array, codes_release,
-                             codes_set, codes_write)
-
         # max number
         maxnum = int(self.number.split('/')[-1])
 
-        # get a list of all prepared output files with control forecast (CF)
-        cf_filelist = UioFiles(path, prefix + '*.N000')
-        cf_filelist.files = sorted(cf_filelist.files)
-
-        for cffile in cf_filelist.files:
-            with open(cffile, 'rb') as f:
-                cfvalues = []
-                while True:
-                    fid = codes_grib_new_from_file(f)
-                    if fid is None:
-                        break
-                    cfvalues.append(codes_get_array(fid, 'values'))
-                    codes_release(fid)
-
-            filename = cffile.split('N000')[0]
-            for i in range(1, maxnum + 1):
-                # read an ensemble member
-                g = open(filename + 'N{:0>3}'.format(i), 'rb')
-                # create file for newly calculated ensemble member
-                h = open(filename + 'N{:0>3}'.format(i+maxnum), 'wb')
-                # number of message in grib file
-                j = 0
-                while True:
-                    gid = codes_grib_new_from_file(g)
-                    if gid is None:
-                        break
-                    values = codes_get_array(gid, 'values')
-                    # generate a new ensemble member by subtracting
-                    # 2 * ( current time step value - last time step value )
-                    codes_set_array(gid, 'values',
-                                    values-2*(values-cfvalues[j]))
-                    codes_set(gid, 'number', i+maxnum)
-                    codes_write(gid, h)
-                    codes_release(gid)
-                    j += 1
-
-                g.close()
-                h.close()
-                print('wrote ' + filename + 'N{:0>3}'.format(i+maxnum))
-                self.outputfilelist.append(
-                    os.path.basename(filename + 'N{:0>3}'.format(i+maxnum)))
+        # get a list of all prepared output files with control forecast (CF),
+        # they were collected by create
+        cf_filelist = sorted(os.path.join(path, ofile) for ofile in
+                             fnmatch.filter(self.outputfilelist,
+                                            prefix + '*.N000'))
+
+        tasks = []
+        units = []
+        for cffile in cf_filelist:
+            # the time steps which were completed by a previous attempt of
+            # the run are skipped, the inputs are the files of the members
+            # as recorded by create
+            if self.checkpoint:
+                filename = os.path.basename(cffile).split('N000')[0]
+                newfiles = [filename + 'N{:0>3}'.format(i + maxnum)
+                            for i in range(1, maxnum + 1)]
+                memberfiles = [filename + 'N{:0>3}'.format(i)
+                               for i in range(maxnum + 1)]
+                inputs = mk_hash([self.checkpoint.record('create.' + ofile)
+                                  for ofile in memberfiles])
+                unit = 'elda.' + os.path.basename(cffile)
+                if self.checkpoint.done(unit, inputs,
+                                        then=['postprocessing.' + newfile
+                                              for newfile in newfiles]):
+                    self.outputfilelist.extend(newfiles)
+                    for newfile in newfiles:
+                        self.manifest[newfile] = {
+                            'member': int(newfile[-3:]),
+                            'valid_time': self.manifest[os.path.basename(
+                                cffile)]['valid_time']}
+                    continue
+                units.append((unit, inputs))
+            tasks.append((cffile, maxnum))
+
+        if workers > 1 and len(tasks) > 1:
+            from multiprocessing import Pool
+            pool = Pool(min(workers, len(tasks)))
+            try:
+                results = pool.map(_double_elda_members, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_double_elda_members(task) for task in tasks]
+
+        for i, (outputfiles, manifest) in enumerate(results):
+            self.outputfilelist.extend(outputfiles)
+            # the new members are valid at the time of the control forecast
+            valid_time = self.manifest[os.path.basename(
+                tasks[i][0])]['valid_time']
+            for ofile in outputfiles:
+                self.manifest[ofile] = dict(manifest[ofile],
+                                            valid_time=valid_time)
+            if self.checkpoint:
+                self.checkpoint.complete(
+                    units[i][0], [os.path.join(path, ofile)
+                                  for ofile in outputfiles], units[i][1])
 
         return
 
@@ -1859,10 +2806,12 @@ class EcFlexpart(object):
 
         The grib files are postprocessed depending on the selection in
         CONTROL file. The resulting files are moved to the output
-        directory if its not equal to the input directory.
+        directory if its not equal to the input directory. Each file is
+        added to the manifest of the output directory as soon as it
+        arrived there, which writes the FLEXPART AVAILABLE file anew.
         The following modifications might be done if
         properly switched in CONTROL file:
-        GRIB2 - Conversion to GRIB2
+        GRIB2 - Conversion to GRIB2, if not already done by create
         ECTRANS - Transfer of files to gateway server
         ECSTORAGE - Storage at ECMWF server
 
@@ -1874,7 +2823,8 @@ class EcFlexpart(object):
 
         Return
         ------
-
+        outputfiles : list of str
+            Sorted list of the paths of the final output files.
         '''
 
         print('\n\nPostprocessing:\n Format: {}\n'.format(c.format))
@@ -1888,35 +2838,514 @@ class EcFlexpart(object):
         print('Output filelist: ')
         print(sorted(self.outputfilelist))
 
+        # files are moved to the output directory after the transfers
+        if c.outputdir != c.inputdir:
+            outputdir = c.outputdir
+        else:
+            outputdir = None
+        transfer = _config.FLAG_ON_ECMWFSERVER and (c.ectrans or c.ecstorage)
+
+        # the files which were post-processed by a previous attempt of the
+        # run are skipped, unless they were created again; the transfers
+        # are not recorded
+        checkpoint = None if transfer else self.checkpoint
+        manifest = Manifest(outputdir or self.inputdir)
+        inputs = {}
+        tasks = []
         for ofile in self.outputfilelist:
-            ofile = os.path.join(self.inputdir, ofile)
+            path = os.path.join(self.inputdir, ofile)
+            if checkpoint:
+                # the moved files are only checked in the output directory
+                inputs[ofile] = mk_hash(file_stats([path])) \
+                    if os.path.isfile(path) else None
+                if checkpoint.done('postprocessing.' + ofile, inputs[ofile]):
+                    continue
+            tasks.append((path, c.format.lower() == 'grib2',
+                          None if transfer else outputdir))
+
+        # the conversions run in a pool of processes, the transfers of
+        # converted files in a bounded queue of threads meanwhile
+        nworkers = min(c.postproc_workers, max(len(tasks), 1))
+        pool = None
+        if nworkers > 1:
+            from multiprocessing import Pool
+            pool = Pool(nworkers)
+            results = pool.imap_unordered(_postprocess_file, tasks)
+        else:
+            results = (_postprocess_file(task) for task in tasks)
+
+        errors = []
+        if transfer:
+            tqueue = Queue(maxsize=2 * nworkers)
+            threads = [threading.Thread(target=_transfer_files,
+                                        args=(tqueue, c, outputdir, errors,
+                                              manifest))
+                       for i in range(nworkers)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+        try:
+            for ofile, info, error in results:
+                if error:
+                    errors.append(error)
+                    break
+                entry = self._manifest_entry(ofile, info)
+                if transfer:
+                    # waits if too many files are waiting for the transfer
+                    tqueue.put((ofile, entry))
+                    continue
+                manifest.add([entry])
+                if checkpoint:
+                    checkpoint.complete('postprocessing.' + entry['name'],
+                                        [ofile], inputs[entry['name']])
+        finally:
+            if pool:
+                if errors:
+                    pool.terminate()
+                else:
+                    pool.close()
+                pool.join()
+
+        # drain the transfer queue before leaving
+        if transfer:
+            for thread in threads:
+                tqueue.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise ProcessingError(errors[0])
+
+        return sorted(os.path.join(outputdir or self.inputdir, ofile)
+                      for ofile in self.outputfilelist)
+
+    def _manifest_entry(self, ofile, info=None):
+        '''Creates the manifest entry of a post-processed output file.
 
-            if c.format.lower() == 'grib2':
-                execute_subprocess(['grib_set', '-s', 'edition=2,' +
-                                    'productDefinitionTemplateNumber=8',
-                                    ofile, ofile + '_2'],
-                                   error_msg='GRIB2 CONVERSION FAILED!')
+        Parameters
+        ----------
+        ofile : str
+            Path of the output file.
+
+        info : tuple, optional
+            The number of messages and the checksum of the file if it was
+            converted by the post-processing. Default value is None.
+
+        Return
+        ------
+        entry : dict
+            The name, valid time, ensemble member, size, checksum and
+            number of messages of the file.
+        '''
+        name = os.path.basename(ofile)
+        entry = dict(self.manifest[name], name=name,
+                     size=os.path.getsize(ofile))
+        if info:
+            entry['messages'], entry['sha1'] = info
+        elif 'sha1' not in entry:
+            # the file was created by a previous attempt of the run
+            entry['messages'], entry['sha1'] = describe_file(ofile)
+
+        return entry
+
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def _process_member(task):
+    '''Processes a single ensemble member in a worker of the pool
+    started by EcFlexpart._run_members.
+
+    Parameters
+    ----------
+    task : tuple
+        The EcFlexpart instance, the name of the method, the input files,
+        the ControlFile, the ensemble member number and the path of the
+        scratch directory.
 
-                execute_subprocess(['mv', ofile + '_2', ofile],
-                                   error_msg='RENAMING FOR NEW GRIB2 FORMAT '
-                                   'FILES FAILED!')
+    Return
+    ------
+    outputfiles : list of str
+        The names of the output files created for this member.
+
+    stats : dict
+        The packing statistics of this member.
+
+    manifest : dict
+        The manifest entries of the output files of this member.
+
+    error : str
+        The error message if the processing was stopped, otherwise None.
+    '''
+    flexpart, method, inputfiles, c, number, workdir = task
+
+    make_dir(workdir)
+    shutil.copy(os.path.join(c.inputdir, _config.FILE_NAMELIST), workdir)
+
+    nfiles = len(flexpart.outputfilelist)
+    try:
+        getattr(flexpart, method)(inputfiles, c, [number], workdir)
+    except FlexExtractError as e:
+        # the error is reported with the number of the member
+        return [], {}, {}, str(e)
+
+    return (flexpart.outputfilelist[nfiles:], flexpart.packing_stats,
+            flexpart.manifest, None)
+
+def _double_elda_members(task):
+    '''Calculates the extra ELDA ensemble members for a single time step.
+
+    The values of the control forecast are read once and the new members
+    are the existing members mirrored at the control forecast. The message
+    of the existing member is reused as header, only the member number
+    is changed.
+
+    Parameters
+    ----------
+    task : tuple
+        The path of the control forecast file (N000) and the maximum
+        ensemble member number.
+
+    Return
+    ------
+    outputfiles : list of str
+        The names of the newly created member files.
+
+    manifest : dict
+        The member number, number of messages and checksum of each new
+        member file.
+    '''
+    from eccodes import (codes_grib_new_from_file, codes_get_values,
+                         codes_set_values, codes_release, codes_set,
+                         codes_get_message, codes_is_defined)
+
+    cffile, maxnum = task
+
+    with open(cffile, 'rb') as f:
+        cfvalues = []
+        while True:
+            fid = codes_grib_new_from_file(f)
+            if fid is None:
+                break
+            cfvalues.append(codes_get_values(fid))
+            codes_release(fid)
+    memory_checkpoint('calc_extra_elda')
+
+    outputfiles = []
+    manifest = {}
+    filename = cffile.split('N000')[0]
+    for i in range(1, maxnum + 1):
+        newfile = filename + 'N{:0>3}'.format(i+maxnum)
+        digest = hashlib.sha1()
+        # read an ensemble member and
+        # create file for newly calculated ensemble member
+        with open(filename + 'N{:0>3}'.format(i), 'rb') as g, \
+             open(newfile, 'wb') as h:
+            # number of message in grib file
+            j = 0
+            while True:
+                gid = codes_grib_new_from_file(g)
+                if gid is None:
+                    break
+                values = codes_get_values(gid)
+                # generate a new ensemble member by subtracting
+                # 2 * ( current time step value - last time step value )
+                codes_set_values(gid, values - 2 * (values - cfvalues[j]))
+                # GRIB2 output files carry no member number
+                if codes_is_defined(gid, 'number'):
+                    codes_set(gid, 'number', i+maxnum)
+                message = codes_get_message(gid)
+                h.write(message)
+                digest.update(message)
+                codes_release(gid)
+                j += 1
+
+        print('wrote ' + newfile)
+        outputfiles.append(os.path.basename(newfile))
+        manifest[os.path.basename(newfile)] = {
+            'member': i+maxnum, 'messages': j, 'sha1': digest.hexdigest()}
+
+    return outputfiles, manifest
+
+def _index_messages(iids, index_keys, prod):
+    '''Reads the messages of a combination of index values from one or
+    more indices, in the order of the indices.
+
+    Parameters
+    ----------
+    iids : iterable of codes_index
+        The indices, e.g. of each input file.
+
+    index_keys : list of str
+        The names of the index keys, e.g. ["date", "time", "step"].
+
+    prod : tuple of str
+        The values of the index keys.
+
+    Return
+    ------
+    gid : generator of codes_handle
+        The messages, which have to be released by the caller.
+    '''
+    from eccodes import codes_index_select, codes_new_from_index
+
+    for iid in iids:
+        for key, value in zip(index_keys, prod):
+            codes_index_select(iid, key, value)
+        gid = codes_new_from_index(iid)
+        while gid is not None:
+            yield gid
+            gid = codes_new_from_index(iid)
 
-            if c.ectrans and _config.FLAG_ON_ECMWFSERVER:
+def _postprocess_file(task):
+    '''Converts a single output file to GRIB2, if selected, and moves it
+    to the output directory.
+
+    The converted file replaces the original one by an atomic rename.
+
+    Parameters
+    ----------
+    task : tuple
+        The path of the output file, the switch for the GRIB2 conversion
+        and the output directory, which is None if the file stays in place.
+
+    Return
+    ------
+    ofile : str
+        The path of the output file.
+
+    info : tuple
+        The number of messages and the checksum of the converted file,
+        None if the file was not converted.
+
+    error : str
+        The error message if the post-processing failed, otherwise None.
+    '''
+    from eccodes import (codes_grib_new_from_file, codes_get,
+                         codes_release, CodesInternalError)
+
+    ofile, grib2, outputdir = task
+
+    info = None
+    if grib2:
+        try:
+            # files assembled by create are already GRIB2
+            with open(ofile, 'rb') as f:
+                gid = codes_grib_new_from_file(f)
+                edition = codes_get(gid, 'edition') if gid else 2
+                if gid:
+                    codes_release(gid)
+            if edition != 2:
+                digest = hashlib.sha1()
+                with open(ofile + '_2', 'wb') as g:
+                    messages = _copy_grib(ofile, g, grib2=True,
+                                          digest=digest)
+                os.rename(ofile + '_2', ofile)
+                info = (messages, digest.hexdigest())
+        except (CodesInternalError, IOError, OSError) as e:
+            print('... ERROR MESSAGE:\n \t ' + str(e))
+            return ofile, None, '... GRIB2 CONVERSION FAILED!'
+
+    if outputdir:
+        try:
+            ofile = move_file(ofile, outputdir)
+        except (IOError, OSError) as e:
+            print('... ERROR MESSAGE:\n \t ' + str(e))
+            return ofile, None, ('... RELOCATION OF OUTPUT FILES '
+                                 'TO OUTPUTDIR FAILED!')
+
+    return ofile, info, None
+
+def _copy_grib(filename, fout, grib2=False, packing=None, stats=None,
+               digest=None):
+    '''Writes all messages of a grib file to an open file, converted to
+    GRIB2 and repacked if selected.
+
+    The messages are converted like with
+    "grib_set -s edition=2,productDefinitionTemplateNumber=8".
+    Grid point fields are repacked with the bits per value and packing
+    type of their parameter.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the grib file to be copied.
+
+    fout : file
+        The open output file.
+
+    grib2 : boolean, optional
+        Switch for the conversion to GRIB2. Default value is False.
+
+    packing : dict, optional
+        The bits per value and packing type per parameter id or 'ALL'.
+        Default value is None.
+
+    stats : dict, optional
+        Collects input bytes, output bytes and maximum absolute
+        quantization error per parameter id. Default value is None.
+
+    digest : hashlib.sha1, optional
+        Is updated with the written messages. Default value is None.
+
+    Return
+    ------
+    messages : int
+        The number of written messages.
+    '''
+    import numpy as np
+    from eccodes import (codes_grib_new_from_file, codes_set_key_vals,
+                         codes_get_message, codes_release, codes_get,
+                         codes_set, codes_get_values, codes_set_values,
+                         codes_get_message_size)
+
+    messages = 0
+    with open(filename, 'rb') as f:
+        while True:
+            gid = codes_grib_new_from_file(f)
+            if gid is None:
+                break
+            # the conversion to GRIB2 may change the parameter id
+            paramId = codes_get(gid, 'paramId')
+            if grib2:
+                codes_set_key_vals(gid, 'edition=2,'
+                                   'productDefinitionTemplateNumber=8')
+            if packing and \
+               codes_get(gid, 'packingType').startswith('grid_'):
+                setting = packing.get(paramId, packing.get('ALL'))
+                if setting:
+                    insize = codes_get_message_size(gid)
+                    values = codes_get_values(gid)
+                    if setting[1]:
+                        codes_set(gid, 'packingType', setting[1])
+                    codes_set(gid, 'bitsPerValue', setting[0])
+                    codes_set_values(gid, values)
+                    error = np.max(np.abs(codes_get_values(gid) - values))
+                    if stats is not None:
+                        _merge_packing_stats(stats, {paramId: [
+                            insize, codes_get_message_size(gid), error]})
+            message = codes_get_message(gid)
+            fout.write(message)
+            if digest is not None:
+                digest.update(message)
+            codes_release(gid)
+            messages += 1
+
+    return messages
+
+def _copy_file(filename, fout, digest):
+    '''Writes a grib file unchanged to an open file.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the grib file to be copied.
+
+    fout : file
+        The open output file.
+
+    digest : hashlib.sha1
+        Is updated with the written data.
+
+    Return
+    ------
+    messages : int
+        The number of written messages.
+    '''
+    from eccodes import codes_count_in_file
+
+    with open(filename, 'rb') as f:
+        messages = codes_count_in_file(f)
+        f.seek(0)
+        for data in iter(lambda: f.read(1 << 20), b''):
+            fout.write(data)
+            digest.update(data)
+
+    return messages
+
+def _merge_packing_stats(stats, new):
+    '''Adds packing statistics to the collected ones.
+
+    Parameters
+    ----------
+    stats : dict
+        The collected input bytes, output bytes and maximum absolute
+        quantization error per parameter id.
+
+    new : dict
+        The statistics to be added.
+
+    Return
+    ------
+
+    '''
+    for paramId, (insize, outsize, error) in new.items():
+        entry = stats.setdefault(paramId, [0, 0, 0.])
+        entry[0] += insize
+        entry[1] += outsize
+        entry[2] = max(entry[2], error)
+
+    return
+
+def _transfer_files(tqueue, c, outputdir, errors, manifest):
+    '''Transfers the output files from a queue to the gateway server and
+    the ECMWF storage, moves them to the output directory afterwards and
+    adds them to the manifest.
+
+    Runs in a thread until it gets None from the queue. After the first
+    error the remaining files are only taken from the queue.
+
+    Parameters
+    ----------
+    tqueue : Queue
+        The queue with the paths and the manifest entries of the output
+        files.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    outputdir : str
+        Path of the output directory or None if the files stay in place.
+
+    errors : list of str
+        The error messages, shared by all threads.
+
+    manifest : Manifest
+        The manifest of the output directory.
+
+    Return
+    ------
+
+    '''
+    while True:
+        item = tqueue.get()
+        if item is None:
+            return
+        if errors:
+            continue
+        ofile, entry = item
+
+        try:
+            if c.ectrans:
                 execute_subprocess(['ectrans', '-overwrite', '-gateway',
                                     c.gateway, '-remote', c.destination,
                                     '-source', ofile],
                                    error_msg='TRANSFER TO LOCAL SERVER FAILED!')
 
-            if c.ecstorage and _config.FLAG_ON_ECMWFSERVER:
+            if c.ecstorage:
                 execute_subprocess(['ecp', '-o', ofile,
                                     os.path.expandvars(c.ecfsdir)],
                                    error_msg='COPY OF FILES TO ECSTORAGE '
                                    'AREA FAILED!')
 
-            if c.outputdir != c.inputdir:
-                execute_subprocess(['mv', os.path.join(c.inputdir, ofile),
-                                    c.outputdir],
-                                   error_msg='RELOCATION OF OUTPUT FILES '
-                                   'TO OUTPUTDIR FAILED!')
-
-        return
+            if outputdir:
+                move_file(ofile, outputdir)
+            manifest.add([entry])
+        except FlexExtractError as e:
+            errors.append(str(e))
+        except (IOError, OSError) as e:
+            print('... ERROR MESSAGE:\n \t ' + str(e))
+            errors.append('... RELOCATION OF OUTPUT FILES '
+                          'TO OUTPUTDIR FAILED!')
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import glob
+from datetime import datetime, timedelta
+
+# software specific modules from flex_extract
+#pylint: disable=wrong-import-position
+sys.path.append('../')
+from Mods.tools import silent_remove
+from Mods.errors import FieldsNotAvailableError
+#pylint: enable=wrong-import-position
+
+# ------------------------------------------------------------------------------
+# CLASS
+# ------------------------------------------------------------------------------
+
+class LocalServer(object):
+    """Stand-in for the MARS server which serves the fields of the GRIB
+    files in a local directory.
+
+    It is used like the ECMWFService of the ECMWF Web API, e.g. to test the
+    streaming mode without access to MARS. The messages are selected by
+    type, level type, parameter, date, time, step and ensemble member.
+    The other keywords of the request, like the grid and the area, are
+    not applied, so the files have to contain the fields as they are
+    requested. A request fails like a MARS request for fields which are
+    not yet available, if there is no message for one of the requested
+    combinations of date, time and step.
+
+    Attributes
+    ----------
+    path : str
+        Path to the directory with the GRIB files.
+    """
+
+    # --------------------------------------------------------------------------
+    # CLASS METHODS
+    # --------------------------------------------------------------------------
+    def __init__(self, path):
+        """Assigns the directory with the GRIB files.
+
+        Parameters
+        ----------
+        path : str
+            Path to the directory with the GRIB files.
+
+        Return
+        ------
+
+        """
+
+        self.path = os.path.abspath(path)
+
+        return
+
+    def execute(self, request, target):
+        """Writes the messages which match the request to the target file.
+
+        Parameters
+        ----------
+        request : dict
+            The keywords and values of the MARS request.
+
+        target : str
+            Path to the file for the retrieved messages.
+
+        Return
+        ------
+
+        """
+        from eccodes import (codes_grib_new_from_file, codes_get,
+                             codes_write, codes_release)
+
+        selection = _mk_selection(request)
+        missing = set(selection['product'])
+
+        with open(target, 'wb') as fout:
+            for filename in sorted(glob.glob(os.path.join(self.path, '*'))):
+                if not os.path.isfile(filename) or \
+                   os.path.abspath(filename) == os.path.abspath(target):
+                    continue
+                with open(filename, 'rb') as f:
+                    while True:
+                        gid = codes_grib_new_from_file(f)
+                        if gid is None:
+                            break
+                        product = (codes_get(gid, 'dataDate'),
+                                   codes_get(gid, 'dataTime') // 100,
+                                   codes_get(gid, 'step'))
+                        if product in selection['product'] and \
+                           _matches(gid, selection):
+                            codes_write(gid, fout)
+                            missing.discard(product)
+                        codes_release(gid)
+
+        if missing:
+            silent_remove(target)
+            raise FieldsNotAvailableError(
+                'Fields not available for date, time and step: ' +
+                ', '.join('{} {:0>2} {}'.format(*product)
+                          for product in sorted(missing)))
+
+        return
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def expand_values(value):
+    '''Expands a MARS list of values, e.g. '3/to/12/by/3' or '00/12'.
+
+    Parameters
+    ----------
+    value : str
+        The value of a MARS keyword. Dates of a range are in the
+        format YYYYMMDD.
+
+    Return
+    ------
+    values : list of str
+        The single values.
+    '''
+    parts = str(value).split('/')
+    if len(parts) < 3 or parts[1].lower() != 'to':
+        return parts
+
+    if len(parts[0]) == 8:
+        # a range of dates
+        day = datetime.strptime(parts[0], '%Y%m%d')
+        last = datetime.strptime(parts[2], '%Y%m%d')
+        values = []
+        while day <= last:
+            values.append(day.strftime('%Y%m%d'))
+            day += timedelta(days=1)
+        return values
+
+    by = int(parts[4]) if len(parts) > 4 else 1
+
+    return [str(v) for v in range(int(parts[0]), int(parts[2]) + 1, by)]
+
+def _mk_selection(request):
+    '''Converts the keywords of a request into the values of the GRIB keys.
+
+    Parameters
+    ----------
+    request : dict
+        The keywords and values of the MARS request.
+
+    Return
+    ------
+    selection : dict
+        The set of (date, time, step) combinations under the key 'product'
+        and the sets of values of the other GRIB keys.
+    '''
+    selection = {}
+    selection['product'] = set(
+        (int(date), int(time) // 100 if int(time) >= 100 else int(time),
+         int(step))
+        for date in expand_values(request['date'])
+        for time in expand_values(request['time'])
+        for step in expand_values(request.get('step', '0')))
+
+    # parameters of table 128 have the number itself as id
+    params = set()
+    for param in expand_values(request['param']):
+        number, _, table = param.partition('.')
+        if table and table != '128':
+            params.add(int(table) * 1000 + int(number))
+        else:
+            params.add(int(number))
+    selection['paramId'] = params
+
+    selection['marsType'] = set([str(request['type']).lower()])
+    selection['levtype'] = set([str(request['levtype']).lower()])
+
+    number = str(request.get('number', 'OFF'))
+    if number.upper() != 'OFF':
+        selection['number'] = set(int(n) for n in expand_values(number))
+
+    return selection
+
+def _matches(gid, selection):
+    '''Checks the keys of a message, apart from date, time and step.
+
+    Parameters
+    ----------
+    gid : int
+        The GRIB message.
+
+    selection : dict
+        The selected values of the GRIB keys.
+
+    Return
+    ------
+    match : bool
+        True if the message is selected.
+    '''
+    from eccodes import codes_get
+
+    for key, values in selection.items():
+        if key == 'product':
+            continue
+        value = codes_get(gid, key)
+        if isinstance(value, str):
+            value = value.lower()
+        if value not in values:
+            return False
+
+    return True
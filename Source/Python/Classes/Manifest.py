@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import json
+import hashlib
+
+# software specific modules from flex_extract
+#pylint: disable=wrong-import-position
+sys.path.append('../')
+import _config
+from Mods.tools import file_lock
+#pylint: enable=wrong-import-position
+
+# ------------------------------------------------------------------------------
+# CLASS
+# ------------------------------------------------------------------------------
+
+class Manifest(object):
+    """Manifest of the FLEXPART input files in an output directory.
+
+    Each output file is added as a line to the file manifest.jsonl as soon
+    as it arrived in the output directory, with its name, valid time,
+    ensemble member, size, SHA-1 checksum and number of GRIB messages.
+    After each addition the FLEXPART AVAILABLE file is written anew from
+    the manifest, so that FLEXPART can be started on the files which are
+    completed so far. The files of the ensemble members are listed in an
+    AVAILABLE file per member, e.g. AVAILABLE.N001.
+
+    The manifest is locked while it is extended, therefore several runs,
+    e.g. the job chunks or the workers of a work queue, can add their
+    files to the same output directory. If a file is added again, its
+    latest line is valid.
+
+    Attributes
+    ----------
+    path : str
+        Path to the manifest file.
+
+    entries : dict
+        The latest entry of each output file.
+    """
+
+    # the header of the AVAILABLE file, FLEXPART skips the first three
+    # lines and reads the rest with the format (i8,1x,i6,2(6x,a16))
+    header = ['DATE     TIME         FILENAME     SPECIFICATIONS',
+              'YYYYMMDD HHMMSS',
+              '________ ______      __________      __________']
+
+    # --------------------------------------------------------------------------
+    # CLASS METHODS
+    # --------------------------------------------------------------------------
+    def __init__(self, outputdir):
+        """Assigns the manifest of an output directory. It is read when
+        files are added.
+
+        Parameters
+        ----------
+        outputdir : str
+            Path to the output directory.
+
+        Return
+        ------
+
+        """
+
+        self.path = os.path.join(os.path.abspath(outputdir),
+                                 _config.FILE_MANIFEST)
+        self.entries = {}
+        self._offset = 0
+
+        return
+
+    def add(self, entries):
+        """Adds output files to the manifest and writes the AVAILABLE files
+        of their ensemble members anew.
+
+        Parameters
+        ----------
+        entries : list of dict
+            The entries of the output files with the keys "name",
+            "valid_time" (YYYYMMDDHH), "member", "size", "sha1" and
+            "messages".
+
+        Return
+        ------
+
+        """
+
+        lines = ''.join(json.dumps(entry, sort_keys=True) + '\n'
+                        for entry in entries)
+        with file_lock(self.path):
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                os.write(fd, lines.encode())
+            finally:
+                os.close(fd)
+
+            # the entries of the other runs are included
+            self.read()
+            for member in sorted(set(entry['member'] for entry in entries),
+                                 key=str):
+                self._write_available(member)
+
+        return
+
+    def read(self):
+        """Reads the lines which were added to the manifest since the last
+        reading.
+
+        Parameters
+        ----------
+
+        Return
+        ------
+        entries : dict
+            The latest entry of each output file.
+        """
+
+        if not os.path.isfile(self.path):
+            return self.entries
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # a line which is still written is read next time
+        data = data[:data.rfind(b'\n') + 1]
+        self._offset += len(data)
+
+        for line in data.decode().splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self.entries[entry['name']] = entry
+
+        return self.entries
+
+    def available(self, member=None):
+        """Creates the lines of an AVAILABLE file.
+
+        Parameters
+        ----------
+        member : int, optional
+            The ensemble member. Default value is None, for the files
+            without member number.
+
+        Return
+        ------
+        lines : list of str
+            The header and the files of the member, ordered by their
+            valid time.
+        """
+
+        lines = list(self.header)
+        for entry in sorted(self.entries.values(),
+                            key=lambda e: (e['valid_time'], e['name'])):
+            if entry['member'] == member:
+                lines.append('{} {}0000      {:<16}      ON DISK'.format(
+                    entry['valid_time'][:8], entry['valid_time'][8:10],
+                    entry['name']))
+
+        return lines
+
+    def _write_available(self, member):
+        """Replaces the AVAILABLE file of an ensemble member at once.
+
+        Parameters
+        ----------
+        member : int
+            The ensemble member or None.
+
+        Return
+        ------
+
+        """
+
+        path = os.path.join(os.path.dirname(self.path),
+                            available_name(member))
+        with open(path + '.' + str(os.getpid()), 'w') as f:
+            f.write('\n'.join(self.available(member)) + '\n')
+        os.rename(f.name, path)
+
+        return
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def available_name(member=None):
+    '''Returns the name of the AVAILABLE file of an ensemble member.
+
+    Parameters
+    ----------
+    member : int, optional
+        The ensemble member. Default value is None, for the files without
+        member number.
+
+    Return
+    ------
+    name : str
+        The name of the file, e.g. AVAILABLE or AVAILABLE.N001.
+    '''
+
+    if member is None:
+        return _config.FILE_AVAILABLE
+
+    return _config.FILE_AVAILABLE + '.N{:0>3}'.format(int(member))
+
+def describe_file(path):
+    '''Determines the checksum and the number of GRIB messages of a file
+    which was not described when it was written, e.g. by a previous
+    attempt of the run.
+
+    Parameters
+    ----------
+    path : str
+        Path to the GRIB file.
+
+    Return
+    ------
+    messages : int
+        The number of GRIB messages.
+
+    sha1 : str
+        The SHA-1 checksum of the file.
+    '''
+    from eccodes import codes_count_in_file
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        messages = codes_count_in_file(f)
+        f.seek(0)
+        for data in iter(lambda: f.read(1 << 20), b''):
+            digest.update(data)
+
+    return messages, digest.hexdigest()
@@ -36,6 +36,7 @@
 from __future__ import print_function
 
 import os
+import re
 import sys
 import subprocess
 import traceback
@@ -44,20 +45,14 @@ import traceback
 #pylint: disable=wrong-import-position
 sys.path.append('../')
 import _config
-#pylint: disable=invalid-name
-try:
-    ec_api = True
-    import ecmwfapi
-except ImportError:
-    ec_api = False
-
-try:
-    cds_api = True
-    import cdsapi
-except ImportError:
-    cds_api = False
-#pylint: enable=invalid-name
+from Mods.errors import RetrievalError, FieldsNotAvailableError
+from Classes.LocalServer import LocalServer
 #pylint: enable=wrong-import-position
+
+# the messages of MARS and the APIs if the requested fields do not exist,
+# e.g. "Expected 4, got 0."
+NO_DATA = re.compile(r'no data|expected \d+, got 0\b', re.IGNORECASE)
+
 # ------------------------------------------------------------------------------
 # CLASS
 # ------------------------------------------------------------------------------
@@ -77,7 +72,7 @@ class MarsRetrieval(object):
 
     Attributes
     ----------
-    server : ECMWFService or ECMWFDataServer
+    server : ECMWFService, ECMWFDataServer or LocalServer
         This is the connection to the ECMWF data servers.
 
     public : int
@@ -564,8 +559,11 @@ class MarsRetrieval(object):
 
         # MARS request via Python script
         if self.server:
+            # the API module was already imported when the server was created
+            cdsapi = sys.modules.get('cdsapi')
+            ecmwfapi = sys.modules.get('ecmwfapi')
             try:
-                if cds_api and isinstance(self.server, cdsapi.Client):
+                if cdsapi and isinstance(self.server, cdsapi.Client):
                     # distinguish between model (ECMWF MARS access) 
                     # and surface level (CS3 online access)
                     if attrs['levtype'].lower() == 'ml':
@@ -576,12 +574,15 @@ class MarsRetrieval(object):
                     print('RETRIEVE ERA5 WITH CDS API!')
                     self.server.retrieve(dataset,
                                          attrs, target)
-                elif ec_api and isinstance(self.server, ecmwfapi.ECMWFDataServer):
+                elif ecmwfapi and isinstance(self.server, ecmwfapi.ECMWFDataServer):
                     print('RETRIEVE PUBLIC DATA (NOT ERA5)!')
                     self.server.retrieve(attrs)
-                elif ec_api and isinstance(self.server, ecmwfapi.ECMWFService):
+                elif ecmwfapi and isinstance(self.server, ecmwfapi.ECMWFService):
                     print('EXECUTE NON-PUBLIC RETRIEVAL (NOT ERA5)!')
                     self.server.execute(attrs, target)
+                elif isinstance(self.server, LocalServer):
+                    print('RETRIEVE FROM LOCAL DIRECTORY!')
+                    self.server.execute(attrs, target)
                 else:
                     print('ERROR:')
                     print('No match for Web API instance!')
@@ -589,8 +590,12 @@ class MarsRetrieval(object):
             except Exception as e:
                 print('\n\nMARS Request failed!')
                 print(e)
+                if isinstance(e, FieldsNotAvailableError) or \
+                   NO_DATA.search(str(e)):
+                    raise FieldsNotAvailableError('MARS Request returned no '
+                                                  'data!', code=1)
                 print(traceback.format_exc())
-                sys.exit()
+                raise RetrievalError('MARS Request failed!', code=1)
 
         # MARS request via call in shell
         else:
@@ -606,11 +611,16 @@ class MarsRetrieval(object):
             pout = p.communicate(input=request_str.encode())[0]
             print(pout.decode())
 
-            if 'Some errors reported' in pout.decode():
+            if NO_DATA.search(pout.decode()):
+                print('MARS Request returned no data - please check request')
+                raise FieldsNotAvailableError('MARS Request returned no data!',
+                                              code=1)
+            elif 'Some errors reported' in pout.decode():
                 print('MARS Request failed - please check request')
                 raise IOError
             elif os.stat(target).st_size == 0:
                 print('MARS Request returned no data - please check request')
-                raise IOError
+                raise FieldsNotAvailableError('MARS Request returned no data!',
+                                              code=1)
 
         return
@@ -67,11 +67,14 @@ class UioFiles(object):
 
     files : list of str
         List of files matching the pattern in the path.
+
+    workspace : Workspace
+        Inventory of the directory the files were taken from or None.
     """
     # --------------------------------------------------------------------------
     # CLASS METHODS
     # --------------------------------------------------------------------------
-    def __init__(self, path, pattern):
+    def __init__(self, path, pattern, workspace=None):
         """Assignes a specific pattern for these files.
 
         Parameters
@@ -82,6 +85,11 @@ class UioFiles(object):
         pattern : str
             Regular expression pattern. For example: '*.grb'
 
+        workspace : Workspace, optional
+            Inventory of the directory. If it is passed, the files are taken
+            from the inventory without the sub-directories, instead of
+            walking through the directory. Default value is None.
+
         Return
         ------
 
@@ -90,8 +98,12 @@ class UioFiles(object):
         self.path = path
         self.pattern = pattern
         self.files = []
+        self.workspace = workspace
 
-        self._list_files(self.path)
+        if workspace is not None:
+            self.files = workspace.select(self.pattern)
+        else:
+            self._list_files(self.path)
 
         return
 
@@ -153,5 +165,7 @@ class UioFiles(object):
 
         for old_file in self.files:
             silent_remove(old_file)
+            if self.workspace is not None:
+                self.workspace.remove(old_file)
 
         return
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import fnmatch
+
+# software specific modules from flex_extract
+#pylint: disable=wrong-import-position
+sys.path.append('../')
+from Mods.tools import silent_remove
+#pylint: enable=wrong-import-position
+
+# ------------------------------------------------------------------------------
+# CLASS
+# ------------------------------------------------------------------------------
+
+class Workspace(object):
+    """Inventory of the files in a working directory.
+
+    The directory is scanned once, without its sub-directories. The names of
+    the retrieved files, e.g. FCOG_acc_SL.20160409.40429.16424.grb, are
+    indexed by their parts, so that the files can be selected without
+    further access to the file system. The stages register the files they
+    add or remove.
+
+    Attributes
+    ----------
+    path : str
+        Absolute path of the directory.
+
+    files : set of str
+        Names of the files in the directory.
+
+    dirs : set of str
+        Names of the sub-directories.
+
+    index : dict of dict
+        For each of the keys "ftype", "grid", "date", "ppid" and "pid" the
+        names of the files with a certain value of this part of the name.
+    """
+
+    keys = ('ftype', 'grid', 'date', 'ppid', 'pid')
+
+    # --------------------------------------------------------------------------
+    # CLASS METHODS
+    # --------------------------------------------------------------------------
+    def __init__(self, path):
+        """Scans the directory.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the files.
+
+        Return
+        ------
+
+        """
+
+        self.path = os.path.abspath(path)
+        self.files = set()
+        self.dirs = set()
+        self.index = dict((key, {}) for key in self.keys)
+
+        self.rescan()
+
+        return
+
+    def rescan(self):
+        """Builds the inventory from the current content of the directory.
+
+        Parameters
+        ----------
+
+        Return
+        ------
+
+        """
+
+        self.files = set()
+        self.dirs = set()
+        self.index = dict((key, {}) for key in self.keys)
+
+        if not os.path.isdir(self.path):
+            return
+
+        if hasattr(os, 'scandir'):
+            for entry in os.scandir(self.path):
+                if entry.is_dir():
+                    self.dirs.add(entry.name)
+                else:
+                    self.add(entry.name)
+        else:
+            for name in os.listdir(self.path):
+                if os.path.isdir(os.path.join(self.path, name)):
+                    self.dirs.add(name)
+                else:
+                    self.add(name)
+
+        return
+
+    def add(self, filename):
+        """Registers a file which was added to the directory.
+
+        Parameters
+        ----------
+        filename : str
+            Name or path of the file.
+
+        Return
+        ------
+
+        """
+
+        name = os.path.basename(filename)
+        self.files.add(name)
+        for key, value in parse_filename(name).items():
+            self.index[key].setdefault(value, set()).add(name)
+
+        return
+
+    def remove(self, filename):
+        """Unregisters a file which was removed from the directory.
+
+        Parameters
+        ----------
+        filename : str
+            Name or path of the file.
+
+        Return
+        ------
+
+        """
+
+        name = os.path.basename(filename)
+        self.files.discard(name)
+        for key, value in parse_filename(name).items():
+            self.index[key].get(value, set()).discard(name)
+
+        return
+
+    def select(self, pattern='*', **parts):
+        """Selects files by a pattern and by parts of their names.
+
+        Parameters
+        ----------
+        pattern : str, optional
+            Pattern of the file names. For example: '*.grb'
+            Default value is '*'.
+
+        parts : dict, optional
+            Values of the parts of the names, e.g. grid='OG_OROLSM__SL' or
+            ppid='1234'.
+
+        Return
+        ------
+        files : list of str
+            Sorted list of the absolute paths of the matching files.
+        """
+
+        names = self.files
+        for key, value in parts.items():
+            names = names & self.index[key].get(str(value), set())
+
+        return sorted(os.path.join(self.path, name)
+                      for name in fnmatch.filter(names, pattern))
+
+    def delete(self, pattern='*', **parts):
+        """Deletes the selected files.
+
+        Parameters
+        ----------
+        pattern : str, optional
+            Pattern of the file names. Default value is '*'.
+
+        parts : dict, optional
+            Values of the parts of the names.
+
+        Return
+        ------
+
+        """
+
+        for filename in self.select(pattern, **parts):
+            silent_remove(filename)
+            self.remove(filename)
+
+        return
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def parse_filename(name):
+    '''Splits the name of a retrieved file into its parts.
+
+    The names consist of the field type, the grid code, the date, the
+    parent process id and the process id, e.g.
+    FCOG_acc_SL.20160409.40429.16424.grb. The field type is missing for
+    some fields, e.g. OG_OROLSM__SL.20160410.40429.16424.grb.
+
+    Parameters
+    ----------
+    name : str
+        Name of the file.
+
+    Return
+    ------
+    parts : dict
+        The values of the keys "ftype", "grid", "date", "ppid" and "pid".
+        Empty for files with another name.
+    '''
+    fields = name.split('.')
+    if len(fields) != 5 or fields[4] != 'grb':
+        return {}
+
+    code = fields[0]
+    if code[2:4] in ('SH', 'GG', 'OG'):
+        ftype, grid = code[:2], code[2:]
+    else:
+        ftype, grid = '', code
+
+    return {'ftype': ftype, 'grid': grid, 'date': fields[1],
+            'ppid': fields[2], 'pid': fields[3]}
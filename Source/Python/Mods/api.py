@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#*******************************************************************************
+'''This module is the programming interface of flex_extract.
+
+It runs extractions within the calling Python process, so that a long
+living process can run many extractions without starting a new
+interpreter for each of them. The settings come from a dictionary,
+optionally on top of a CONTROL file, and errors are raised as the
+exceptions of Mods.errors instead of terminating the program.
+
+Example
+-------
+>>> from Mods.api import extract
+>>> result = extract({'class': 'EI', 'type': 'AN', 'time': '00',
+...                   'step': '00', 'start_date': '20120101',
+...                   'inputdir': '/tmp/work'})
+>>> result.outputfiles
+
+This module contains the following functions:
+
+    * make_control - creates and checks the ControlFile of an extraction
+    * retrieve     - retrieves the MARS data or prints the requests
+    * prepare      - prepares the FLEXPART input files from the MARS data
+    * extract      - retrieves and prepares the data of an extraction
+    * plan         - plans an extraction and estimates its size and duration
+'''
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import sys
+from collections import namedtuple
+
+# software specific classes and modules from flex_extract
+# add path to local main Python path for flex_extract to get full access
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+# pylint: disable=wrong-import-position
+import _config
+from Classes.ControlFile import ControlFile
+from Mods.tools import read_ecenv
+from Mods.errors import ControlFileError
+from Mods.get_mars_data import get_mars_data
+from Mods.prepare_flexpart import prepare_flexpart
+from Mods.bounded_disk import run_bounded
+from Mods.streaming import run_streaming
+from Mods.work_queue import run_queue
+from Mods.job_chunks import use_chunks, run_chunks
+from Mods.plan import run_plan
+# pylint: enable=wrong-import-position
+
+ExtractionResult = namedtuple('ExtractionResult',
+                              ['control', 'marsrequests', 'retrieved',
+                               'outputfiles'])
+ExtractionResult.__doc__ = '''Result of an extraction.
+
+control : ControlFile
+    The checked settings of the extraction.
+
+marsrequests : str
+    Path to the file with the printed MARS requests or None.
+
+retrieved : list of str
+    Paths of the retrieved files. Unless in debugging mode they are removed
+    after the preparation.
+
+outputfiles : list of str
+    Paths of the FLEXPART input files.
+'''
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+def make_control(settings=None, controlfile=None, queue=None):
+    '''Creates and checks the ControlFile of an extraction.
+
+    The settings of the dictionary overwrite the ones of the CONTROL file,
+    like the command line arguments do. The ECMWF_ENV file is read if it
+    exists. Relative input and output directories are taken relative to
+    the current working directory.
+
+    Parameters
+    ----------
+    settings : dict, optional
+        Contains the CONTROL parameter names and their values.
+        Default value is None.
+
+    controlfile : str, optional
+        Name of a CONTROL file in the CONTROL file directory or a path to
+        it. Default value is None.
+
+    queue : str, optional
+        Name of the queue if submitted to the ECMWF servers.
+        Default value is None.
+
+    Return
+    ------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+    '''
+    c = ControlFile(controlfile)
+    if settings:
+        c.assign_dict_to_control(settings)
+    if os.path.isfile(_config.PATH_ECMWF_ENV):
+        c.assign_envs_to_control(read_ecenv(_config.PATH_ECMWF_ENV))
+
+    c.inputdir = os.path.abspath(c.inputdir)
+    if c.outputdir:
+        c.outputdir = os.path.abspath(c.outputdir)
+    # each process running extractions is a run of its own, so that
+    # several of them can share the input directory
+    if not getattr(c, 'ppid', None):
+        c.ppid = str(os.getpid())
+
+    try:
+        c.check_conditions(queue)
+    except ValueError as e:
+        raise ControlFileError(str(e))
+
+    return c
+
+def retrieve(c):
+    '''Retrieves the MARS data or prints the MARS requests, depending on
+    the request parameter.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    Return
+    ------
+    files : list of str
+        Paths of the retrieved files.
+    '''
+
+    return get_mars_data(c)
+
+def prepare(c, ppid=None):
+    '''Prepares the FLEXPART input files from the retrieved MARS data.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    ppid : str, optional
+        Process id which identifies the retrieved files. Default value is
+        None, then the one of the retrieval is taken.
+
+    Return
+    ------
+    outputfiles : list of str
+        Paths of the FLEXPART input files.
+    '''
+
+    return prepare_flexpart(ppid or getattr(c, 'ppid', None), c)
+
+def extract(settings=None, controlfile=None):
+    '''Retrieves and prepares the data of an extraction.
+
+    Parameters
+    ----------
+    settings : dict, optional
+        Contains the CONTROL parameter names and their values.
+        Default value is None.
+
+    controlfile : str, optional
+        Name of a CONTROL file in the CONTROL file directory or a path to
+        it. Default value is None.
+
+    In bounded-disk mode the data are retrieved and prepared period by
+    period, see Mods.bounded_disk. In streaming mode they are retrieved
+    and prepared time step by time step, see Mods.streaming. In work-queue
+    mode the periods are shared with other workers, see Mods.work_queue.
+    With JOB_CHUNK the job chunks are processed in parallel processes, see
+    Mods.job_chunks.
+    With REQUEST 3 the extraction is only planned, see plan.
+
+    Return
+    ------
+    result : ExtractionResult
+        The settings, the MARS request file and the lists of
+        retrieved and prepared files.
+    '''
+    c = make_control(settings, controlfile)
+
+    if c.request == 3:
+        plan(c)
+        return ExtractionResult(c, None, [], [])
+
+    if c.bounded_disk and c.request != 1:
+        retrieved, outputfiles = run_bounded(c.ppid, c)
+    elif c.streaming and c.request != 1:
+        retrieved, outputfiles = run_streaming(c.ppid, c)
+    elif c.work_queue and c.request != 1:
+        retrieved, outputfiles = run_queue(c.ppid, c)
+    elif use_chunks(c):
+        retrieved, outputfiles = run_chunks(c.ppid, c)
+    else:
+        retrieved = retrieve(c)
+
+        if c.request == 1:
+            outputfiles = []
+        else:
+            outputfiles = prepare(c)
+
+    if c.request == 0:
+        marsrequests = None
+    else:
+        marsrequests = os.path.join(c.inputdir, _config.FILE_MARS_REQUESTS)
+
+    return ExtractionResult(c, marsrequests, retrieved, outputfiles)
+
+def plan(c):
+    '''Plans an extraction without retrieving any data.
+
+    The plan contains the MARS requests, the retrieved files, the time
+    steps and the FLEXPART input files of each job and the estimates of
+    the number of fields, the bytes, the disk peak and the CPU time. It
+    is also written to the file plan.<ppid>.json in the input directory.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    Return
+    ------
+    plan : dict
+        The plan of the extraction, see Mods.plan.
+    '''
+
+    return run_plan(getattr(c, 'ppid', None), c)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    available_cores
+#    grid_signature
+#    candidate_splits
+#    autotune_file
+#    read_autotune
+#    write_autotune
+#    calibrate
+#*******************************************************************************
+'''This module contains the functions to find the fastest split of the
+available cores into concurrent calc_etadot processes and OpenMP threads
+per process.
+
+The best split depends on the grid and the number of cores. It is found
+by a short calibration and stored in a JSON file, keyed by the grid
+signature, so that later runs on the same grid reuse it.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import json
+
+# software specific classes and modules from flex_extract
+import _config
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def available_cores():
+    '''Returns the number of cores the process may run on.
+
+    Respects the CPU affinity set e.g. by a batch system, if the
+    platform supports it.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    ncores : int
+        Number of usable cores.
+    '''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+def grid_signature(maxl, maxb, mnauf, level, gauss, ncores):
+    '''Creates the key under which a calibrated split is stored.
+
+    Parameters
+    ----------
+    maxl : int
+        Number of grid points in longitude.
+
+    maxb : int
+        Number of grid points in latitude.
+
+    mnauf : int
+        Spectral truncation of the input fields.
+
+    level : int
+        Number of model levels.
+
+    gauss : int
+        Switch for the calculation on the Gaussian grid.
+
+    ncores : int
+        Number of usable cores.
+
+    Return
+    ------
+    signature : str
+        The grid signature, e.g.
+        'maxl361_maxb181_mnauf159_level137_gauss1_cores8'.
+    '''
+    return 'maxl{}_maxb{}_mnauf{}_level{}_gauss{}_cores{}'.format(
+        maxl, maxb, mnauf, level, gauss, ncores)
+
+def candidate_splits(ncores, max_workers=None):
+    '''Lists all splits of the cores into workers times threads which
+    use all cores.
+
+    Parameters
+    ----------
+    ncores : int
+        Number of usable cores.
+
+    max_workers : int, optional
+        Upper limit for the number of workers, e.g. the number of
+        time steps. Default value is None.
+
+    Return
+    ------
+    splits : list of tuple of int
+        List of (workers, threads) combinations.
+    '''
+    splits = [(workers, ncores // workers)
+              for workers in range(1, ncores + 1)
+              if ncores % workers == 0]
+    if max_workers:
+        splits = [s for s in splits if s[0] <= max(max_workers, 1)]
+
+    return splits
+
+def autotune_file(cachedir):
+    '''Returns the path of the file with the stored splits.
+
+    Parameters
+    ----------
+    cachedir : str
+        Path to the cache directory from the CONTROL file. If not set,
+        the file is stored in the Run directory.
+
+    Return
+    ------
+    filename : str
+        Path of the autotune file.
+    '''
+    if cachedir:
+        return os.path.join(os.path.abspath(cachedir), _config.FILE_AUTOTUNE)
+
+    return os.path.join(_config.PATH_RUN_DIR, _config.FILE_AUTOTUNE)
+
+def read_autotune(filename, signature):
+    '''Reads the stored split for a grid signature.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the autotune file.
+
+    signature : str
+        The grid signature.
+
+    Return
+    ------
+    split : tuple of int or None
+        The (workers, threads) combination or None if there is none
+        stored for this signature.
+    '''
+    try:
+        with open(filename) as f:
+            entry = json.load(f).get(signature)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if not entry:
+        return None
+
+    return int(entry['workers']), int(entry['threads'])
+
+def write_autotune(filename, signature, split, timings):
+    '''Stores the calibrated split for a grid signature.
+
+    Entries for other signatures are kept. The file is replaced
+    atomically so that concurrent runs never read a partial file.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the autotune file.
+
+    signature : str
+        The grid signature.
+
+    split : tuple of int
+        The fastest (workers, threads) combination.
+
+    timings : dict of tuple of int : float
+        Calibrated seconds per time step for each split.
+
+    Return
+    ------
+
+    '''
+    try:
+        with open(filename) as f:
+            entries = json.load(f)
+    except (IOError, OSError, ValueError):
+        entries = {}
+
+    entries[signature] = {
+        'workers': split[0],
+        'threads': split[1],
+        'seconds_per_step': {'{}x{}'.format(*s): round(t, 3)
+                             for s, t in timings.items()}}
+
+    if not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+
+    tmpfile = filename + '.' + str(os.getpid())
+    with open(tmpfile, 'w') as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.rename(tmpfile, filename)
+
+    return
+
+def calibrate(run_split, splits):
+    '''Measures each split and selects the fastest one.
+
+    Parameters
+    ----------
+    run_split : function
+        Runs a calibration with the number of workers and threads as
+        arguments and returns the seconds per time step.
+
+    splits : list of tuple of int
+        List of (workers, threads) combinations to be measured.
+
+    Return
+    ------
+    split : tuple of int
+        The fastest (workers, threads) combination.
+
+    timings : dict of tuple of int : float
+        Measured seconds per time step for each split.
+    '''
+    timings = {}
+    for split in splits:
+        timings[split] = run_split(*split)
+        print('... calibration: {} workers x {} threads: '
+              '{:.2f} s per time step'.format(split[0], split[1],
+                                               timings[split]))
+
+    split = min(splits, key=lambda s: timings[s])
+    print('... calibration: selected {} workers x {} threads'.format(*split))
+
+    return split, timings
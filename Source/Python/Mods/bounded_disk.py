@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    mk_periods
+#    mk_runs
+#    run_period
+#    disk_usage
+#    run_bounded
+#*******************************************************************************
+'''This module contains the functions of the bounded-disk mode.
+
+The retrieval period is divided into shorter periods, which are retrieved
+and prepared one after the other, so that the input directory never holds
+the retrieved data of the whole period. A separate process retrieves the
+next periods while the current one is prepared. It pauses as long as the
+disk usage of the input directory exceeds the disk budget.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import copy
+import time
+from datetime import datetime, timedelta
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+# software specific classes and modules from flex_extract
+from Mods.checks import check_ppid
+from Mods.errors import FlexExtractError, RetrievalError
+from Mods.get_mars_data import get_mars_data
+from Mods.prepare_flexpart import prepare_flexpart
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def mk_periods(c):
+    '''Divides the retrieval period into the periods of the bounded-disk
+    mode.
+
+    The periods are JOB_CHUNK days long, or DATE_CHUNK days if JOB_CHUNK
+    is not set.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    periods : list of tuple of str
+        The start and end dates of the periods, e.g.
+        [('20120101', '20120103'), ('20120104', '20120105')].
+    '''
+    start = datetime.strptime(c.start_date, '%Y%m%d')
+    end = datetime.strptime(c.end_date, '%Y%m%d')
+    chunk = timedelta(days=int(c.job_chunk or c.date_chunk))
+    oneday = timedelta(days=1)
+
+    periods = []
+    while start <= end:
+        periods.append((start.strftime('%Y%m%d'),
+                        min(start + chunk - oneday, end).strftime('%Y%m%d')))
+        start = start + chunk
+
+    return periods
+
+def mk_runs(c):
+    '''Creates the settings of the runs of the periods.
+
+    Each period is a run of its own, with the ppid of the extraction and
+    the number of the period, e.g. 1234_0. As the job chunks on the ECMWF
+    servers, each run retrieves the flux data of the neighbouring days, so
+    that the disaggregation of the fluxes at its boundaries is the same as
+    in a single run. The periods of the bounded-disk mode, the local job
+    chunks and the units of the work-queue mode are such runs.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line, with the ppid of the extraction.
+
+    Return
+    ------
+    runs : list of ControlFile
+        The settings of the runs.
+    '''
+    runs = []
+    for i, (start, end) in enumerate(mk_periods(c)):
+        cp = copy.copy(c)
+        cp.start_date = start
+        cp.end_date = end
+        cp.ppid = '{}_{}'.format(c.ppid, i)
+        runs.append(cp)
+
+    return runs
+
+def run_period(c):
+    '''Retrieves and prepares the run of a period.
+
+    Parameters
+    ----------
+    c : ControlFile
+        The settings of the run.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files.
+
+    outputfiles : list of str
+        Paths of the FLEXPART input files, empty if the MARS requests
+        are only printed.
+    '''
+    retrieved = get_mars_data(c)
+    outputfiles = []
+    if c.request != 1:
+        outputfiles = prepare_flexpart(c.ppid, c)
+
+    return retrieved, outputfiles
+
+def disk_usage(path, prefix):
+    '''Sums up the size of the intermediate files in the input directory.
+
+    The final FLEXPART input files are not counted, since they are the
+    result of the runs.
+
+    Parameters
+    ----------
+    path : str
+        Path to the input directory.
+
+    prefix : str
+        Prefix of the final FLEXPART input files.
+
+    Return
+    ------
+    usage : int
+        The size of the files in bytes.
+    '''
+    usage = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if root == path and name.startswith(prefix):
+                continue
+            try:
+                usage += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                # removed in the meantime by the preparation
+                pass
+
+    return usage
+
+def run_bounded(ppid, c, poll=10):
+    '''Retrieves and prepares the data period by period.
+
+    Each period is a run of its own, see mk_runs, so that its files are
+    removed as soon as it is prepared. The retrieval of the next period starts
+    while the current one is prepared, as long as the disk usage of the
+    input directory is within DISK_BUDGET. Without DISK_BUDGET only the
+    next period is retrieved in advance.
+
+    Parameters
+    ----------
+    ppid : str
+        Contains the ppid number of the current ECMWF job. It will be None
+        if the method was called on the local side.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    poll : int, optional
+        Seconds between two checks of the disk usage while the retrieval
+        pauses. Default value is 10.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files. They are removed after the
+        preparation unless in debugging mode.
+
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files.
+    '''
+    from multiprocessing import Process, Queue, Value
+
+    check_ppid(c, ppid)
+
+    runs = mk_runs(c)
+    print('Bounded-disk mode: {} periods, disk budget {} MB'
+          .format(len(runs), c.disk_budget))
+
+    results = Queue()
+    done = Value('i', 0)
+    proc = Process(target=_retrieve_periods,
+                   args=(runs, results, done, poll))
+    proc.daemon = True
+    proc.start()
+
+    retrieved = []
+    outputfiles = []
+    try:
+        for cp in runs:
+            files, error = _get_result(results, proc, poll)
+            if error:
+                raise RetrievalError(error)
+            retrieved.extend(files)
+            outputfiles.extend(prepare_flexpart(cp.ppid, cp))
+            with done.get_lock():
+                done.value += 1
+    except BaseException:
+        proc.terminate()
+        raise
+    finally:
+        proc.join()
+
+    return retrieved, sorted(outputfiles)
+
+def _get_result(results, proc, poll):
+    '''Waits for the retrieval of the next period.
+
+    Parameters
+    ----------
+    results : multiprocessing.Queue
+        The queue with the results of the retrieval process.
+
+    proc : multiprocessing.Process
+        The retrieval process.
+
+    poll : int
+        Seconds between two checks of the retrieval process.
+
+    Return
+    ------
+    files : list of str
+        Paths of the retrieved files.
+
+    error : str
+        The error message of a failed retrieval or None.
+    '''
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except Empty:
+            if not proc.is_alive():
+                return [], '... RETRIEVAL PROCESS TERMINATED UNEXPECTEDLY!'
+
+def _retrieve_periods(runs, results, done, poll):
+    '''Retrieves the periods in a separate process, one after the other.
+
+    Before each period the retrieval waits while there are retrieved
+    periods left to be prepared and either the disk usage exceeds the
+    disk budget or, without disk budget, the next period is already
+    retrieved. It stops after the first error.
+
+    Parameters
+    ----------
+    runs : list of ControlFile
+        The settings of the periods.
+
+    results : multiprocessing.Queue
+        Gets the retrieved files and the error message of each period.
+
+    done : multiprocessing.Value
+        The number of periods which were prepared.
+
+    poll : int
+        Seconds between two checks of the disk usage.
+
+    Return
+    ------
+
+    '''
+    for i, cp in enumerate(runs):
+        while _must_wait(cp, i - done.value):
+            time.sleep(poll)
+
+        try:
+            results.put((get_mars_data(cp), None))
+        except FlexExtractError as e:
+            results.put(([], str(e)))
+            return
+        except Exception as e:
+            results.put(([], '... RETRIEVAL FAILED: ' + repr(e)))
+            return
+
+    return
+
+def _must_wait(c, pending):
+    '''Decides whether the retrieval has to pause.
+
+    It never pauses if all retrieved periods are prepared, since only the
+    preparation releases disk space.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    pending : int
+        Number of retrieved periods which are not prepared yet.
+
+    Return
+    ------
+    wait : bool
+        True if the retrieval has to pause.
+    '''
+    if pending < 1:
+        return False
+    if not c.disk_budget:
+        return pending > 1
+
+    return disk_usage(c.inputdir, c.prefix) > c.disk_budget * 1024**2
@@ -39,6 +39,7 @@ except ImportError:
 # software specific classes and modules from flex_extract
 import _config
 from Mods.tools import my_error, silent_remove
+from Mods.errors import ControlFileError
 # ------------------------------------------------------------------------------
 # FUNCTIONS
 # ------------------------------------------------------------------------------
@@ -302,19 +303,17 @@ def check_step(step):
     step : list of str
         List of forecast steps in format e.g. [001, 002, ...]
     '''
-    import numpy as np
-
     if '/' in step:
         steps = step.split('/')
         if 'to' in step.lower() and 'by' in step.lower():
-            ilist = np.arange(int(steps[0]),
-                              int(steps[2]) + 1,
-                              int(steps[4]))
+            ilist = range(int(steps[0]),
+                          int(steps[2]) + 1,
+                          int(steps[4]))
             step = ['{:0>3}'.format(i) for i in ilist]
         elif 'to' in step.lower() and 'by' not in step.lower():
             my_error(step + ':\n' +
                      'if "to" is used in steps parameter, '
-                     'please use "by" as well')
+                     'please use "by" as well', ControlFileError)
         else:
             step = steps
 
@@ -637,6 +636,7 @@ def check_request(request, marsfile):
         0: Retrieves the data from ECMWF.
         1: Prints the mars requests to an output file.
         2: Retrieves the data and prints the mars request.
+        3: Only plans the run, see Mods.plan.
 
     marsfile : str
         Path to the mars request file.
@@ -645,6 +645,9 @@ def check_request(request, marsfile):
     ------
 
     '''
+    if request not in [0, 1, 2, 3]:
+        raise ValueError('ERROR: Parameter REQUEST must be 0, 1, 2 or 3, '
+                         'but is {}!'.format(request))
     if request != 0:
         if os.path.isfile(marsfile):
             silent_remove(marsfile)
@@ -886,3 +889,305 @@ def check_number(number):
         pass
 
     return number
+
+
+def check_workers(workers):
+    '''Checks that the number of parallel workers or threads, if set,
+    is a positive integer.
+
+    Parameters
+    ----------
+    workers : int or str
+        The number of parallel workers or threads.
+
+    Return
+    ------
+    workers : int
+        The number of parallel workers or threads.
+    '''
+    if workers is None:
+        return workers
+
+    workers = int(workers)
+    if workers < 1:
+        raise ValueError('ERROR: The number of parallel workers or threads '
+                         'must be at least 1!')
+
+    return workers
+
+
+def check_packing(packing, gribformat):
+    '''Checks the format of the packing settings for the output files.
+
+    The settings are separated by "/", each one consists of the parameter
+    (name or id, or ALL for all other parameters), the number of bits
+    per value and optionally the packing type, e.g.
+    '130:16/Q:24:grid_second_order/ALL:24'.
+
+    Parameters
+    ----------
+    packing : str
+        The packing settings.
+
+    gribformat : str
+        The format of the output files, GRIB1 or GRIB2.
+
+    Return
+    ------
+    packing : str
+        The packing settings without empty entries.
+    '''
+    if not packing:
+        return packing
+
+    packtypes = ['grid_simple', 'grid_second_order', 'grid_ccsds']
+
+    settings = []
+    for setting in str(packing).split('/'):
+        if not setting:
+            continue
+        parts = setting.split(':')
+        if len(parts) not in [2, 3] or not parts[1].isdigit() or \
+           not 1 <= int(parts[1]) <= 32:
+            raise ValueError('ERROR: The packing setting "' + setting +
+                             '" has not the format param:bits[:type] with '
+                             'bits between 1 and 32!')
+        if len(parts) == 3:
+            if parts[2] not in packtypes:
+                raise ValueError('ERROR: The packing type "' + parts[2] +
+                                 '" is not one of ' + ', '.join(packtypes))
+            if parts[2] == 'grid_ccsds' and gribformat.lower() != 'grib2':
+                raise ValueError('ERROR: The packing type grid_ccsds is '
+                                 'only available for FORMAT GRIB2!')
+        settings.append(setting)
+
+    return '/'.join(settings)
+
+
+def check_disk_budget(budget):
+    '''Checks that the disk budget of the bounded-disk mode, if set,
+    is a positive number of MB.
+
+    Parameters
+    ----------
+    budget : int or str
+        The disk space in MB for the intermediate files.
+
+    Return
+    ------
+    budget : int
+        The disk space in MB for the intermediate files.
+    '''
+    if budget is None:
+        return budget
+
+    budget = int(budget)
+    if budget < 1:
+        raise ValueError('ERROR: The disk budget must be at least 1 MB!')
+
+    return budget
+
+
+def check_bounded_disk(bounded_disk, rrint, statedir):
+    '''Checks that the bounded-disk mode, if switched on, is available
+    with the other settings.
+
+    Parameters
+    ----------
+    bounded_disk : int
+        Switch for the bounded-disk mode.
+
+    rrint : int
+        Selection of the precipitation disaggregation method.
+
+    statedir : str
+        Path to the directory of the deaccumulation state.
+
+    Return
+    ------
+    bounded_disk : int
+        Switch for the bounded-disk mode.
+    '''
+    if not bounded_disk:
+        return bounded_disk
+
+    if rrint:
+        raise ValueError('ERROR: The bounded-disk mode (BOUNDED_DISK) is '
+                         'not available with RRINT 1, since the new '
+                         'disaggregation at the end of a period depends on '
+                         'the data of the next period!')
+    if statedir:
+        raise ValueError('ERROR: The bounded-disk mode (BOUNDED_DISK) and '
+                         'the incremental mode (STATEDIR) exclude each '
+                         'other!')
+
+    return bounded_disk
+
+
+def check_statedir(statedir, rrint, purefc, basetime):
+    '''Checks that the incremental mode, if the state directory is set,
+    is available for the selected data.
+
+    Parameters
+    ----------
+    statedir : str
+        Path to the directory of the deaccumulation state.
+
+    rrint : int
+        Selection of the precipitation disaggregation method.
+
+    purefc : int
+        Switch for the pure forecast mode.
+
+    basetime : int
+        The time for a half day retrieval.
+
+    Return
+    ------
+    statedir : str
+        Absolute path to the directory of the deaccumulation state.
+    '''
+    if statedir is None:
+        return statedir
+
+    if rrint:
+        raise ValueError('ERROR: The incremental mode (STATEDIR) is not '
+                         'available with RRINT 1, since the new '
+                         'disaggregation of the last day of a run depends '
+                         'on the data of the next run!')
+    if purefc or basetime is not None:
+        raise ValueError('ERROR: The incremental mode (STATEDIR) is not '
+                         'available in pure forecast mode or with BASETIME!')
+
+    return os.path.abspath(statedir)
+
+
+def check_streaming(streaming, basetime, rrint, bounded_disk):
+    '''Checks that the streaming mode, if switched on, is available for
+    the selected data.
+
+    Parameters
+    ----------
+    streaming : int
+        Switch for the streaming mode.
+
+    basetime : int
+        The time for a half day retrieval.
+
+    rrint : int
+        Selection of the precipitation disaggregation method.
+
+    bounded_disk : int
+        Switch for the bounded-disk mode.
+
+    Return
+    ------
+    streaming : int
+        Switch for the streaming mode.
+    '''
+    if not streaming:
+        return streaming
+
+    if basetime is None:
+        raise ValueError('ERROR: The streaming mode (STREAMING) is only '
+                         'available for operational runs with BASETIME!')
+    if rrint:
+        raise ValueError('ERROR: The streaming mode (STREAMING) is not '
+                         'available with RRINT 1, since the new '
+                         'disaggregation needs the whole period!')
+    if bounded_disk:
+        raise ValueError('ERROR: The streaming mode (STREAMING) and the '
+                         'bounded-disk mode (BOUNDED_DISK) exclude each '
+                         'other!')
+
+    return streaming
+
+
+def check_positive(value, name):
+    '''Checks that a setting, if set, is a positive integer.
+
+    Parameters
+    ----------
+    value : int or str
+        The value of the setting.
+
+    name : str
+        The name of the setting in the CONTROL file.
+
+    Return
+    ------
+    value : int
+        The value of the setting.
+    '''
+    if value is None:
+        return value
+
+    value = int(value)
+    if value < 1:
+        raise ValueError('ERROR: ' + name + ' must be at least 1!')
+
+    return value
+
+
+def check_profiling(profiling):
+    '''Checks the level of the profiling.
+
+    Parameters
+    ----------
+    profiling : int or str
+        0 for no profiling, 1 for the spans of the stages and 2 for the
+        spans and the cProfile statistics of the stages.
+
+    Return
+    ------
+    profiling : int
+        The level of the profiling.
+    '''
+    profiling = int(profiling)
+    if profiling not in [0, 1, 2]:
+        raise ValueError('ERROR: PROFILING must be 0, 1 or 2!')
+
+    return profiling
+
+
+def check_work_queue(work_queue, rrint, bounded_disk, streaming, statedir):
+    '''Checks that the work-queue mode, if the queue directory is set,
+    is available with the other settings.
+
+    Parameters
+    ----------
+    work_queue : str
+        Path to the queue directory shared by the workers.
+
+    rrint : int
+        Selection of the precipitation disaggregation method.
+
+    bounded_disk : int
+        Switch for the bounded-disk mode.
+
+    streaming : int
+        Switch for the streaming mode.
+
+    statedir : str
+        Path to the directory of the deaccumulation state.
+
+    Return
+    ------
+    work_queue : str
+        Absolute path to the queue directory.
+    '''
+    if work_queue is None:
+        return work_queue
+
+    if rrint:
+        raise ValueError('ERROR: The work-queue mode (WORK_QUEUE) is not '
+                         'available with RRINT 1, since the new '
+                         'disaggregation at the end of a period depends on '
+                         'the data of the next period!')
+    if bounded_disk or streaming or statedir:
+        raise ValueError('ERROR: The work-queue mode (WORK_QUEUE) excludes '
+                         'the bounded-disk mode (BOUNDED_DISK), the '
+                         'streaming mode (STREAMING) and the incremental '
+                         'mode (STATEDIR)!')
+
+    return os.path.abspath(work_queue)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Classes:
+#    FlexExtractError
+#    ControlFileError
+#    RetrievalError
+#    FieldsNotAvailableError
+#    ProcessingError
+#    SubmissionError
+#*******************************************************************************
+'''This module contains the exceptions raised by flex_extract.
+
+A program using flex_extract as a library can catch the errors by their
+type and go on with the next extraction. The scripts convert them into the
+error message and a non-zero exit status.
+'''
+
+# ------------------------------------------------------------------------------
+# CLASSES
+# ------------------------------------------------------------------------------
+class FlexExtractError(Exception):
+    '''Base class of all errors raised by flex_extract.
+
+    Attributes
+    ----------
+    message : str
+        Description of the error.
+
+    code : str or int
+        Exit status of the scripts, or the message printed at exit.
+    '''
+
+    def __init__(self, message='ERROR', code=None):
+        '''Initialises the error.
+
+        Parameters
+        ----------
+        message : str, optional
+            Description of the error. Default value is "ERROR".
+
+        code : int, optional
+            Exit status of the scripts. If it is None, the message is printed
+            at exit and the exit status is 1. Use it if the message was already
+            printed. Default value is None.
+
+        Return
+        ------
+
+        '''
+        if code is None:
+            code = message
+        Exception.__init__(self, message)
+        self.message = message
+        self.code = code
+
+    def __str__(self):
+        return str(self.message)
+
+
+class ControlFileError(FlexExtractError):
+    '''The CONTROL file or another setting could not be read or is invalid.
+    '''
+
+
+class RetrievalError(FlexExtractError):
+    '''A MARS retrieval failed.
+    '''
+
+
+class FieldsNotAvailableError(RetrievalError):
+    '''A MARS retrieval returned no data, e.g. since the fields of an
+    operational cycle are not yet archived.
+    '''
+
+
+class ProcessingError(FlexExtractError):
+    '''The preparation of the FLEXPART input files failed.
+    '''
+
+
+class SubmissionError(FlexExtractError):
+    '''The communication with the ECMWF servers failed.
+    '''
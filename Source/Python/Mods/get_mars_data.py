@@ -62,33 +62,26 @@ from __future__ import print_function
 
 import os
 import sys
-import inspect
 from datetime import datetime, timedelta
 
 # software-specific classes and modules from flex_extract
 # add path to local main Python path for flex_extract to get full access
-sys.path.append(os.path.dirname(os.path.abspath(
-    inspect.getfile(inspect.currentframe()))) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
 # pylint: disable=wrong-import-position
 import _config
-from Mods.tools import (setup_controldata, my_error, normal_exit, make_dir)
+from Mods.tools import (setup_controldata, my_error, normal_exit, make_dir,
+                        module_available, run_dir, file_lock,
+                        silent_remove)
+from Mods.checks import check_ppid
+from Mods.errors import FlexExtractError, RetrievalError
 from Classes.EcFlexpart import EcFlexpart
 from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace
+from Classes.DeaccState import DeaccState
+from Classes.Checkpoint import Checkpoint
 from Classes.MarsRetrieval import MarsRetrieval
+from Mods.profiling import span
 # pylint: enable=wrong-import-position
-# pylint: disable=invalid-name
-try:
-    ec_api = True
-    import ecmwfapi
-except ImportError:
-    ec_api = False
-
-try:
-    cds_api = True
-    import cdsapi
-except ImportError:
-    cds_api = False
-# pylint: enable=invalid-name
 # ------------------------------------------------------------------------------
 # FUNCTION
 # ------------------------------------------------------------------------------
@@ -106,9 +99,13 @@ def main():
 
     '''
 
-    c, _, _, _ = setup_controldata()
-    get_mars_data(c)
-    normal_exit('Retrieving MARS data: Done!')
+    try:
+        c, _, _, _ = setup_controldata()
+        get_mars_data(c)
+        normal_exit('Retrieving MARS data: Done!')
+    except FlexExtractError as e:
+        # the errors are only turned into an exit status here
+        sys.exit(e.code)
 
     return
 
@@ -127,14 +124,42 @@ def get_mars_data(c):
 
     Return
     ------
-
+    files : list of str
+        Sorted list of the paths of the retrieved files. It is empty if the
+        MARS requests were only printed.
     '''
-    c.ec_api = ec_api
-    c.cds_api = cds_api
+    # the APIs themselves are only imported if a connection is made
+    c.ec_api = module_available('ecmwfapi')
+    c.cds_api = module_available('cdsapi')
 
     if not os.path.exists(c.inputdir):
         make_dir(c.inputdir)
 
+    # the retrieved files of a run are identified by the ppid,
+    # runs with the same ppid wait for each other
+    check_ppid(c, getattr(c, 'ppid', None))
+    with file_lock(run_dir(c) + '.lock'), span('retrieval', stage=True):
+        files = _retrieve_run(c)
+        # the run ends with printing the requests
+        if c.request == 1:
+            silent_remove(run_dir(c) + '.lock')
+
+    return files
+
+def _retrieve_run(c):
+    '''Retrieves the data of a run, while holding the lock of the run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    files : list of str
+        Sorted list of the paths of the retrieved files.
+    '''
     if c.request == 0:
         print("Retrieving ECMWF data!")
     else:
@@ -149,9 +174,20 @@ def get_mars_data(c):
 
     server = mk_server(c)
 
-    # if data are to be retrieved, clean up any old grib files
+    workspace = Workspace(c.inputdir)
+
+    # the files of a previous attempt of the run are kept if they are
+    # intact, so that the preparation can skip its completed units
+    checkpoint = None
+    if c.checkpoint and c.request == 0:
+        checkpoint = Checkpoint(c)
+        if checkpoint.done('retrieval'):
+            print('... retrieval was completed before')
+            return workspace.select('*grb', ppid=c.ppid)
+
+    # if data are to be retrieved, clean up any old grib files of the run
     if c.request == 0 or c.request == 2:
-        remove_old('*grb', c.inputdir)
+        remove_old('*.' + str(c.ppid) + '.*grb', c.inputdir, workspace)
 
     # --------------  flux data ------------------------------------------------
     start, end, datechunk = mk_dates(c, fluxes=True)
@@ -161,7 +197,16 @@ def get_mars_data(c):
     start, end, datechunk = mk_dates(c, fluxes=False)
     do_retrievement(c, server, start, end, datechunk, fluxes=False)
 
-    return
+    if c.request == 1:
+        return []
+
+    # the retrieved files were written by MARS or the web APIs
+    workspace.rescan()
+    files = workspace.select('*grb', ppid=c.ppid)
+    if checkpoint:
+        checkpoint.complete('retrieval', files)
+
+    return files
 
 def write_reqheader(marsfile):
     '''Writes header with column names into MARS request file.
@@ -179,10 +224,15 @@ def write_reqheader(marsfile):
     attrs = vars(MR).copy()
     del attrs['server']
     del attrs['public']
-    with open(marsfile, 'w') as f:
-        f.write('request_number' + ', ')
-        f.write(', '.join(str(key) for key in sorted(attrs.keys())))
-        f.write('\n')
+    # the file can be shared by several runs, only the first one writes
+    # the header
+    with file_lock(marsfile + '.lock'):
+        if os.path.isfile(marsfile) and os.path.getsize(marsfile) > 0:
+            return
+        with open(marsfile, 'w') as f:
+            f.write('request_number' + ', ')
+            f.write(', '.join(str(key) for key in sorted(attrs.keys())))
+            f.write('\n')
 
     return
 
@@ -204,12 +254,20 @@ def mk_server(c):
     ------
     server : ECMWFDataServer, ECMWFService or Client
         Connection to ECMWF server via python interface ECMWF WebAPI or CDS API.
+        False if no API is available or the MARS requests are only printed.
 
     '''
-    if cds_api and (c.marsclass.upper() == 'EA'):
+    if c.request == 1:
+        # the requests are only printed, no connection is needed
+        server = False
+        c.ec_api = False
+        c.cds_api = False
+    elif c.cds_api and (c.marsclass.upper() == 'EA'):
+        import cdsapi
         server = cdsapi.Client()
         c.ec_api = False
     elif c.ec_api:
+        import ecmwfapi
         if c.public:
             server = ecmwfapi.ECMWFDataServer()
         else:
@@ -262,6 +320,9 @@ def mk_dates(c, fluxes):
     Since for basetime the extraction contains the 12 hours upfront,
     if basetime is 0, the starting date has to be the day before
 
+    In incremental mode the flux data start after the last date of the
+    previous run, if the run continues it
+
     Parameters
     ----------
     c : ControlFile
@@ -305,9 +366,17 @@ def mk_dates(c, fluxes):
     if not fluxes and check_dates_for_nonflux_fc_times(c.type, c.time):
         start = start - timedelta(days=1)
 
+    # in incremental mode the flux data up to the last date of the
+    # previous run are already contained in its state
+    if fluxes and c.statedir:
+        state = DeaccState(c.statedir)
+        if state.usable(c):
+            start = datetime.strptime(state.lastdate, '%Y%m%d') + \
+                    timedelta(days=1)
+
     return start, end, chunk
 
-def remove_old(pattern, inputdir):
+def remove_old(pattern, inputdir, workspace=None):
     '''Deletes old retrieval files from current input directory
     matching the pattern.
 
@@ -319,13 +388,17 @@ def remove_old(pattern, inputdir):
     inputdir : str, optional
         Path to the directory where the retrieved data are stored.
 
+    workspace : Workspace, optional
+        Inventory of the input directory. Default value is None, which
+        walks through the input directory.
+
     Return
     ------
 
     '''
     print('... removing old files in ' + inputdir)
 
-    tobecleaned = UioFiles(inputdir, pattern)
+    tobecleaned = UioFiles(inputdir, pattern, workspace)
     tobecleaned.delete_files()
 
     return
@@ -383,7 +456,7 @@ def do_retrievement(c, server, start, end, delta_t, fluxes=False):
         try:
             flexpart.retrieve(server, dates, c.public, c.request, c.inputdir)
         except IOError:
-            my_error('MARS request failed')
+            my_error('MARS request failed', RetrievalError)
 
         day += delta_t
 
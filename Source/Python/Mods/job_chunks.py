@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    use_chunks
+#    mk_chunks
+#    run_chunks
+#*******************************************************************************
+'''This module contains the functions for the local parallel processing of
+the job chunks.
+
+On the ECMWF servers each job chunk of JOB_CHUNK days is submitted as a job
+of its own. On the local side the job chunks are retrieved and prepared by
+JOB_WORKERS processes at the same time, each as a run of its own (see
+Mods.bounded_disk.mk_runs) in its own input directory. The FLEXPART input
+files of all chunks are moved to the same output directory.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import shutil
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+# software specific classes and modules from flex_extract
+from Mods.checks import check_ppid
+from Mods.errors import FlexExtractError, ProcessingError
+from Mods.autotune import available_cores
+from Mods.bounded_disk import mk_periods, mk_runs, run_period
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def use_chunks(c):
+    '''Decides whether the job chunks are processed in parallel.
+
+    The new disaggregation of the precipitation (RRINT 1) and the
+    incremental mode (STATEDIR) need the whole period in one run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    parallel : bool
+        True if there is more than one job chunk to be processed.
+    '''
+    if not c.job_chunk or c.request == 1 or c.rrint or c.statedir:
+        return False
+
+    return len(mk_periods(c)) > 1
+
+def mk_chunks(c):
+    '''Creates the settings of the job chunks.
+
+    Each chunk is a run of its own, see Mods.bounded_disk.mk_runs, with
+    the input directory chunk.<ppid> in the input directory of the
+    extraction.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line, with the ppid of the extraction.
+
+    Return
+    ------
+    chunks : list of ControlFile
+        The settings of the chunks.
+    '''
+    chunks = mk_runs(c)
+    for cc in chunks:
+        cc.inputdir = os.path.join(c.inputdir, 'chunk.' + cc.ppid)
+
+    return chunks
+
+def run_chunks(ppid, c, poll=10):
+    '''Retrieves and prepares the job chunks in parallel processes.
+
+    Not more than JOB_WORKERS chunks are processed at the same time,
+    by default as many as there are cores. The cores are divided among
+    the chunks for the calc_etadot threads. After the first failed chunk
+    the other ones are stopped.
+
+    Parameters
+    ----------
+    ppid : str
+        Contains the ppid number of the current ECMWF job. It will be None
+        if the method was called on the local side.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    poll : int, optional
+        Seconds between two checks of the chunk processes.
+        Default value is 10.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files. They are removed after the
+        preparation unless in debugging mode.
+
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files.
+    '''
+    from multiprocessing import Process, Queue
+
+    check_ppid(c, ppid)
+
+    chunks = mk_chunks(c)
+    nworkers = min(c.job_workers or available_cores(), len(chunks))
+    print('Job chunks: {} chunks of {} days with {} workers'
+          .format(len(chunks), c.job_chunk, nworkers))
+
+    # each chunk runs a single calc_etadot process, as the ensemble
+    # members in parallel
+    for cc in chunks:
+        cc.etadot_workers = 1
+        cc.autotune = 0
+        if not cc.etadot_threads:
+            cc.etadot_threads = max(1, available_cores() // nworkers)
+
+    results = Queue()
+    running = {}
+    pending = list(enumerate(chunks))
+    retrieved = []
+    outputfiles = []
+    try:
+        while pending or running:
+            # the chunk processes may start pools themselves,
+            # therefore they are not daemonic
+            while pending and len(running) < nworkers:
+                i, cc = pending.pop(0)
+                running[i] = Process(target=_run_chunk,
+                                     args=(i, cc, results))
+                running[i].start()
+
+            i, files, outputs, error = _get_result(results, running, poll)
+            running.pop(i).join()
+            if error:
+                raise ProcessingError('... ERROR in job chunk {} - {}:\n{}'
+                                      .format(chunks[i].start_date,
+                                              chunks[i].end_date, error))
+            retrieved.extend(files)
+            outputfiles.extend(outputs)
+            if c.request == 0 and not c.debug:
+                shutil.rmtree(chunks[i].inputdir, ignore_errors=True)
+    finally:
+        for proc in running.values():
+            proc.terminate()
+            proc.join()
+
+    return retrieved, sorted(outputfiles)
+
+def _run_chunk(i, c, results):
+    '''Retrieves and prepares a job chunk in a process of its own.
+
+    Parameters
+    ----------
+    i : int
+        The number of the chunk.
+
+    c : ControlFile
+        The settings of the chunk.
+
+    results : multiprocessing.Queue
+        Gets the number of the chunk, the retrieved files, the FLEXPART
+        input files and the error message, which is None on success.
+
+    Return
+    ------
+
+    '''
+    try:
+        files, outputfiles = run_period(c)
+    except FlexExtractError as e:
+        results.put((i, [], [], str(e)))
+        return
+    except Exception as e:
+        results.put((i, [], [], repr(e)))
+        return
+
+    results.put((i, files, outputfiles, None))
+
+    return
+
+def _get_result(results, running, poll):
+    '''Waits for the next finished job chunk.
+
+    Parameters
+    ----------
+    results : multiprocessing.Queue
+        The queue with the results of the chunk processes.
+
+    running : dict
+        The running process of each chunk number.
+
+    poll : int
+        Seconds between two checks of the chunk processes.
+
+    Return
+    ------
+    result : tuple
+        The number of the chunk, the retrieved files, the FLEXPART input
+        files and the error message or None.
+    '''
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except Empty:
+            for i, proc in running.items():
+                if not proc.is_alive() and results.empty():
+                    return i, [], [], ('... CHUNK PROCESS TERMINATED '
+                                       'UNEXPECTEDLY!')
@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    run_plan
+#    mk_plan
+#    mk_jobs
+#    read_costs
+#    estimate_request
+#*******************************************************************************
+'''This module contains the functions of the planning mode (REQUEST 3).
+
+The ControlFile is expanded into the plan of the run without retrieving
+any data: the job scripts of JOB_CHUNK, the MARS requests of DATE_CHUNK,
+the retrieved files, the time steps converted by "create" and the names
+of the FLEXPART input files. The number of fields and bytes follow from
+the grids and the ACCURACY, the disk peak of the input directory and
+the CPU time of the stages from the sizes and the costs per MiB.
+
+The costs are calibrated with the newest profiling summary in the input
+directory, see PROFILING; without summary rough default values are used.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import copy
+import glob
+import json
+from datetime import datetime, timedelta
+
+# software specific classes and modules from flex_extract
+from Mods.checks import check_ppid
+from Mods.tools import make_dir
+from Mods.get_mars_data import mk_dates
+from Mods.bounded_disk import mk_periods
+from Classes.EcFlexpart import EcFlexpart
+from Classes.LocalServer import expand_values
+
+# the number of bytes in a MiB
+_MIB = 1024. * 1024.
+
+# the bytes of a GRIB message besides the packed values
+_HEADER = 200
+
+# the share of the points of a regular Gaussian grid in a reduced one
+_REDUCED = 0.65
+
+# the fields per model level in the FLEXPART input files: U, V, T, Q and
+# ETADOT; the surface fields besides the retrieved ones: SP and the
+# deaccumulated fluxes LSP, CP, SSHF, EWSS, NSSS and SSR
+_ML_FIELDS = 5
+_SP_FIELDS = 1
+_FLUX_FIELDS = 6
+
+# the two subgrid values of LSP and CP with RRINT
+_RRINT_FIELDS = 4
+
+# the rough default costs of the stages: seconds of wall-clock time for
+# the retrieval, seconds of CPU time for the other stages, per MiB of
+# retrieved data, flux files, retrieved non-flux data and output files
+DEFAULT_COSTS = {'retrieval': 1.0, 'deaccumulation': 0.05,
+                 'conversion': 0.2, 'postprocessing': 0.01}
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def run_plan(ppid, c):
+    '''Creates the plan of a run, prints its summary and writes it as
+    JSON file plan.<ppid>.json into the input directory.
+
+    Parameters
+    ----------
+    ppid : str
+        Contains the ppid number of the current ECMWF job. It will be None
+        if the method was called on the local side.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    plan : dict
+        The jobs of the run with their requests, files, time steps and
+        estimates, the totals and the costs used.
+    '''
+    check_ppid(c, ppid)
+
+    if not os.path.exists(c.inputdir):
+        make_dir(c.inputdir)
+
+    plan = mk_plan(c)
+
+    _print_plan(plan)
+
+    filename = os.path.join(c.inputdir, 'plan.{}.json'.format(c.ppid))
+    with open(filename, 'w') as f:
+        json.dump(plan, f, indent=1)
+    print('Run plan written to ' + filename)
+
+    return plan
+
+def mk_plan(c, costs=None):
+    '''Expands the ControlFile into the plan of the run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    costs : dict, optional
+        The costs of the stages per MiB, see DEFAULT_COSTS. Default value
+        is None, which reads them from the newest profiling summary in
+        the input directory.
+
+    Return
+    ------
+    plan : dict
+        The jobs of the run with their requests, files, time steps and
+        estimates, the totals and the costs used.
+    '''
+    if costs is None:
+        costs, source = read_costs(c.inputdir)
+    else:
+        source = 'given'
+
+    jobs = []
+    for start, end in mk_jobs(c):
+        cj = copy.copy(c)
+        cj.start_date, cj.end_date = start, end
+        jobs.append(_plan_job(cj, costs))
+
+    totals = {}
+    for job in jobs:
+        for key, value in job['estimate'].items():
+            if key == 'disk_peak':
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    return {'ppid': str(c.ppid), 'start_date': c.start_date,
+            'end_date': c.end_date, 'date_chunk': c.date_chunk,
+            'job_chunk': c.job_chunk, 'bounded_disk': c.bounded_disk,
+            'costs': dict(costs, source=source), 'totals': totals,
+            'jobs': jobs}
+
+def mk_jobs(c):
+    '''Divides the period into the periods of the job scripts.
+
+    The job scripts are JOB_CHUNK days long, as submitted to the ECMWF
+    servers. Without JOB_CHUNK the whole period is a single job.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    jobs : list of tuple of str
+        The start and end dates of the jobs.
+    '''
+    if not c.job_chunk:
+        return [(c.start_date, c.end_date)]
+
+    start = datetime.strptime(c.start_date, '%Y%m%d')
+    end = datetime.strptime(c.end_date, '%Y%m%d')
+    chunk = timedelta(days=int(c.job_chunk))
+    oneday = timedelta(days=1)
+
+    jobs = []
+    while start <= end:
+        jobs.append((start.strftime('%Y%m%d'),
+                     min(start + chunk - oneday, end).strftime('%Y%m%d')))
+        start = start + chunk
+
+    return jobs
+
+def read_costs(inputdir):
+    '''Calibrates the costs of the stages with the newest profiling
+    summary in a directory.
+
+    The costs of a stage which is missing in the summary, or which has
+    not processed any data, keep their default values.
+
+    Parameters
+    ----------
+    inputdir : str
+        Path to the directory of the profiling summaries.
+
+    Return
+    ------
+    costs : dict
+        The costs of the stages per MiB.
+
+    source : str
+        Path to the profiling summary or "default".
+    '''
+    costs = dict(DEFAULT_COSTS)
+
+    summaries = glob.glob(os.path.join(inputdir, 'profile.*.json'))
+    if not summaries:
+        return costs, 'default'
+
+    summary = max(summaries, key=os.path.getmtime)
+    try:
+        with open(summary) as f:
+            totals = json.load(f)['totals']
+    except (IOError, OSError, ValueError, KeyError):
+        return costs, 'default'
+
+    def total(name, key):
+        return totals.get(name, {}).get(key, 0)
+
+    # the stage and the amount of data it processed
+    volumes = {'retrieval': ('request', total('request', 'bytes_written')),
+               'deaccumulation': ('deaccumulation',
+                                  total('deaccumulation', 'bytes_written')),
+               'conversion': ('conversion', total('routing', 'bytes_read')),
+               'postprocessing': ('postprocessing',
+                                  total('postprocessing', 'bytes_written'))}
+    for stage, (name, volume) in volumes.items():
+        if volume <= 0 or name not in totals:
+            continue
+        if stage == 'retrieval':
+            seconds = total(name, 'wall')
+        else:
+            seconds = total(name, 'cpu') + total(name, 'cpu_children')
+        costs[stage] = seconds / (volume / _MIB)
+
+    return costs, summary
+
+def estimate_request(request, accuracy, grid=None):
+    '''Estimates the number of fields and bytes of a MARS request.
+
+    Parameters
+    ----------
+    request : dict
+        The parameters of the MARS request.
+
+    accuracy : int
+        The number of bits per value.
+
+    grid : str, optional
+        The output grid. Fields of spherical harmonics without RESOL are
+        delivered in the archived resolution, which is estimated as the
+        linear truncation of the output grid. Default value is None.
+
+    Return
+    ------
+    fields : int
+        The number of fields.
+
+    nbytes : int
+        The size of the retrieved file in bytes.
+    '''
+    fields = 1
+    for key in ['date', 'time', 'step', 'param', 'levelist']:
+        fields *= len(expand_values(request[key]))
+    if str(request.get('number', 'OFF')).upper() != 'OFF':
+        fields *= len(expand_values(request['number']))
+
+    points = _grid_points(request, grid)
+
+    return fields, fields * (points * int(accuracy) // 8 + _HEADER)
+
+def _plan_job(c, costs):
+    '''Creates the plan of a single job.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the job.
+
+    costs : dict
+        The costs of the stages per MiB.
+
+    Return
+    ------
+    job : dict
+        The requests, the retrieved files, the time steps, the FLEXPART
+        input files and the estimates of the job.
+    '''
+    requests = _mk_requests(c)
+
+    rawfiles = {}
+    for request in requests:
+        name = os.path.basename(request['target'])
+        fields, nbytes = estimate_request(request, c.accuracy, c.grid)
+        request.update({'fields': fields, 'bytes': nbytes})
+        rawfile = rawfiles.setdefault(name, {'name': name, 'fields': 0,
+                                             'bytes': 0})
+        rawfile['fields'] += fields
+        rawfile['bytes'] += nbytes
+
+    timesteps, outputfiles = _mk_timesteps(c, requests)
+
+    # the fields of a FLEXPART input file and of a flux file
+    grid = _grid_points({'grid': c.grid, 'area': c.area})
+    fieldsize = grid * int(c.accuracy) // 8 + _HEADER
+    nflux = _FLUX_FIELDS + (_RRINT_FIELDS if c.rrint else 0)
+    nsurface = 0
+    for grid in ['OG__SL', 'OG_OROLSM__SL']:
+        params = [r['param'] for r in requests if grid in r['target']]
+        if params:
+            nsurface += len(expand_values(params[0]))
+    nlevels = len(expand_values(c.levelist))
+    nfields = (_ML_FIELDS + (1 if c.cwc else 0)) * nlevels + \
+              nsurface + _SP_FIELDS + nflux
+
+    raw = sum(r['bytes'] for r in requests)
+    fluxraw = sum(r['bytes'] for r in requests if 'acc' in r['target'])
+    flux = len(outputfiles) * nflux * fieldsize
+    output = len(outputfiles) * nfields * fieldsize
+
+    estimate = {'requests': len(requests),
+                'fields': sum(r['fields'] for r in requests),
+                'raw_bytes': raw, 'flux_bytes': flux, 'output_bytes': output,
+                'timesteps': len(timesteps), 'outputfiles': len(outputfiles),
+                'disk_peak': _disk_peak(c, raw + flux + output),
+                'retrieval_wall': costs['retrieval'] * raw / _MIB,
+                'deaccumulation_cpu': costs['deaccumulation'] * flux / _MIB,
+                'conversion_cpu': costs['conversion'] * (raw - fluxraw) / _MIB,
+                'postprocessing_cpu': costs['postprocessing'] * output / _MIB}
+    estimate['cpu'] = estimate['deaccumulation_cpu'] + \
+        estimate['conversion_cpu'] + estimate['postprocessing_cpu']
+
+    return {'start_date': c.start_date, 'end_date': c.end_date,
+            'estimate': estimate, 'requests': requests,
+            'rawfiles': sorted(rawfiles.values(), key=lambda f: f['name']),
+            'timesteps': timesteps, 'outputfiles': outputfiles}
+
+def _mk_requests(c):
+    '''Collects the MARS requests of a job, divided by DATE_CHUNK as in
+    the retrieval.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the job.
+
+    Return
+    ------
+    requests : list of dict
+        The parameters of the MARS requests.
+    '''
+    requests = []
+    for fluxes in [True, False]:
+        start, end, chunk = mk_dates(c, fluxes)
+        day = start
+        while day <= end:
+            last = min(day + chunk - timedelta(days=1), end)
+            EcFlexpart(c, fluxes).retrieve(None, day.strftime('%Y%m%d') +
+                                           '/to/' + last.strftime('%Y%m%d'),
+                                           c.public, None, c.inputdir,
+                                           requests=requests)
+            day += chunk
+
+    return requests
+
+def _mk_timesteps(c, requests):
+    '''Determines the time steps which are converted by "create" and the
+    names of the FLEXPART input files.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the job.
+
+    requests : list of dict
+        The parameters of the MARS requests of the job.
+
+    Return
+    ------
+    timesteps : list of dict
+        The date, time, step and valid time of each converted time step.
+
+    outputfiles : list of str
+        The names of the FLEXPART input files.
+    '''
+    flexpart = EcFlexpart(c, fluxes=False)
+    start_period, end_period = flexpart.output_period(c)
+
+    numbers = [None]
+    if '/' in c.number:
+        numbers = expand_values(c.number)
+
+    steps = set()
+    for request in requests:
+        # only the non-flux fields of the output grid are converted
+        if 'acc' in request['target'] or 'OROLSM' in request['target']:
+            continue
+        for date in expand_values(request['date']):
+            for ftime in expand_values(request['time']):
+                for step in expand_values(request['step']):
+                    steps.add((date, '{:0>2}'.format(int(ftime)),
+                               '{:0>3}'.format(int(step))))
+
+    timesteps = []
+    outputfiles = set()
+    for cdate, ctime, cstep in sorted(steps):
+        valid = datetime.strptime(cdate + ctime, '%Y%m%d%H') + \
+                timedelta(hours=int(cstep))
+        if valid < start_period or valid > end_period:
+            continue
+        timesteps.append({'date': cdate, 'time': ctime, 'step': cstep,
+                          'valid': valid.strftime('%Y%m%d%H')})
+        for number in numbers:
+            outputfiles.add(c.prefix + flexpart.output_suffix(
+                c, cdate, ctime, cstep,
+                number if len(numbers) > 1 else None))
+
+    # the ELDA members are doubled from the members and the control forecast
+    if str(c.stream).lower() == 'elda' and c.doubleelda and len(numbers) > 1:
+        maxnum = int(numbers[-1])
+        for ofile in [f for f in outputfiles if f.endswith('.N000')]:
+            for i in range(1, maxnum + 1):
+                outputfiles.add(ofile[:-3] + '{:0>3}'.format(i + maxnum))
+
+    return timesteps, sorted(outputfiles)
+
+def _grid_points(request, outputgrid=None):
+    '''Determines the number of values of a field.
+
+    Parameters
+    ----------
+    request : dict
+        The parameters of the MARS request with the grid and the area,
+        and the resolution for spherical harmonics.
+
+    outputgrid : str, optional
+        The output grid, which determines the resolution of spherical
+        harmonics without RESOL. Default value is None.
+
+    Return
+    ------
+    points : int
+        The number of values.
+    '''
+    grid = str(request['grid'])
+
+    # spherical harmonics
+    if grid.upper() == 'OFF':
+        if request.get('resol'):
+            resol = int(request['resol'])
+        else:
+            resol = int(round(180. / float(outputgrid.split('/')[0]))) - 1
+        return (resol + 1) * (resol + 2)
+
+    # a Gaussian grid of the given number of latitudes between pole and
+    # equator
+    if '/' not in grid:
+        points = 8 * int(grid) ** 2
+        if request.get('gaussian') == 'reduced':
+            points = int(points * _REDUCED)
+        return points
+
+    dlat, dlon = [float(d) for d in grid.split('/')]
+    if request.get('area'):
+        north, west, south, east = [float(a) for a in
+                                    str(request['area']).split('/')]
+    else:
+        north, west, south, east = 90., 0., -90., 360. - dlon
+    if west > east:
+        west -= 360.
+
+    return (int(round((east - west) / dlon)) + 1) * \
+           (int(round((north - south) / dlat)) + 1)
+
+def _disk_peak(c, total):
+    '''Estimates the peak disk usage of the input directory.
+
+    Without bounded-disk mode all retrieved, flux and output files of the
+    job exist at the same time. In bounded-disk mode a period is prepared
+    while the next one is retrieved; with DISK_BUDGET the retrieval
+    continues until the budget is exceeded.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the job.
+
+    total : int
+        The bytes of all retrieved, flux and output files of the job.
+
+    Return
+    ------
+    peak : int
+        The peak disk usage in bytes.
+    '''
+    if not c.bounded_disk:
+        return total
+
+    sizes = []
+    for start, end in mk_periods(c):
+        cp = copy.copy(c)
+        cp.start_date, cp.end_date = start, end
+        cp.job_chunk = None
+        estimate = _plan_job_sizes(cp)
+        sizes.append(estimate)
+
+    peak = 0
+    for i, (raw, rest) in enumerate(sizes):
+        ahead = sizes[i + 1][0] if i + 1 < len(sizes) else 0
+        peak = max(peak, raw + rest + ahead)
+    if c.disk_budget:
+        peak = max(peak, min(total, int(c.disk_budget * _MIB) +
+                             max(raw for raw, _ in sizes)))
+
+    return peak
+
+def _plan_job_sizes(c):
+    '''Estimates the bytes of the retrieved files and of the flux and
+    output files of a period.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the period.
+
+    Return
+    ------
+    raw : int
+        The bytes of the retrieved files.
+
+    rest : int
+        The bytes of the flux and output files.
+    '''
+    c.bounded_disk = 0
+    estimate = _plan_job(c, DEFAULT_COSTS)['estimate']
+
+    return estimate['raw_bytes'], \
+        estimate['flux_bytes'] + estimate['output_bytes']
+
+def _print_plan(plan):
+    '''Prints the estimates of the jobs and of the whole run.
+
+    Parameters
+    ----------
+    plan : dict
+        The plan of the run.
+
+    Return
+    ------
+
+    '''
+    def line(name, estimate):
+        return ('{:<19} {:>5} {:>9} {:>10.1f} {:>7} {:>10.1f} {:>10.1f} '
+                '{:>10.1f}'.format(name, estimate['requests'],
+                                   estimate['fields'],
+                                   estimate['raw_bytes'] / _MIB,
+                                   estimate['outputfiles'],
+                                   estimate['disk_peak'] / _MIB,
+                                   estimate['retrieval_wall'],
+                                   estimate['cpu']))
+
+    print('\nRun plan {} - {}, DATE_CHUNK {}, JOB_CHUNK {}'
+          .format(plan['start_date'], plan['end_date'], plan['date_chunk'],
+                  plan['job_chunk']))
+    print('Costs per MiB from ' + plan['costs']['source'])
+    print('{:<19} {:>5} {:>9} {:>10} {:>7} {:>10} {:>10} {:>10}'
+          .format('job', 'req', 'fields', 'MiB', 'files', 'disk MiB',
+                  'retr. s', 'CPU s'))
+    for job in plan['jobs']:
+        print(line(job['start_date'] + '-' + job['end_date'],
+                   job['estimate']))
+    print(line('total', plan['totals']))
+
+    return
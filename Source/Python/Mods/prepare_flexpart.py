@@ -65,22 +65,29 @@ Read the documentation for usage instructions.
 # ------------------------------------------------------------------------------
 from __future__ import print_function
 
+import copy
 import datetime
+import glob
 import os
-import inspect
 import sys
+import shutil
 
 # software specific classes and modules from flex_extract
 # add path to local main python path for flex_extract to get full access
-sys.path.append(os.path.dirname(os.path.abspath(
-    inspect.getfile(inspect.currentframe()))) + '/../')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
 # pylint: disable=wrong-import-position
 #import _config
 from Mods.checks import check_ppid
+from Mods.errors import FlexExtractError
 from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace
+from Classes.DeaccState import DeaccState
+from Classes.Checkpoint import Checkpoint
 #from Classes.ControlFile import ControlFile
-from Mods.tools import (setup_controldata, clean_up, make_dir, normal_exit)
+from Mods.tools import (setup_controldata, clean_up, make_dir, normal_exit,
+                        run_dir, file_lock)
 from Classes.EcFlexpart import EcFlexpart
+from Mods.profiling import span, count, file_sizes
 # pylint: enable=wrong-import-position
 
 # ------------------------------------------------------------------------------
@@ -100,9 +107,13 @@ def main():
 
     '''
 
-    c, ppid, _, _ = setup_controldata()
-    prepare_flexpart(ppid, c)
-    normal_exit('Preparing FLEXPART output files: Done!')
+    try:
+        c, ppid, _, _ = setup_controldata()
+        prepare_flexpart(ppid, c)
+        normal_exit('Preparing FLEXPART output files: Done!')
+    except FlexExtractError as e:
+        # the errors are only turned into an exit status here
+        sys.exit(e.code)
 
     return
 
@@ -113,6 +124,12 @@ def prepare_flexpart(ppid, c):
     data are disaggregated. Fields are collected by hour and stored in a file 
     with a specific naming convention.
 
+    The temporary files are created in the scratch directory of the run,
+    so that several runs can work in the same input directory. Runs with
+    the same ppid wait for each other. With CHECKPOINT 1 the scratch
+    directory of a run which stopped is kept, and a rerun with the same
+    ppid continues with the units of work which were not completed.
+
     Parameters
     ----------
     ppid : int
@@ -125,7 +142,8 @@ def prepare_flexpart(ppid, c):
 
     Return
     ------
-
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files.
     '''
     check_ppid(c, ppid)
 
@@ -152,24 +170,93 @@ def prepare_flexpart(ppid, c):
     if not os.path.exists(c.outputdir):
         make_dir(c.outputdir)
 
+    if not os.path.exists(c.inputdir):
+        make_dir(c.inputdir)
+    with file_lock(run_dir(c) + '.lock'), span('preparation'):
+        outputfiles = _prepare_run(c)
+
+    return outputfiles
+
+def _prepare_run(c):
+    '''Prepares the FLEXPART input files in the scratch directory of
+    the run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files.
+    '''
+    # the input directory is scanned only once for all stages
+    workspace = Workspace(c.inputdir)
+
+    # the completed units of a previous attempt of the run are kept
+    # together with the scratch directory
+    checkpoint = None
+    if c.checkpoint:
+        checkpoint = Checkpoint(c)
+    resumed = checkpoint is not None and checkpoint.resumed
+
+    # all temporary and output files are created in the scratch directory,
+    # the final files are moved to the output directory
+    cr = copy.copy(c)
+    cr.inputdir = run_dir(c)
+    if os.path.exists(cr.inputdir) and not resumed:
+        shutil.rmtree(cr.inputdir)
+    if not os.path.exists(cr.inputdir):
+        make_dir(cr.inputdir)
+
+    # in incremental mode the flux files which the previous run completed
+    # beyond its end are taken from the state
+    if c.statedir and not resumed:
+        state = DeaccState(c.statedir)
+        if state.usable(c):
+            state.restore(cr.inputdir)
+
     # get all files with flux data to be deaccumulated
-    inputfiles = UioFiles(c.inputdir, '*OG_acc_SL*.' + str(c.ppid) + '.*')
+    inputfiles = UioFiles(c.inputdir, '*OG_acc_SL*.' + str(c.ppid) + '.*',
+                          workspace)
 
     # deaccumulate the flux data
-    flexpart = EcFlexpart(c, fluxes=True)
-    flexpart.write_namelist(c)
-    flexpart.deacc_fluxes(inputfiles, c)
+    flexpart = EcFlexpart(cr, fluxes=True)
+    flexpart.checkpoint = checkpoint
+    flexpart.write_namelist(cr)
+    with span('deaccumulation', stage=True):
+        flexpart.deacc_fluxes(inputfiles, cr)
+        count(bytes_written=file_sizes(
+            glob.glob(os.path.join(cr.inputdir, 'flux*'))))
+
+    # in bounded-disk mode the accumulated fluxes are removed at once,
+    # they are contained in the flux files now
+    if c.bounded_disk and not c.debug:
+        inputfiles.delete_files()
 
     # get a list of all other files
-    inputfiles = UioFiles(c.inputdir, '????__??.*' + str(c.ppid) + '.*')
+    inputfiles = UioFiles(c.inputdir, '????__??.*' + str(c.ppid) + '.*',
+                          workspace)
 
     # produce FLEXPART-ready GRIB files and process them -
     # copy/transfer/interpolate them or make them GRIB2
-    flexpart = EcFlexpart(c, fluxes=False)
-    flexpart.create(inputfiles, c)
-    if c.stream.lower() == 'elda' and c.doubleelda:
-        flexpart.calc_extra_elda(c.inputdir, c.prefix)
-    flexpart.process_output(c)
+    flexpart = EcFlexpart(cr, fluxes=False)
+    flexpart.checkpoint = checkpoint
+    with span('conversion', stage=True):
+        flexpart.create(inputfiles, cr)
+        if c.stream.lower() == 'elda' and c.doubleelda:
+            flexpart.calc_extra_elda(cr.inputdir, c.prefix, c.member_workers)
+    with span('postprocessing', stage=True):
+        outputfiles = flexpart.process_output(cr)
+        count(bytes_written=file_sizes(outputfiles))
+
+    # the state is only replaced after a successful run
+    if c.statedir:
+        DeaccState(c.statedir).save(cr)
+    if checkpoint:
+        checkpoint.remove()
 
     # check if in debugging mode, then store all files
     # otherwise delete temporary files
@@ -178,7 +265,7 @@ def prepare_flexpart(ppid, c):
     else:
         clean_up(c)
 
-    return
+    return outputfiles
 
 if __name__ == "__main__":
     main()
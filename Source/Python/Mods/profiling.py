@@ -10,6 +10,12 @@
 #
 # @Date: March 2018
 #
+# @Change History:
+#
+#    October 2026 - flex_extract developers:
+#        - added the spans of the stages and the JSON summary
+#        - added the peak memory of the stages
+#
 # @License:
 #    (C) Copyright 2020.
 #
@@ -17,11 +23,24 @@
 #    which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
 #
 # @Program functionality:
-#    This module is not part of flex_extract. It is just used for testing and
-#    performance analysis of some functions.
+#    This module contains the tools for the performance analysis of
+#    flex_extract. The stages of a run are recorded as nested spans with
+#    wall-clock and CPU time, bytes read and written and message counts.
+#    The summary is written as a JSON file into the input directory.
+#    Optionally, the peak memory of the stages is recorded with the
+#    high-water mark of the resident set size and with tracemalloc.
 #
 # @Program Content:
 #    - timefn
+#    - start
+#    - span
+#    - count
+#    - memory_checkpoint
+#    - wait_process
+#    - reset_rss_peak
+#    - rss_peak
+#    - file_sizes
+#    - finish
 #
 #*******************************************************************************
 
@@ -30,8 +49,28 @@
 # ------------------------------------------------------------------------------
 from __future__ import print_function
 
-from functools import wraps
+import os
+import sys
+import json
 import time
+from functools import wraps
+from contextlib import contextmanager
+
+# the profiler of the current run, None if the profiling is off
+_active = None
+
+# the number of bytes in a MiB
+_MIB = 1024. * 1024.
+
+# the number of largest allocation sites in the memory record of a stage
+_NSITES = 10
+
+# the summed up values of the spans
+_SUMS = ['wall', 'cpu', 'cpu_children', 'messages', 'bytes_read',
+         'bytes_written']
+
+# the peak memory values in MiB, the maximum is taken in the totals
+_PEAKS = ['rss_peak', 'traced_peak', 'rss_child']
 
 # ------------------------------------------------------------------------------
 # FUNCTION
@@ -73,3 +112,671 @@ def timefn(func):
         return result
 
     return measure_time
+
+def start(c):
+    '''Starts the profiling of a run, if it is switched on by the
+    PROFILING parameter.
+
+    With PROFILING 1 the spans of the stages are recorded, with PROFILING 2
+    the stages are profiled with cProfile in addition. With
+    MEMORY_PROFILING 1 the spans are recorded together with the peak
+    memory of the stages.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+
+    '''
+    global _active
+
+    _active = None
+    if getattr(c, 'profiling', 0) or getattr(c, 'memory_profiling', 0):
+        _active = _Profiler(c)
+
+    return
+
+@contextmanager
+def span(name, stage=False, **info):
+    '''Records a span of the run, nested in the current span.
+
+    Without profiling, or in the worker processes of a run, nothing is
+    recorded.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span, e.g. "deaccumulation". The spans with the same
+        name are summed up in the summary.
+
+    stage : boolean, optional
+        Decides if the span is a stage, which is profiled with cProfile
+        with PROFILING 2 and whose peak memory is recorded with
+        MEMORY_PROFILING 1. Stages within stages are not profiled
+        separately. Default value is False.
+
+    info : dict, optional
+        Additional information about the span, e.g. the time step.
+
+    Return
+    ------
+    node : dict
+        The record of the span or None.
+    '''
+    profiler = _active
+    if profiler is None or profiler.pid != os.getpid():
+        yield None
+        return
+
+    node = _mk_node(name, info)
+    profiler.stack[-1]['children'].append(node)
+    profiler.stack.append(node)
+
+    outer = stage and profiler.stage is None and \
+        (profiler.cprofile or profiler.memory)
+    cprofile = None
+    if outer:
+        profiler.stage = node
+        if profiler.memory:
+            profiler.baseline = _start_memory(node)
+        if profiler.cprofile:
+            import cProfile
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+
+    times = os.times()
+    wall = time.time()
+    try:
+        yield node
+    finally:
+        _add_times(node, wall, times)
+        profiler.stack.pop()
+        if cprofile is not None:
+            cprofile.disable()
+            profiler.nstages += 1
+            cprofile.dump_stats(profiler.path('{}.{}.prof'.format(
+                profiler.nstages, name)))
+        if outer:
+            if profiler.memory:
+                _stop_memory(node)
+                profiler.baseline = None
+            profiler.stage = None
+
+def count(messages=0, bytes_read=0, bytes_written=0):
+    '''Adds message and byte counts to the current span.
+
+    Parameters
+    ----------
+    messages : int, optional
+        Number of processed GRIB messages. Default value is 0.
+
+    bytes_read : int, optional
+        Number of bytes read. Default value is 0.
+
+    bytes_written : int, optional
+        Number of bytes written. Default value is 0.
+
+    Return
+    ------
+
+    '''
+    profiler = _active
+    if profiler is None or profiler.pid != os.getpid():
+        return
+
+    node = profiler.stack[-1]
+    node['messages'] += messages
+    node['bytes_read'] += bytes_read
+    node['bytes_written'] += bytes_written
+
+    return
+
+def memory_checkpoint(label):
+    '''Records the largest allocation sites of the current stage, if the
+    traced memory is higher than at the previous checkpoints of the stage.
+    The sites are given with the memory allocated since the start of
+    the stage.
+
+    The checkpoints are placed where large arrays are alive, because
+    the allocation sites of freed memory are lost at the end of a stage.
+
+    Parameters
+    ----------
+    label : str
+        Name of the checkpoint, e.g. the name of the function.
+
+    Return
+    ------
+
+    '''
+    profiler = _active
+    if profiler is None or profiler.pid != os.getpid() or \
+       not profiler.memory or profiler.stage is None:
+        return
+
+    import tracemalloc
+
+    memory = profiler.stage['memory']
+    current = tracemalloc.get_traced_memory()[0] / _MIB
+    if memory['checkpoint'] is not None and current < memory['traced']:
+        return
+
+    # only the memory allocated within the stage is of interest
+    stats = _snapshot().compare_to(profiler.baseline, 'lineno')
+    memory['checkpoint'] = label
+    memory['traced'] = current
+    memory['top'] = [
+        {'site': '{}:{}'.format(stat.traceback[0].filename,
+                                stat.traceback[0].lineno),
+         'size': stat.size_diff / _MIB, 'count': stat.count_diff}
+        for stat in stats[:_NSITES] if stat.size_diff > 0]
+
+    return
+
+def wait_process(proc):
+    '''Waits for a child process, e.g. the Fortran program, and records
+    its peak resident set size in the current span.
+
+    Without memory profiling the process is simply waited for.
+
+    Parameters
+    ----------
+    proc : subprocess.Popen
+        The running process.
+
+    Return
+    ------
+    returncode : int
+        The return code of the process.
+    '''
+    profiler = _active
+    if profiler is None or profiler.pid != os.getpid() or \
+       not profiler.memory or not hasattr(os, 'wait4') or \
+       proc.returncode is not None:
+        return proc.wait()
+
+    _, status, usage = os.wait4(proc.pid, 0)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+
+    rss = _maxrss(usage)
+    for node in [profiler.stack[-1], profiler.stage]:
+        if node is not None:
+            memory = node.setdefault('memory', {})
+            memory['rss_child'] = max(memory.get('rss_child', 0.), rss)
+
+    return proc.returncode
+
+def reset_rss_peak():
+    '''Resets the high-water mark of the resident set size of the process
+    to the current resident set size.
+
+    Only Linux allows to reset the high-water mark, otherwise it remains
+    the one since the start of the process.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    reset : boolean
+        True if the high-water mark was reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        return False
+
+    return True
+
+def rss_peak():
+    '''Returns the high-water mark of the resident set size of the
+    process, since its start or since the last reset.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    rss : float
+        The high-water mark in MiB.
+    '''
+    import resource
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.
+    except (IOError, OSError):
+        pass
+
+    return _maxrss(resource.getrusage(resource.RUSAGE_SELF))
+
+def file_sizes(files):
+    '''Sums up the size of files, without the missing ones.
+
+    Parameters
+    ----------
+    files : list of str
+        Paths of the files.
+
+    Return
+    ------
+    size : int
+        The total size in bytes.
+    '''
+    size = 0
+    for filename in files:
+        if os.path.isfile(filename):
+            size += os.path.getsize(filename)
+
+    return size
+
+def finish():
+    '''Ends the profiling and writes the summary into the input
+    directory, as profile.<ppid>.json.
+
+    The summary contains the tree of the spans and the totals per
+    span name. The times are in seconds. The CPU time of the child
+    processes, e.g. the Fortran program, is given separately.
+    With memory profiling, the stages and the whole run have the peak
+    memory in MiB: the high-water mark of the resident set size, the
+    peak of the memory traced by tracemalloc, the largest resident set
+    size of a child process and the largest allocation sites at the
+    checkpoint with the most traced memory. The totals have the maxima.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    summary : str
+        Path of the summary file, None without profiling.
+    '''
+    global _active
+
+    profiler = _active
+    if profiler is None or profiler.pid != os.getpid():
+        return None
+    _active = None
+
+    root = profiler.stack[0]
+    _add_times(root, profiler.wall, profiler.times)
+    if profiler.memory:
+        _finish_memory(profiler)
+
+    totals = {}
+    _sum_nodes(root, totals)
+
+    summary = profiler.path('json')
+    with open(summary + '.tmp', 'w') as f:
+        json.dump({'totals': totals, 'spans': root}, f, indent=1,
+                  sort_keys=True)
+    os.rename(summary + '.tmp', summary)
+
+    print('Profile summary: ' + summary)
+    for name in sorted(totals, key=lambda n: -totals[n]['wall']):
+        print('{:<20} {:>6} x {:>10.3f} s wall {:>10.3f} s cpu'
+              .format(name, totals[name]['count'], totals[name]['wall'],
+                      totals[name]['cpu']))
+
+    if profiler.memory:
+        _print_memory(totals)
+
+    return summary
+
+class _Profiler(object):
+    '''The spans of a run.
+
+    Attributes
+    ----------
+    c : ControlFile
+        The settings of the run, which give the input directory and the ppid
+        for the summary.
+
+    pid : int
+        The process of the run. Worker processes do not record spans.
+
+    cprofile : boolean
+        Decides if the stages are profiled with cProfile.
+
+    memory : boolean
+        Decides if the peak memory of the stages is recorded.
+
+    tracemalloc : boolean
+        Decides if tracemalloc was started for the run and is stopped
+        at its end.
+
+    stage : dict
+        The record of the stage which is profiled or None.
+
+    baseline : tracemalloc.Snapshot
+        The traced memory at the start of the profiled stage or None.
+
+    nstages : int
+        The number of profiled stages.
+
+    stack : list of dict
+        The open spans, the first is the one of the whole run.
+
+    wall : float
+        The start time of the run.
+
+    times : tuple
+        The CPU times at the start of the run.
+    '''
+
+    def __init__(self, c):
+        '''Starts the span of the whole run.
+
+        Parameters
+        ----------
+        c : ControlFile
+            Contains all the parameters of CONTROL file and
+            command line.
+
+        Return
+        ------
+
+        '''
+        self.c = c
+        self.pid = os.getpid()
+        self.cprofile = int(getattr(c, 'profiling', 0)) > 1
+        self.memory = bool(int(getattr(c, 'memory_profiling', 0)))
+        self.tracemalloc = False
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracemalloc = True
+        self.stage = None
+        self.baseline = None
+        self.nstages = 0
+        self.stack = [_mk_node('flex_extract', {})]
+        self.wall = time.time()
+        self.times = os.times()
+
+        return
+
+    def path(self, suffix):
+        '''Returns the path of a profiling file in the input directory.
+
+        Parameters
+        ----------
+        suffix : str
+            The end of the file name, e.g. "json".
+
+        Return
+        ------
+        path : str
+            The path profile.<ppid>.<suffix>.
+        '''
+        ppid = getattr(self.c, 'ppid', None) or os.getpid()
+
+        return os.path.join(self.c.inputdir,
+                            'profile.{}.{}'.format(ppid, suffix))
+
+def _mk_node(name, info):
+    '''Creates the record of a span.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span.
+
+    info : dict
+        Additional information about the span.
+
+    Return
+    ------
+    node : dict
+        The record with zero times and counts.
+    '''
+
+    return {'name': name, 'info': dict((k, str(v)) for k, v in info.items()),
+            'wall': 0., 'cpu': 0., 'cpu_children': 0., 'messages': 0,
+            'bytes_read': 0, 'bytes_written': 0, 'children': []}
+
+def _add_times(node, wall, times):
+    '''Adds the elapsed times since the start of a span to its record.
+
+    Parameters
+    ----------
+    node : dict
+        The record of the span.
+
+    wall : float
+        The time at the start of the span.
+
+    times : tuple
+        The result of os.times at the start of the span.
+
+    Return
+    ------
+
+    '''
+    now = os.times()
+    node['wall'] += time.time() - wall
+    node['cpu'] += (now[0] - times[0]) + (now[1] - times[1])
+    node['cpu_children'] += (now[2] - times[2]) + (now[3] - times[3])
+
+    return
+
+def _sum_nodes(node, totals):
+    '''Sums up the records of the spans per name.
+
+    Parameters
+    ----------
+    node : dict
+        The record of a span, the records of its children are included.
+
+    totals : dict
+        The sums per span name, which are updated.
+
+    Return
+    ------
+
+    '''
+    total = totals.setdefault(node['name'],
+                              {'count': 0, 'wall': 0., 'cpu': 0.,
+                               'cpu_children': 0., 'messages': 0,
+                               'bytes_read': 0, 'bytes_written': 0})
+    total['count'] += 1
+    for key in _SUMS:
+        total[key] += node[key]
+
+    if 'memory' in node:
+        memory = total.setdefault('memory', {})
+        for key in _PEAKS:
+            if key in node['memory']:
+                memory[key] = max(memory.get(key, 0.), node['memory'][key])
+        if node['memory'].get('traced', 0.) >= memory.get('traced', 0.) and \
+           node['memory'].get('top'):
+            for key in ['traced', 'checkpoint', 'top']:
+                memory[key] = node['memory'][key]
+
+    for child in node['children']:
+        _sum_nodes(child, totals)
+
+    return
+
+def _start_memory(node):
+    '''Starts the memory record of a stage.
+
+    The high-water mark of the resident set size is reset, where
+    the system allows it, as well as the peak of the traced memory.
+
+    Parameters
+    ----------
+    node : dict
+        The record of the stage.
+
+    Return
+    ------
+    baseline : tracemalloc.Snapshot
+        The traced memory at the start of the stage.
+    '''
+    import tracemalloc
+
+    node['memory'] = {'rss_peak': 0., 'traced_peak': 0., 'traced': 0.,
+                      'checkpoint': None, 'top': []}
+
+    reset_rss_peak()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+    return _snapshot()
+
+def _snapshot():
+    '''Takes a snapshot of the traced memory, without the memory of
+    tracemalloc itself.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    snapshot : tracemalloc.Snapshot
+        The traced memory blocks.
+    '''
+    import tracemalloc
+
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+def _stop_memory(node):
+    '''Completes the memory record of a stage with its peaks.
+
+    Parameters
+    ----------
+    node : dict
+        The record of the stage.
+
+    Return
+    ------
+
+    '''
+    import tracemalloc
+
+    memory_checkpoint(node['name'])
+    memory = node['memory']
+    memory['traced_peak'] = tracemalloc.get_traced_memory()[1] / _MIB
+    memory['rss_peak'] = rss_peak()
+
+    return
+
+def _finish_memory(profiler):
+    '''Adds the peak memory of the whole run to its record and stops
+    tracemalloc.
+
+    Parameters
+    ----------
+    profiler : _Profiler
+        The profiler of the run.
+
+    Return
+    ------
+
+    '''
+    import resource
+    import tracemalloc
+
+    root = profiler.stack[0]
+    memory = root.setdefault('memory', {})
+    memory['rss_peak'] = _maxrss(resource.getrusage(resource.RUSAGE_SELF))
+    memory['traced_peak'] = tracemalloc.get_traced_memory()[1] / _MIB
+    for stage in _stages(root):
+        for key in _PEAKS:
+            if key in stage['memory']:
+                memory[key] = max(memory.get(key, 0.), stage['memory'][key])
+
+    if profiler.tracemalloc:
+        tracemalloc.stop()
+
+    return
+
+def _stages(node):
+    '''Returns the records of the spans with a memory record.
+
+    Parameters
+    ----------
+    node : dict
+        The record of a span, the records of its children are included.
+
+    Return
+    ------
+    stages : list of dict
+        The records with a memory record, without the given one.
+    '''
+    stages = []
+    for child in node['children']:
+        if 'memory' in child:
+            stages.append(child)
+        stages.extend(_stages(child))
+
+    return stages
+
+def _maxrss(usage):
+    '''Converts the maximum resident set size of a resource usage.
+
+    Parameters
+    ----------
+    usage : resource.struct_rusage
+        The resource usage of a process.
+
+    Return
+    ------
+    rss : float
+        The maximum resident set size in MiB.
+    '''
+    # macOS gives bytes, the other systems kilobytes
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss / _MIB
+
+    return usage.ru_maxrss / 1024.
+
+def _print_memory(totals):
+    '''Prints the peak memory per span name and the largest allocation
+    sites of each stage.
+
+    Parameters
+    ----------
+    totals : dict
+        The sums per span name.
+
+    Return
+    ------
+
+    '''
+    names = sorted((name for name in totals if 'memory' in totals[name]),
+                   key=lambda n: -totals[n]['memory'].get('rss_peak', 0.))
+
+    print('Peak memory in MiB:')
+    print('{:<20} {:>10} {:>10} {:>10}'.format('', 'rss', 'traced',
+                                              'rss child'))
+    for name in names:
+        memory = totals[name]['memory']
+        print('{:<20} {:>10.1f} {:>10.1f} {:>10.1f}'
+              .format(name, memory.get('rss_peak', 0.),
+                      memory.get('traced_peak', 0.),
+                      memory.get('rss_child', 0.)))
+
+    for name in names:
+        memory = totals[name]['memory']
+        if not memory.get('top'):
+            continue
+        print('Largest allocation sites of {} at {} ({:.1f} MiB traced):'
+              .format(name, memory['checkpoint'], memory['traced']))
+        for site in memory['top'][:5]:
+            print('    {:>10.1f} MiB {:>8} x {}'
+                  .format(site['size'], site['count'], site['site']))
+
+    return
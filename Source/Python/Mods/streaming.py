@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    mk_step_requests
+#    split_request
+#    run_streaming
+#*******************************************************************************
+'''This module contains the functions of the streaming mode for
+operational runs with BASETIME.
+
+Instead of retrieving all fields of the cycle at once, the MARS requests
+are divided by the valid time of the fields. The valid times are retrieved
+in order; a request for fields which are not yet available is repeated
+every STREAM_POLL seconds. As soon as the data of a time step are complete,
+it is converted and its FLEXPART input file is moved to the output
+directory. The flux data of a time step are complete when the two
+following flux time steps are retrieved, or at the end of the cycle.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import copy
+import time
+import shutil
+from datetime import datetime, timedelta
+
+# software specific classes and modules from flex_extract
+from Mods.checks import check_ppid
+from Mods.errors import RetrievalError, FieldsNotAvailableError
+from Mods.tools import (make_dir, module_available, clean_up, run_dir,
+                        file_lock, silent_remove)
+from Mods.get_mars_data import mk_server, mk_dates, remove_old
+from Classes.EcFlexpart import EcFlexpart
+from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace
+from Classes.LocalServer import expand_values
+from Classes.MarsRetrieval import MarsRetrieval
+from Mods.profiling import span
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def mk_step_requests(c):
+    '''Collects the MARS requests of the cycle and divides them by the
+    valid time of the fields.
+
+    Fields after the basetime are left out, as in the retrieval of the
+    whole cycle.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    steps : list of tuple
+        The valid times in ascending order, each with the list of
+        parameters of its MARS requests.
+    '''
+    elimit = datetime.strptime(c.end_date, '%Y%m%d') + \
+             timedelta(hours=int(c.basetime))
+
+    steps = {}
+    targets = set()
+    for fluxes in [True, False]:
+        start, end, _ = mk_dates(c, fluxes)
+        requests = []
+        flexpart = EcFlexpart(c, fluxes)
+        flexpart.retrieve(None, start.strftime('%Y%m%d') + '/to/' +
+                          end.strftime('%Y%m%d'), c.public, None,
+                          c.inputdir, requests=requests)
+        for request in requests:
+            for vtime, step_request in split_request(request):
+                if vtime > elimit or step_request['target'] in targets:
+                    continue
+                targets.add(step_request['target'])
+                steps.setdefault(vtime, []).append(step_request)
+
+    return sorted(steps.items())
+
+def split_request(request):
+    '''Divides a MARS request into requests for a single date, time and
+    step.
+
+    The date part of the target file name is replaced by the date, time
+    and step, e.g. FCOG__ML.2020010112_003.1234.5678.grb.
+
+    Parameters
+    ----------
+    request : dict
+        The parameters of the MARS request.
+
+    Return
+    ------
+    requests : list of tuple
+        The valid time and the parameters of each request.
+    '''
+    dirname, name = os.path.split(request['target'])
+    parts = name.split('.')
+
+    requests = []
+    for date in expand_values(request['date']):
+        for ftime in expand_values(request['time']):
+            for step in expand_values(request['step']):
+                vtime = datetime.strptime(date, '%Y%m%d') + \
+                        timedelta(hours=int(ftime) + int(step))
+                parts[1] = '{}{:0>2}_{:0>3}'.format(date, int(ftime),
+                                                    int(step))
+                step_request = dict(request)
+                step_request.update({'date': date, 'time': ftime,
+                                     'step': step,
+                                     'target': os.path.join(dirname,
+                                                            '.'.join(parts))})
+                requests.append((vtime, step_request))
+
+    return requests
+
+def run_streaming(ppid, c, server=None):
+    '''Retrieves and prepares the time steps of an operational cycle as
+    soon as they are available.
+
+    The FLEXPART input files are moved to the output directory one after
+    the other. The MARS requests are not printed in streaming mode.
+
+    Parameters
+    ----------
+    ppid : str
+        Contains the ppid number of the current ECMWF job. It will be None
+        if the method was called on the local side.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    server : ECMWFService, ECMWFDataServer or LocalServer, optional
+        The connection to the data. Default value is None, which connects
+        to the ECMWF servers.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files. They are removed after the
+        preparation unless in debugging mode.
+
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files.
+    '''
+    check_ppid(c, ppid)
+
+    if server is None:
+        c.ec_api = module_available('ecmwfapi')
+        c.cds_api = module_available('cdsapi')
+        server = mk_server(c)
+
+    if not os.path.exists(c.inputdir):
+        make_dir(c.inputdir)
+    if not os.path.exists(c.outputdir):
+        make_dir(c.outputdir)
+
+    with file_lock(run_dir(c) + '.lock'):
+        retrieved, outputfiles = _stream_run(c, server)
+
+    return retrieved, sorted(outputfiles)
+
+def _stream_run(c, server):
+    '''Retrieves and prepares the time steps of the cycle, while holding
+    the lock of the run.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    server : ECMWFService, ECMWFDataServer or LocalServer
+        The connection to the data.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files.
+
+    outputfiles : list of str
+        Paths of the FLEXPART input files.
+    '''
+    steps = mk_step_requests(c)
+    print('Streaming mode: {} valid times, {} requests'
+          .format(len(steps), sum(len(requests) for _, requests in steps)))
+
+    workspace = Workspace(c.inputdir)
+    remove_old('*.' + str(c.ppid) + '.*grb', c.inputdir, workspace)
+
+    # the temporary files are created in the scratch directory of the run
+    cr = copy.copy(c)
+    cr.inputdir = run_dir(c)
+    if os.path.exists(cr.inputdir):
+        shutil.rmtree(cr.inputdir)
+    make_dir(cr.inputdir)
+    EcFlexpart(cr, fluxes=True).write_namelist(cr)
+
+    deadline = time.time() + c.stream_timeout * 60
+    lag = timedelta(hours=2 * int(c.dtime))
+    last = steps[-1][0]
+
+    retrieved = []
+    outputfiles = []
+    # the retrieved non-flux files which are not converted yet
+    pending = []
+    # the retrieved flux files which are not deaccumulated yet and the
+    # last intervals of the deaccumulation so far
+    newfluxes = []
+    windows = {}
+    for vtime, requests in steps:
+        for request in requests:
+            target = _retrieve_step(server, c, request, deadline)
+            workspace.add(target)
+            retrieved.append(target)
+            if 'OG_acc_SL' in target:
+                newfluxes.append(target)
+            elif 'OG_OROLSM__SL' not in target:
+                pending.append((vtime, target))
+
+        # the flux data of a time step are disaggregated with the
+        # two following flux time steps
+        ready = [target for t, target in pending
+                 if t <= vtime - lag or vtime == last]
+        if not ready:
+            continue
+
+        # each flux time step is deaccumulated once, the deaccumulation
+        # continues with the last intervals of the previous time steps
+        if newfluxes:
+            fluxfiles = UioFiles(c.inputdir, '*OG_acc_SL*.' + str(c.ppid) +
+                                 '.*', workspace)
+            fluxfiles.files = [f for f in fluxfiles.files if f in newfluxes]
+            with span('deaccumulation', stage=True):
+                EcFlexpart(cr, fluxes=True).deacc_fluxes(fluxfiles, cr,
+                                                         windows=windows)
+            newfluxes = []
+
+        inputfiles = UioFiles(c.inputdir, '????__??.*' + str(c.ppid) + '.*',
+                              workspace)
+        inputfiles.files = [f for f in inputfiles.files if f in ready]
+        flexpart = EcFlexpart(cr, fluxes=False)
+        with span('conversion', stage=True):
+            flexpart.create(inputfiles, cr)
+        with span('postprocessing', stage=True):
+            published = flexpart.process_output(cr)
+        for ofile in published:
+            print('Published ' + ofile)
+            outputfiles.append(ofile)
+
+        pending = [(t, target) for t, target in pending
+                   if target not in ready]
+
+    if c.debug:
+        print('\nTemporary files left intact')
+    else:
+        clean_up(c)
+
+    return retrieved, outputfiles
+
+def _retrieve_step(server, c, request, deadline):
+    '''Retrieves the fields of a request as soon as they are available.
+
+    Parameters
+    ----------
+    server : ECMWFService, ECMWFDataServer or LocalServer
+        The connection to the data.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    request : dict
+        The parameters of the MARS request.
+
+    deadline : float
+        The time in seconds since the epoch after which a request for
+        fields which are not available is not repeated.
+
+    Return
+    ------
+    target : str
+        Path to the retrieved file.
+    '''
+    MR = MarsRetrieval(server, c.public, **request)
+    MR.display_info()
+
+    while True:
+        try:
+            with span('request', target=os.path.basename(request['target'])):
+                MR.data_retrieve()
+            return request['target']
+        except FieldsNotAvailableError:
+            # other errors are not solved by waiting
+            silent_remove(request['target'])
+            if time.time() >= deadline:
+                raise RetrievalError('... FIELDS OF {} {} STEP {} NOT '
+                                     'AVAILABLE WITHIN STREAM_TIMEOUT!'
+                                     .format(request['date'],
+                                             request['time'],
+                                             request['step']))
+            print('... fields not yet available, next try in {} s'
+                  .format(c.stream_poll))
+            time.sleep(c.stream_poll)
@@ -53,6 +53,10 @@
 #    get_informations
 #    get_dimensions
 #    execute_subprocess
+#    move_file
+#    module_available
+#    run_dir
+#    file_lock
 #*******************************************************************************
 '''This module contains a collection of diverse tasks within flex_extract.
 '''
@@ -64,8 +68,7 @@ from __future__ import print_function
 
 import os
 import errno
-import sys
-import glob
+import shutil
 import subprocess
 import traceback
 # pylint: disable=unused-import
@@ -74,9 +77,14 @@ try:
 except ImportError:
     import builtins as exceptions
 # pylint: enable=unused-import
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
+# software specific classes and modules from flex_extract
+from Mods.errors import (FlexExtractError, ControlFileError, ProcessingError,
+                         SubmissionError)
+
 # ------------------------------------------------------------------------------
 # METHODS
 # ------------------------------------------------------------------------------
@@ -211,7 +219,8 @@ def get_cmdline_args():
                         'environment variables')
     parser.add_argument("--request", dest="request",
                         type=none_or_int, default=None,
-                        help="list all MARS requests in file mars_requests.dat")
+                        help="list all MARS requests in file mars_requests.dat "
+                        "(1, 2) or only plan the run (3)")
     parser.add_argument("--public", dest="public",
                         type=none_or_int, default=None,
                         help="public mode - retrieves public datasets")
@@ -280,16 +289,19 @@ def read_ecenv(filepath):
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-        sys.exit('\n... Error occured while trying to read ECMWF_ENV '
-                 'file: ' + str(filepath))
+        raise ControlFileError('\n... Error occured while trying to read '
+                               'ECMWF_ENV file: ' + str(filepath))
 
     return envs
 
 def clean_up(c):
-    '''Remove files from the intermediate directory (inputdir).
+    '''Remove the files of the current run from the intermediate
+    directory (inputdir).
 
-    It keeps the final FLEXPART input files if program runs without
-    ECMWF API and keywords "ectrans" or "ecstorage" are set to "1".
+    These are the retrieved files of the run, identified by the ppid in
+    their names, the scratch directory of the run and its lock file. The
+    files of other runs in the same directory are kept, as well as the
+    final FLEXPART input files. The caller holds the lock of the run.
 
     Parameters
     ----------
@@ -302,15 +314,27 @@ def clean_up(c):
 
     '''
 
+    from Classes.Workspace import Workspace
+
     print("... clean inputdir!")
 
-    cleanlist = [filename for filename in
-                 glob.glob(os.path.join(c.inputdir, "*"))
-                 if not os.path.basename(filename).startswith(c.prefix)]
+    workspace = Workspace(c.inputdir)
+    cleanlist = [name for name in
+                 workspace.select(ppid=getattr(c, 'ppid', None))
+                 if not os.path.basename(name).startswith(c.prefix)]
+    scratchdir = os.path.basename(run_dir(c))
+    lockfile = run_dir(c) + '.lock'
 
-    if cleanlist:
+    if cleanlist or scratchdir in workspace.dirs or os.path.isfile(lockfile):
         for element in cleanlist:
             silent_remove(element)
+        # working directories of the run and its parallel processes
+        if scratchdir in workspace.dirs:
+            shutil.rmtree(os.path.join(c.inputdir, scratchdir),
+                          ignore_errors=True)
+        # a waiting run locks a new file, see file_lock
+        if os.path.isfile(lockfile):
+            silent_remove(lockfile)
         print("... done!")
     else:
         print("... nothing to clean!")
@@ -318,7 +342,74 @@ def clean_up(c):
     return
 
 
-def my_error(message='ERROR'):
+def run_dir(c):
+    '''Returns the scratch directory of the current run.
+
+    The temporary files of a run, like the fort.* files, the namelist and
+    the grib index, are created in this sub-directory of the input
+    directory, so that several runs can use the same input directory at the
+    same time.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    path : str
+        Path to the scratch directory.
+    '''
+
+    return os.path.join(c.inputdir, 'run.' + str(getattr(c, 'ppid', None)))
+
+
+@contextmanager
+def file_lock(filename):
+    '''Holds an exclusive lock on a file while the block is executed.
+
+    The lock is released if the process dies. On systems without fcntl
+    the block is executed without locking. The holder of the lock may
+    remove the lock file; a process which waited for it then locks the
+    file which is created anew.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the lock file. It is created if it does not exist.
+
+    Return
+    ------
+
+    '''
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    while True:
+        f = open(filename, 'a')
+        if not fcntl:
+            break
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        # the lock is only valid if the file was not removed meanwhile
+        try:
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(filename)):
+                break
+        except OSError:
+            pass
+        f.close()
+
+    try:
+        yield
+    finally:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+def my_error(message='ERROR', error=FlexExtractError):
     '''Prints a specified error message which can be passed to the function
     before exiting the program.
 
@@ -327,6 +418,10 @@ def my_error(message='ERROR'):
     message : str, optional
         Error message. Default value is "ERROR".
 
+    error : class, optional
+        Type of the raised FlexExtractError. Default value is
+        FlexExtractError.
+
     Return
     ------
 
@@ -337,9 +432,7 @@ def my_error(message='ERROR'):
 
     print(full_message)
 
-    sys.exit(1)
-
-    return
+    raise error(message, code=1)
 
 
 def send_mail(users, success_mode, message):
@@ -377,11 +470,11 @@ def send_mail(users, success_mode, message):
             pout = p.communicate(input=message + '\n\n')[0]
         except ValueError as e:
             print('... ERROR: ' + str(e))
-            sys.exit('... Email could not be sent!')
+            raise SubmissionError('... Email could not be sent!')
         except OSError as e:
             print('... ERROR CODE: ' + str(e.errno))
             print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
-            sys.exit('... Email could not be sent!')
+            raise SubmissionError('... Email could not be sent!')
         else:
             print('Email sent to ' + os.path.expandvars(user))
 
@@ -449,7 +542,7 @@ def product(*args, **kwds):
         for prod in result:
             yield tuple(prod)
     except TypeError as e:
-        sys.exit('... PRODUCT GENERATION FAILED!')
+        raise FlexExtractError('... PRODUCT GENERATION FAILED!')
 
     return
 
@@ -502,8 +595,8 @@ def init128(filepath):
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-        sys.exit('\n... Error occured while trying to read parameter '
-                 'table file: ' + str(filepath))
+        raise ControlFileError('\n... Error occured while trying to read '
+                               'parameter table file: ' + str(filepath))
     else:
         for data in fdata:
             if data != '' and data[0] != '!':
@@ -689,13 +782,13 @@ def put_file_to_ecserver(ecd, filename, target, ecuid, ecgid):
         print('... ERROR MESSAGE:\n \t ' + str(e))
 
         print('\n... Do you have a valid ecaccess certification key?')
-        sys.exit('... ECACCESS-FILE-PUT FAILED!')
+        raise SubmissionError('... ECACCESS-FILE-PUT FAILED!')
     except OSError as e:
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
         print('\n... Most likely the ECACCESS library is not available!')
-        sys.exit('... ECACCESS-FILE-PUT FAILED!')
+        raise SubmissionError('... ECACCESS-FILE-PUT FAILED!')
 
     return
 
@@ -731,13 +824,13 @@ def submit_job_to_ecserver(target, jobname):
         print('... ERROR MESSAGE:\n \t ' + str(e))
 
         print('\n... Do you have a valid ecaccess certification key?')
-        sys.exit('... ecaccess-job-submit FAILED!')
+        raise SubmissionError('... ecaccess-job-submit FAILED!')
     except OSError as e:
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
         print('\n... Most likely the ECACCESS library is not available!')
-        sys.exit('... ecaccess-job-submit FAILED!')
+        raise SubmissionError('... ecaccess-job-submit FAILED!')
 
     return job_id.decode()
 
@@ -872,12 +965,12 @@ def execute_subprocess(cmd_list, error_msg='SUBPROCESS FAILED!'):
         print('... ERROR CODE: ' + str(e.returncode))
         print('... ERROR MESSAGE:\n \t ' + str(e))
 
-        sys.exit('... ' + error_msg)
+        raise ProcessingError('... ' + error_msg)
     except OSError as e:
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-        sys.exit('... ' + error_msg)
+        raise ProcessingError('... ' + error_msg)
 
     return
 
@@ -909,3 +1002,61 @@ def generate_retrieval_period_boundary(c):
 
 
     return start_period, end_period
+
+
+def move_file(src, destdir):
+    '''Moves a file into a directory.
+
+    Within the same file system the file is renamed, which is atomic.
+    Across file systems it is copied to a temporary file in the
+    destination directory first, which is then renamed. Thus, the
+    destination never contains a partially written file.
+
+    Parameters
+    ----------
+    src : str
+        Path of the file to be moved.
+
+    destdir : str
+        Path of the destination directory.
+
+    Return
+    ------
+    dst : str
+        Path of the moved file.
+    '''
+    dst = os.path.join(destdir, os.path.basename(src))
+
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        tmpfile = os.path.join(destdir, '.' + os.path.basename(src) +
+                               '.' + str(os.getpid()))
+        shutil.copy2(src, tmpfile)
+        os.rename(tmpfile, dst)
+        os.remove(src)
+
+    return dst
+
+
+def module_available(name):
+    '''Checks if a Python module can be imported, without importing it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the module.
+
+    Return
+    ------
+    available : boolean
+        True if the module can be imported, False otherwise.
+    '''
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        from pkgutil import find_loader as find_spec
+
+    return find_spec(name) is not None
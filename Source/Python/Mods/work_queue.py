@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#*******************************************************************************
+# @Author: flex_extract developers
+#
+# @Date: October 2026
+#
+# @Change History:
+#
+# @License:
+#    (C) Copyright 2014-2020.
+#    Anne Philipp, Leopold Haimberger
+#
+#    SPDX-License-Identifier: CC-BY-4.0
+#
+#    This work is licensed under the Creative Commons Attribution 4.0
+#    International License. To view a copy of this license, visit
+#    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+#    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+#
+# @Methods:
+#    mk_units
+#    unit_name
+#    queue_status
+#    run_queue
+#*******************************************************************************
+'''This module contains the functions of the work-queue mode.
+
+Several workers, e.g. on different nodes of a cluster, extract the period
+of the same CONTROL file together. They only share the queue directory
+WORK_QUEUE and the output directory on a common file system, no further
+service is needed. The period is divided into the work units of JOB_CHUNK
+days (DATE_CHUNK days without JOB_CHUNK). A worker claims a unit by
+creating its claim directory, which is atomic also on network file
+systems, and retrieves and prepares the unit as a run of its own (see
+Mods.bounded_disk.mk_runs). The FLEXPART input files are moved to the
+output directory atomically, then the unit is marked as done.
+
+The queue directory contains the file units.json with the units and the
+settings of the extraction, and for each unit, e.g. 20120101-20120103,
+the claim directory 20120101-20120103.claim while it is processed and the
+file 20120101-20120103.done or 20120101-20120103.failed afterwards.
+
+A worker renews its claim regularly. The claim of a worker which died
+expires after the lease time and another worker takes the unit over. A
+failed unit is not repeated, its .failed file has to be removed to retry
+it. If two workers take over an expired claim at the same time, both
+process the unit, with the same results.
+'''
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+from __future__ import print_function
+
+import os
+import json
+import time
+import errno
+import shutil
+import socket
+import threading
+
+# software specific classes and modules from flex_extract
+from Mods.tools import make_dir
+from Mods.checks import check_ppid
+from Mods.errors import (ControlFileError, FlexExtractError,
+                         ProcessingError)
+from Mods.bounded_disk import mk_periods, mk_runs, run_period
+from Classes.Checkpoint import Checkpoint, mk_signature
+
+# seconds after which the claim of a worker which stopped renewing it
+# expires, and between two looks for units claimed by other workers
+LEASE = 600
+POLL = 30
+
+# ------------------------------------------------------------------------------
+# FUNCTIONS
+# ------------------------------------------------------------------------------
+
+def mk_units(c):
+    '''Divides the period of the extraction into the work units.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    units : list of list of str
+        The start and end dates of the units, e.g.
+        [['20120101', '20120103'], ['20120104', '20120105']].
+    '''
+
+    return [list(period) for period in mk_periods(c)]
+
+def unit_name(unit):
+    '''Returns the name of a work unit in the queue directory.
+
+    Parameters
+    ----------
+    unit : list of str
+        The start and end date of the unit.
+
+    Return
+    ------
+    name : str
+        The name of the unit, e.g. '20120101-20120103'.
+    '''
+
+    return '-'.join(unit)
+
+def queue_status(path):
+    '''Collects the state of the work units of a queue directory.
+
+    Parameters
+    ----------
+    path : str
+        Path to the queue directory.
+
+    Return
+    ------
+    status : dict
+        The state "open", "claimed", "done" or "failed" of each unit.
+    '''
+    with open(os.path.join(path, 'units.json')) as f:
+        units = json.load(f)['units']
+
+    status = {}
+    for unit in units:
+        name = os.path.join(path, unit_name(unit))
+        for state in ['done', 'failed', 'claim']:
+            if os.path.exists(name + '.' + state):
+                status[unit_name(unit)] = state.replace('claim', 'claimed')
+                break
+        else:
+            status[unit_name(unit)] = 'open'
+
+    return status
+
+def run_queue(ppid, c, lease=LEASE, poll=POLL):
+    '''Retrieves and prepares work units of the queue until all units
+    are done.
+
+    Each unit is a run of its own, with the ppid of the worker and the
+    number of the unit, e.g. 1234_0, see Mods.bounded_disk.mk_runs. The
+    worker waits as long as units are claimed by other workers, since
+    their claims can expire.
+
+    Parameters
+    ----------
+    ppid : str
+        Contains the ppid number of the current ECMWF job. It will be None
+        if the method was called on the local side.
+
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    lease : int, optional
+        Seconds after which a claim expires if it is not renewed.
+        Default value is LEASE.
+
+    poll : int, optional
+        Seconds between two looks for units which became available.
+        Default value is POLL.
+
+    Return
+    ------
+    retrieved : list of str
+        Paths of the retrieved files of the units of this worker. They
+        are removed after the preparation unless in debugging mode.
+
+    outputfiles : list of str
+        Sorted list of the paths of the FLEXPART input files of the units
+        of this worker.
+    '''
+    check_ppid(c, ppid)
+
+    units = _init_queue(c)
+    runs = mk_runs(c)
+    print('Work-queue mode: {} units in {}'.format(len(units), c.work_queue))
+
+    retrieved = []
+    outputfiles = []
+    failed = []
+    while True:
+        status = queue_status(c.work_queue)
+        unit = None
+        for i, candidate in enumerate(units):
+            if status[unit_name(candidate)] in ['open', 'claimed'] and \
+               _claim(c.work_queue, unit_name(candidate), lease):
+                unit = candidate
+                break
+        if unit is None:
+            if all(state in ['done', 'failed'] for state in status.values()):
+                break
+            time.sleep(poll)
+            continue
+
+        name = unit_name(unit)
+        print('... worker {} on {} processes unit {}'.format(
+            os.getpid(), socket.gethostname(), name))
+
+        claim = os.path.join(c.work_queue, name + '.claim')
+        stop = threading.Event()
+        renewal = threading.Thread(target=_renew_claim,
+                                   args=(claim, lease / 4., stop))
+        renewal.daemon = True
+        renewal.start()
+        try:
+            files, outputs = run_period(runs[i])
+        except FlexExtractError as e:
+            # the other units are still processed
+            print('... ERROR in unit ' + name + ':\n' + str(e))
+            _finish(c.work_queue, name, 'failed', {'error': str(e)})
+            failed.append(name)
+            continue
+        finally:
+            stop.set()
+            renewal.join()
+
+        retrieved.extend(files)
+        outputfiles.extend(outputs)
+        _finish(c.work_queue, name, 'done',
+                {'outputfiles': sorted(os.path.basename(ofile)
+                                       for ofile in outputs)})
+
+    if failed:
+        raise ProcessingError('... WORK UNITS FAILED: ' + ', '.join(failed))
+    failed = [name for name, state in queue_status(c.work_queue).items()
+              if state == 'failed']
+    if failed:
+        raise ProcessingError('... WORK UNITS OF OTHER WORKERS FAILED: ' +
+                              ', '.join(sorted(failed)))
+
+    return retrieved, sorted(outputfiles)
+
+def _init_queue(c):
+    '''Creates the list of the work units in the queue directory, unless
+    another worker did it already, and checks that it belongs to the same
+    extraction.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of CONTROL file and
+        command line.
+
+    Return
+    ------
+    units : list of list of str
+        The start and end dates of the units.
+    '''
+    if not os.path.exists(c.work_queue):
+        make_dir(c.work_queue)
+
+    # the node specific settings may differ between the workers
+    queue = {'signature': mk_signature(c, Checkpoint.volatile +
+                                       ['ppid', 'inputdir', 'installdir',
+                                        'exedir', 'flexextractdir']),
+             'units': mk_units(c)}
+
+    # all workers write the same content, the first one wins
+    unitsfile = os.path.join(c.work_queue, 'units.json')
+    if not os.path.exists(unitsfile):
+        tmpfile = os.path.join(c.work_queue, '.units.json.' +
+                               socket.gethostname() + '.' + str(os.getpid()))
+        with open(tmpfile, 'w') as f:
+            json.dump(queue, f, indent=1)
+        os.rename(tmpfile, unitsfile)
+
+    with open(unitsfile) as f:
+        if json.load(f) != queue:
+            raise ControlFileError('... THE WORK QUEUE ' + c.work_queue +
+                                   ' BELONGS TO AN EXTRACTION WITH OTHER '
+                                   'SETTINGS!')
+
+    return queue['units']
+
+def _claim(path, name, lease):
+    '''Claims a work unit by creating its claim directory. An expired
+    claim is taken over.
+
+    Parameters
+    ----------
+    path : str
+        Path to the queue directory.
+
+    name : str
+        Name of the unit.
+
+    lease : int
+        Seconds after which a claim expires if it is not renewed.
+
+    Return
+    ------
+    claimed : bool
+        True if the worker holds the claim of the unit now.
+    '''
+    claim = os.path.join(path, name + '.claim')
+    try:
+        os.mkdir(claim)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    else:
+        # the unit may have been finished while the state was read
+        if any(os.path.exists(os.path.join(path, name + '.' + state))
+               for state in ['done', 'failed']):
+            shutil.rmtree(claim, ignore_errors=True)
+            return False
+        with open(os.path.join(claim, 'owner'), 'w') as f:
+            f.write('{} {}\n'.format(socket.gethostname(), os.getpid()))
+        return True
+
+    try:
+        age = time.time() - os.stat(claim).st_mtime
+    except OSError:
+        # released in the meantime
+        return False
+    if age < lease:
+        return False
+
+    # only one worker can rename the expired claim
+    expired = claim + '.expired.{}.{}'.format(socket.gethostname(),
+                                              os.getpid())
+    try:
+        os.rename(claim, expired)
+    except OSError:
+        return False
+    shutil.rmtree(expired, ignore_errors=True)
+    print('... the claim of unit {} expired'.format(name))
+
+    return _claim(path, name, lease)
+
+def _renew_claim(claim, interval, stop):
+    '''Renews a claim regularly until the unit is finished.
+
+    Parameters
+    ----------
+    claim : str
+        Path to the claim directory.
+
+    interval : float
+        Seconds between two renewals.
+
+    stop : threading.Event
+        Is set when the unit is finished.
+
+    Return
+    ------
+
+    '''
+    while not stop.wait(interval):
+        try:
+            os.utime(claim, None)
+        except OSError:
+            # the claim was taken over, the unit is finished nevertheless
+            pass
+
+    return
+
+def _finish(path, name, state, content):
+    '''Marks a work unit as done or failed and releases its claim.
+
+    Parameters
+    ----------
+    path : str
+        Path to the queue directory.
+
+    name : str
+        Name of the unit.
+
+    state : str
+        "done" or "failed".
+
+    content : dict
+        The output files of a unit which is done or the error message of
+        a failed unit.
+
+    Return
+    ------
+
+    '''
+    content.update({'host': socket.gethostname(), 'pid': os.getpid(),
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    marker = os.path.join(path, name + '.' + state)
+    with open('{}.{}.{}'.format(marker, socket.gethostname(), os.getpid()),
+              'w') as f:
+        json.dump(content, f, indent=1)
+    os.rename(f.name, marker)
+
+    shutil.rmtree(os.path.join(path, name + '.claim'), ignore_errors=True)
+
+    return
@@ -30,7 +30,6 @@ and pathes.
 # ------------------------------------------------------------------------------
 import os
 import sys
-import inspect
 import platform
 
 # ------------------------------------------------------------------------------
@@ -69,6 +68,9 @@ TEMPFILE_NAMELIST = 'calc_etadot_nml.template'
 FILE_NAMELIST = 'fort.4'
 FILE_GRIB_INDEX = 'date_time_stepRange.idx'
 FILE_GRIBTABLE = 'ecmwf_grib1_table_128'
+FILE_AUTOTUNE = 'etadot_autotune.json'
+FILE_MANIFEST = 'manifest.jsonl'
+FILE_AVAILABLE = 'AVAILABLE'
 
 # ------------------------------------------------------------------------------
 # DIRECTORY NAMES
@@ -83,13 +85,11 @@ INPUT_DIRNAME_DEFAULT = 'Workspace'
 
 # path to the local python source files
 # first thing to get because the submitted python script starts in here
-PATH_LOCAL_PYTHON = os.path.dirname(os.path.abspath(
-    inspect.getfile(inspect.currentframe())))
+PATH_LOCAL_PYTHON = os.path.dirname(os.path.abspath(__file__))
 # add path to pythonpath
 if PATH_LOCAL_PYTHON not in sys.path:
     sys.path.append(PATH_LOCAL_PYTHON)
-PATH_FLEXEXTRACT_DIR = os.path.normpath(os.path.dirname(os.path.abspath(
-    inspect.getfile(inspect.currentframe()))) + '/../../')
+PATH_FLEXEXTRACT_DIR = os.path.normpath(PATH_LOCAL_PYTHON + '/../../')
 PATH_RUN_DIR = os.path.join(PATH_FLEXEXTRACT_DIR, 'Run')
 PATH_SOURCES = os.path.join(PATH_FLEXEXTRACT_DIR, 'Source')
 PATH_TEMPLATES = os.path.join(PATH_FLEXEXTRACT_DIR, 'Templates')
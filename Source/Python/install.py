@@ -82,6 +82,7 @@ from Classes.ControlFile import ControlFile
 from Classes.UioFiles import UioFiles
 from Mods.tools import (make_dir, put_file_to_ecserver, submit_job_to_ecserver,
                         silent_remove, execute_subprocess, none_or_str)
+from Mods.errors import FlexExtractError
 
 # ------------------------------------------------------------------------------
 # FUNCTIONS
@@ -97,15 +98,19 @@ def main():
     ------
     '''
 
-    args = get_install_cmdline_args()
-    c = ControlFile(args.controlfile)
-    c.assign_args_to_control(args)
-    check_install_conditions(c)
-
-    if c.install_target.lower() != 'local': # ecgate or cca
-        install_via_gateway(c)
-    else: # local
-        install_local(c)
+    try:
+        args = get_install_cmdline_args()
+        c = ControlFile(args.controlfile)
+        c.assign_args_to_control(args)
+        check_install_conditions(c)
+
+        if c.install_target.lower() != 'local': # ecgate or cca
+            install_via_gateway(c)
+        else: # local
+            install_local(c)
+    except FlexExtractError as e:
+        # the errors are only turned into an exit status here
+        sys.exit(e.code)
 
     return
 
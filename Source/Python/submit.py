@@ -72,8 +72,8 @@ from datetime import datetime, timedelta
 import _config
 from Mods.tools import (setup_controldata, normal_exit,
                         submit_job_to_ecserver)
-from Mods.get_mars_data import get_mars_data
-from Mods.prepare_flexpart import prepare_flexpart
+from Mods.errors import FlexExtractError, SubmissionError
+from Mods import profiling
 
 # ------------------------------------------------------------------------------
 # METHODS
@@ -94,28 +94,68 @@ def main():
 
     '''
 
-    c, ppid, queue, job_template = setup_controldata()
-
-    # on local side
-    # starting from an ECMWF server this would also be the local side
-    called_from_dir = os.getcwd()
-    if queue is None:
-        if c.inputdir[0] != '/':
-            c.inputdir = os.path.join(called_from_dir, c.inputdir)
-        if c.outputdir[0] != '/':
-            c.outputdir = os.path.join(called_from_dir, c.outputdir)
-        get_mars_data(c)
-        if c.request == 0 or c.request == 2:
-            prepare_flexpart(ppid, c)
-            exit_message = 'FLEX_EXTRACT IS DONE!'
+    try:
+        c, ppid, queue, job_template = setup_controldata()
+
+        # the spans of the stages are recorded if PROFILING is switched on
+        profiling.start(c)
+
+        # on local side
+        # starting from an ECMWF server this would also be the local side
+        called_from_dir = os.getcwd()
+        if c.request == 3:
+            # the run is only planned, also before a submission
+            from Mods.plan import run_plan
+            run_plan(ppid, c)
+            exit_message = 'PLANNING THE RUN DONE!'
+        elif queue is None:
+            # retrieval and processing modules are only needed on the local
+            # side
+            from Mods.get_mars_data import get_mars_data
+            from Mods.prepare_flexpart import prepare_flexpart
+            from Mods.job_chunks import use_chunks, run_chunks
+
+            if c.inputdir[0] != '/':
+                c.inputdir = os.path.join(called_from_dir, c.inputdir)
+            if c.outputdir[0] != '/':
+                c.outputdir = os.path.join(called_from_dir, c.outputdir)
+            try:
+                if c.bounded_disk and c.request != 1:
+                    # retrieval and preparation alternate period by period
+                    from Mods.bounded_disk import run_bounded
+                    run_bounded(ppid, c)
+                elif c.streaming and c.request != 1:
+                    # the time steps are prepared as soon as they are available
+                    from Mods.streaming import run_streaming
+                    run_streaming(ppid, c)
+                elif c.work_queue and c.request != 1:
+                    # the workers share the periods via the queue directory
+                    from Mods.work_queue import run_queue
+                    run_queue(ppid, c)
+                elif use_chunks(c):
+                    # the job chunks are processed in parallel processes
+                    run_chunks(ppid, c)
+                else:
+                    get_mars_data(c)
+                if c.request == 0 or c.request == 2:
+                    if not (c.bounded_disk or c.streaming or c.work_queue or
+                            use_chunks(c)):
+                        prepare_flexpart(ppid, c)
+                    exit_message = 'FLEX_EXTRACT IS DONE!'
+                else:
+                    exit_message = 'PRINTING MARS_REQUESTS DONE!'
+            finally:
+                # the summary is written for failed runs as well
+                profiling.finish()
+        # send files to ECMWF server
         else:
-            exit_message = 'PRINTING MARS_REQUESTS DONE!'
-    # send files to ECMWF server
-    else:
-        submit(job_template, c, queue)
-        exit_message = 'FLEX_EXTRACT JOB SCRIPT IS SUBMITED!'
+            submit(job_template, c, queue)
+            exit_message = 'FLEX_EXTRACT JOB SCRIPT IS SUBMITED!'
 
-    normal_exit(exit_message)
+        normal_exit(exit_message)
+    except FlexExtractError as e:
+        # the errors are only turned into an exit status here
+        sys.exit(e.code)
 
     return
 
@@ -244,12 +284,14 @@ def mk_jobscript(jtemplate, job_file, clist):
     except UndefinedError as e:
         print('... ERROR ' + str(e))
 
-        sys.exit('\n... error occured while trying to generate jobscript')
+        raise SubmissionError('\n... error occured while trying to '
+                              'generate jobscript')
     except OSError as e:
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-        sys.exit('\n... error occured while trying to generate jobscript')
+        raise SubmissionError('\n... error occured while trying to '
+                              'generate jobscript')
 
     # create jobscript file
     try:
@@ -259,7 +301,8 @@ def mk_jobscript(jtemplate, job_file, clist):
         print('... ERROR CODE: ' + str(e.errno))
         print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
 
-        sys.exit('\n... error occured while trying to write ' + job_file)
+        raise SubmissionError('\n... error occured while trying to write ' +
+                              job_file)
 
     return
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+from mock import patch
+
+import _config
+from . import _config_test
+from Classes.ControlFile import ControlFile
+from Mods.errors import (FlexExtractError, ControlFileError, ProcessingError)
+from Mods.tools import my_error, execute_subprocess
+from Mods.api import make_control, extract
+import Mods.prepare_flexpart as prepare_flexpart
+
+
+class TestApi(object):
+    """Test the programming interface."""
+
+    def setup_method(self):
+        self.testdir = _config_test.PATH_TEST_DIR
+        self.settings = {'class': 'EI', 'dataset': 'interim',
+                         'type': ['AN', 'FC'], 'time': ['00', '12'],
+                         'step': ['00', '00'], 'dtime': 3,
+                         'start_date': '20120101', 'grid': '1.0',
+                         'area': '60/-10/40/30', 'level': '60',
+                         'public': True, 'request': 1}
+
+    def test_from_dict_controlfile(self):
+        c = ControlFile.from_dict({'CLASS': 'EI', 'm_grid': 1.0,
+                                   'type': ('AN', 'FC'), 'debug': True,
+                                   'expver': None})
+        assert c.controlfile is None
+        assert c.marsclass == 'EI'
+        assert c.grid == '1.0'
+        assert c.type == ['AN', 'FC']
+        assert c.debug == '1'
+        assert c.expver is None
+
+    def test_fail_read_controlfile(self):
+        with pytest.raises(ControlFileError):
+            ControlFile('any_file_which_does_not_exist')
+
+    def test_fail_make_control(self):
+        self.settings['start_date'] = '20120105'
+        self.settings['end_date'] = '20120101'
+        with pytest.raises(ControlFileError):
+            make_control(self.settings)
+
+    def test_error_types(self):
+        with pytest.raises(ControlFileError) as e:
+            my_error('Failed!', ControlFileError)
+        assert str(e.value) == 'Failed!'
+        assert e.value.code == 1
+        with pytest.raises(ProcessingError) as e:
+            execute_subprocess(['false'], error_msg='FALSE FAILED!')
+        assert isinstance(e.value, FlexExtractError)
+        assert not isinstance(e.value, SystemExit)
+        assert e.value.code == '... FALSE FAILED!'
+
+    @patch('Mods.prepare_flexpart.setup_controldata',
+           side_effect=ControlFileError('Invalid!'))
+    def test_script_exit(self, mock_setup):
+        with pytest.raises(SystemExit) as e:
+            prepare_flexpart.main()
+        assert e.value.code == 'Invalid!'
+
+    def test_request_extract(self, tmpdir):
+        self.settings['inputdir'] = str(tmpdir)
+        result = extract(self.settings)
+        assert result.marsrequests == os.path.join(str(tmpdir),
+                                                   _config.FILE_MARS_REQUESTS)
+        assert os.path.isfile(result.marsrequests)
+        assert result.retrieved == []
+        assert result.outputfiles == []
+        assert result.control.outputdir == str(tmpdir)
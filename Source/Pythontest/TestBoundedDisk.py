@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from mock import patch
+
+from . import _config_test
+from Classes.ControlFile import ControlFile
+from Mods.errors import RetrievalError
+from Mods.checks import check_bounded_disk
+from Mods.bounded_disk import (mk_periods, mk_runs, disk_usage, run_bounded,
+                               _must_wait)
+
+
+class TestBoundedDisk(object):
+    """Test the bounded-disk mode."""
+
+    def setup_method(self):
+        self.c = ControlFile(_config_test.PATH_TEST_DIR +
+                             '/Controls/CONTROL.test')
+        self.c.start_date = '20120101'
+        self.c.end_date = '20120105'
+        self.c.date_chunk = 3
+        self.c.job_chunk = None
+        self.c.prefix = 'EN'
+        self.c.disk_budget = None
+
+    def test_mk_periods(self):
+        assert mk_periods(self.c) == [('20120101', '20120103'),
+                                      ('20120104', '20120105')]
+        self.c.job_chunk = 2
+        assert mk_periods(self.c) == [('20120101', '20120102'),
+                                      ('20120103', '20120104'),
+                                      ('20120105', '20120105')]
+
+    def test_mk_runs(self):
+        self.c.ppid = '1'
+        runs = mk_runs(self.c)
+        assert [(cp.start_date, cp.end_date, cp.ppid) for cp in runs] == \
+            [('20120101', '20120103', '1_0'), ('20120104', '20120105', '1_1')]
+        assert self.c.start_date == '20120101' and self.c.ppid == '1'
+
+    def test_disk_usage(self, tmpdir):
+        tmpdir.join('ANOG__ML.20120101.1.2.grb').write('x' * 10)
+        tmpdir.join('EN12010100').write('x' * 100)
+        tmpdir.mkdir('run.1').join('fort.10').write('x' * 5)
+        assert disk_usage(str(tmpdir), 'EN') == 15
+
+    def test_must_wait(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        tmpdir.join('ANOG__ML.20120101.1.2.grb').write('x' * 1024**2)
+        assert not _must_wait(self.c, 0)
+        assert not _must_wait(self.c, 1)
+        assert _must_wait(self.c, 2)
+        self.c.disk_budget = 2
+        assert not _must_wait(self.c, 2)
+        self.c.disk_budget = 1
+        tmpdir.join('OG_acc_SL.20120101.1.2.grb').write('x')
+        assert _must_wait(self.c, 1)
+        assert not _must_wait(self.c, 0)
+
+    def test_run_bounded(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+
+        def retrieve(c):
+            return [c.start_date + '.' + c.ppid]
+
+        def prepare(ppid, c):
+            return [c.end_date + '.' + ppid]
+
+        with patch('Mods.bounded_disk.get_mars_data', retrieve), \
+             patch('Mods.bounded_disk.prepare_flexpart', prepare):
+            retrieved, outputfiles = run_bounded('1', self.c, poll=1)
+
+        assert retrieved == ['20120101.1_0', '20120104.1_1']
+        assert outputfiles == ['20120103.1_0', '20120105.1_1']
+
+    def test_fail_run_bounded(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+
+        def retrieve(c):
+            raise RetrievalError('MARS request failed')
+
+        with patch('Mods.bounded_disk.get_mars_data', retrieve):
+            with pytest.raises(RetrievalError) as e:
+                run_bounded('7', self.c, poll=1)
+        assert str(e.value) == 'MARS request failed'
+
+    def test_check_bounded_disk(self):
+        assert check_bounded_disk(0, 1, 'state') == 0
+        assert check_bounded_disk(1, 0, None) == 1
+        # the new disaggregation needs the whole period
+        with pytest.raises(ValueError):
+            check_bounded_disk(1, 1, None)
+        with pytest.raises(ValueError):
+            check_bounded_disk(1, 0, 'state')
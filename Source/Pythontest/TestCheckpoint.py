@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+from mock import patch
+
+from Classes.Checkpoint import Checkpoint, file_stats, mk_hash
+from Classes.EcFlexpart import EcFlexpart
+from Mods.api import make_control
+from Mods.errors import ProcessingError
+from Mods.get_mars_data import get_mars_data
+from Mods.prepare_flexpart import prepare_flexpart
+
+
+class C(object):
+    pass
+
+
+def write_fluxes(filename, dates):
+    from eccodes import (codes_grib_new_from_samples, codes_set,
+                         codes_get_size, codes_set_values, codes_write,
+                         codes_release)
+
+    with open(filename, 'wb') as f:
+        for date in dates:
+            for hour in [0, 12]:
+                for step in [3, 6, 9, 12]:
+                    for param in [142, 143, 146, 176, 180, 181]:
+                        gid = codes_grib_new_from_samples('GRIB1')
+                        codes_set(gid, 'localDefinitionNumber', 1)
+                        codes_set(gid, 'marsType', 'fc')
+                        codes_set(gid, 'date', date)
+                        codes_set(gid, 'time', hour * 100)
+                        codes_set(gid, 'step', step)
+                        codes_set(gid, 'paramId', param)
+                        codes_set_values(gid, [float(step)] *
+                                         codes_get_size(gid, 'values'))
+                        codes_write(gid, f)
+                        codes_release(gid)
+
+
+class TestCheckpoint(object):
+    """Test the checkpoint of the preparation."""
+
+    def setup_method(self):
+        self.c = C()
+        self.c.ppid = '7'
+        self.c.start_date = '20120101'
+        self.c.member_workers = 1
+
+    def test_resume(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        ofile = tmpdir.join('EN12010100')
+        ofile.write('fields')
+        checkpoint = Checkpoint(self.c)
+        assert not checkpoint.resumed
+        checkpoint.complete('create.EN12010100', [str(ofile)], 'a')
+
+        # workers change nothing, the start date everything
+        self.c.member_workers = 4
+        checkpoint = Checkpoint(self.c)
+        assert checkpoint.resumed
+        assert checkpoint.done('create.EN12010100', 'a')
+        assert not checkpoint.done('create.EN12010100', 'b')
+        assert not checkpoint.done('create.EN12010106')
+
+        self.c.start_date = '20120102'
+        assert not Checkpoint(self.c).resumed
+        assert not Checkpoint(self.c).resumed
+
+    def test_outputs(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        ofile = tmpdir.join('EN12010100')
+        ofile.write('fields')
+        checkpoint = Checkpoint(self.c)
+        checkpoint.complete('create.EN12010100', [str(ofile)])
+
+        ofile.write('other')
+        assert not checkpoint.done('create.EN12010100')
+
+        # the outputs were consumed by the post-processing
+        pfile = tmpdir.mkdir('output').join('EN12010100')
+        ofile.move(pfile)
+        checkpoint.complete('postprocessing.EN12010100', [str(pfile)])
+        assert checkpoint.done('create.EN12010100',
+                               then=['postprocessing.EN12010100'])
+
+        checkpoint.remove()
+        assert not os.path.exists(checkpoint.path)
+        assert not Checkpoint(self.c).resumed
+
+    def test_incomplete_line(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        checkpoint = Checkpoint(self.c)
+        checkpoint.complete('deaccumulation.N001', [])
+        with open(checkpoint.path, 'a') as f:
+            f.write('{"unit": "deaccumu')
+
+        checkpoint = Checkpoint(self.c)
+        assert list(checkpoint.units) == ['deaccumulation.N001']
+        assert checkpoint.done('deaccumulation.N001')
+
+        # the units after the incomplete line are kept
+        checkpoint.complete('deaccumulation.N002', [])
+        checkpoint.complete('deaccumulation.N003', [])
+        assert sorted(Checkpoint(self.c).units) == \
+            ['deaccumulation.N001', 'deaccumulation.N002',
+             'deaccumulation.N003']
+
+    def test_mk_hash(self, tmpdir):
+        ofile = tmpdir.join('flux2012010100')
+        ofile.write('fields')
+        stats = file_stats([str(ofile), str(tmpdir.join('missing'))])
+        assert stats[0][0] == 6 and stats[1] is None
+        assert mk_hash(stats, 'a') == mk_hash(stats, 'a')
+        assert mk_hash(stats, 'a') != mk_hash(stats, 'b')
+
+    def test_rerun(self, tmpdir, capsys):
+        pytest.importorskip('eccodes')
+        c = make_control({'class': 'EI', 'dataset': 'interim',
+                          'stream': 'OPER', 'type': ['AN', 'FC'],
+                          'time': ['00', '12'], 'step': ['00', '00'],
+                          'dtime': 3,
+                          'start_date': '20120101', 'grid': '1.0',
+                          'area': '60/-10/40/30', 'level': '60',
+                          'public': True, 'request': 0, 'checkpoint': 1,
+                          'inputdir': str(tmpdir),
+                          'outputdir': str(tmpdir.join('output'))})
+        c.ppid = '7'
+        retrievals = []
+
+        def retrieve(c, server, start, end, datechunk, fluxes=False):
+            retrievals.append(fluxes)
+            if fluxes:
+                write_fluxes(os.path.join(c.inputdir, 'OG_acc_SL.20111231.' +
+                                          c.ppid + '.2.grb'),
+                             [20111231, 20120101, 20120102])
+
+        # the first attempt stops in the conversion
+        with patch('Mods.get_mars_data.do_retrievement', retrieve), \
+             patch.object(EcFlexpart, 'create',
+                          side_effect=ProcessingError('Failed!')):
+            get_mars_data(c)
+            with pytest.raises(ProcessingError):
+                prepare_flexpart(c.ppid, c)
+        assert retrievals == [True, False]
+        capsys.readouterr()
+
+        # the rerun keeps the retrieved files and the deaccumulated fluxes
+        with patch('Mods.get_mars_data.do_retrievement', retrieve), \
+             patch.object(EcFlexpart, 'create'), \
+             patch.object(EcFlexpart, 'process_output', return_value=[]):
+            get_mars_data(c)
+            prepare_flexpart(c.ppid, c)
+        out = capsys.readouterr()[0]
+        assert retrievals == [True, False]
+        assert '... retrieval was completed before' in out
+        assert '... deaccumulation was completed before' in out
+        assert not os.path.isfile(os.path.join(str(tmpdir),
+                                               'checkpoint.7.jsonl'))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from Classes.DeaccState import DeaccState, save_window, mk_signature
+from Mods.checks import check_statedir
+
+
+class C(object):
+    pass
+
+
+class TestDeaccState(object):
+    """Test the state of the incremental deaccumulation."""
+
+    def setup_method(self):
+        self.c = C()
+        self.c.start_date = '20120101'
+        self.c.end_date = '20120101'
+        self.c.time = ['00', '12']
+        self.c.step = ['00', '00']
+        self.c.marsclass = 'EI'
+        self.c.dtime = '3'
+
+    def test_empty_state(self, tmpdir):
+        state = DeaccState(str(tmpdir.join('missing')))
+        assert state.lastdate is None
+        assert not state.usable(self.c)
+        orig_vals, deac_vals = state.load_window('', [142])
+        assert orig_vals == {142: []} and deac_vals == {142: []}
+
+    def test_save_state(self, tmpdir):
+        self.c.inputdir = str(tmpdir.mkdir('run'))
+        windows = [np.arange(3.) + i for i in range(5)]
+        save_window(self.c.inputdir, '.N001', {142: windows[:2]},
+                    {142: windows})
+        for name, content in [('flux2012010112.N001', 'used'),
+                              ('flux2012010200.N001', 'next'),
+                              ('flux2012010203.N001', '')]:
+            tmpdir.join('run', name).write(content)
+
+        state = DeaccState(str(tmpdir.join('state')))
+        state.save(self.c)
+        assert sorted(tmpdir.join('state').listdir()) == \
+            [tmpdir.join('state', name) for name in
+             ['deacc_state.N001.npz', 'deacc_state.json',
+              'flux2012010200.N001']]
+
+        state = DeaccState(str(tmpdir.join('state')))
+        assert state.lastdate == '20120102'
+        assert state.signature == mk_signature(self.c)
+        assert not state.usable(self.c)
+        self.c.start_date = '20120102'
+        assert state.usable(self.c)
+        self.c.dtime = '1'
+        assert not state.usable(self.c)
+
+        orig_vals, deac_vals = state.load_window('.N001', [142])
+        assert len(orig_vals[142]) == 1
+        assert (orig_vals[142][0] == windows[1]).all()
+        assert len(deac_vals[142]) == 3
+        assert all((a == b).all() for a, b in zip(deac_vals[142],
+                                                  windows[2:]))
+
+    def test_check_statedir(self):
+        assert check_statedir(None, 1, 1, 0) is None
+        with pytest.raises(ValueError):
+            check_statedir('state', 1, 0, None)
+        with pytest.raises(ValueError):
+            check_statedir('state', 0, 0, 12)
+        assert check_statedir('/tmp/state', 0, 0, None) == '/tmp/state'
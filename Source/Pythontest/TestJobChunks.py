@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from mock import patch
+
+from . import _config_test
+from ._stubs import retrieve, prepare
+from Classes.ControlFile import ControlFile
+from Mods.errors import ProcessingError
+from Mods.job_chunks import use_chunks, mk_chunks, run_chunks
+
+
+class TestJobChunks(object):
+    """Test the local parallel processing of the job chunks."""
+
+    def setup_method(self):
+        self.c = ControlFile(_config_test.PATH_TEST_DIR +
+                             '/Controls/CONTROL.test')
+        self.c.start_date = '20120101'
+        self.c.end_date = '20120105'
+        self.c.job_chunk = 2
+        self.c.job_workers = 2
+        self.c.outputdir = '/data/output'
+        self.c.ppid = '1'
+        self.c.rrint = 0
+
+    def run(self):
+        with patch('Mods.bounded_disk.get_mars_data', retrieve), \
+             patch('Mods.bounded_disk.prepare_flexpart', prepare):
+            return run_chunks('1', self.c, poll=1)
+
+    def test_use_chunks(self):
+        assert use_chunks(self.c)
+        # the new disaggregation needs the whole period
+        self.c.rrint = 1
+        assert not use_chunks(self.c)
+        self.c.rrint = 0
+        self.c.job_chunk = 5
+        assert not use_chunks(self.c)
+        self.c.job_chunk = None
+        assert not use_chunks(self.c)
+
+    def test_mk_chunks(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        chunks = mk_chunks(self.c)
+        assert [(cc.start_date, cc.end_date, cc.ppid) for cc in chunks] == \
+            [('20120101', '20120102', '1_0'), ('20120103', '20120104', '1_1'),
+             ('20120105', '20120105', '1_2')]
+        assert chunks[1].inputdir == str(tmpdir.join('chunk.1_1'))
+        assert self.c.start_date == '20120101'
+
+    def test_run_chunks(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        retrieved, outputfiles = self.run()
+        assert sorted(retrieved) == \
+            [str(tmpdir.join('chunk.1_{}'.format(i),
+                             'ANOG__ML.{}.1_{}'.format(date, i)))
+             for i, date in enumerate(['20120101', '20120103', '20120105'])]
+        assert outputfiles == ['/data/output/EN20120102.1_0',
+                               '/data/output/EN20120104.1_1',
+                               '/data/output/EN20120105.1_2']
+        # the input directories of the chunks are removed
+        assert tmpdir.listdir() == []
+
+    def test_fail_run_chunks(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        self.c.grid = 'fail'
+        with pytest.raises(ProcessingError) as e:
+            self.run()
+        assert str(e.value).startswith('... ERROR in job chunk '
+                                       '20120103 - 20120104:')
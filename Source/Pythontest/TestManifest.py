@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import hashlib
+
+from Classes.Manifest import Manifest, available_name, describe_file
+from Classes.EcFlexpart import _postprocess_file
+
+
+def entry(name, valid_time, member=None, sha1='a'):
+    return {'name': name, 'valid_time': valid_time, 'member': member,
+            'size': 10, 'sha1': sha1, 'messages': 2}
+
+
+def write_grib(path, n):
+    from eccodes import (codes_grib_new_from_samples, codes_write,
+                         codes_release)
+    with open(path, 'wb') as f:
+        for i in range(n):
+            gid = codes_grib_new_from_samples('regular_ll_sfc_grib1')
+            codes_write(gid, f)
+            codes_release(gid)
+
+
+class TestManifest(object):
+    """Test the output manifest and the AVAILABLE files."""
+
+    def test_available(self, tmpdir):
+        manifest = Manifest(str(tmpdir))
+        manifest.add([entry('EN12010106', '2012010106')])
+        manifest.add([entry('EN12010100', '2012010100'),
+                      entry('EN12010100.N001', '2012010100', 1)])
+
+        assert tmpdir.join('AVAILABLE').read().splitlines()[3:] == \
+            ['20120101 000000      EN12010100            ON DISK',
+             '20120101 060000      EN12010106            ON DISK']
+        assert tmpdir.join('AVAILABLE.N001').read().splitlines()[3:] == \
+            ['20120101 000000      EN12010100.N001       ON DISK']
+        assert tmpdir.join('AVAILABLE').read().splitlines()[:3] == \
+            Manifest.header
+        assert [json.loads(line)['name'] for line in
+                tmpdir.join('manifest.jsonl').readlines()] == \
+            ['EN12010106', 'EN12010100', 'EN12010100.N001']
+        assert available_name(1) == 'AVAILABLE.N001'
+
+    def test_other_runs(self, tmpdir):
+        # e.g. two job chunks in the same output directory
+        first = Manifest(str(tmpdir))
+        second = Manifest(str(tmpdir))
+        first.add([entry('EN12010100', '2012010100')])
+        second.add([entry('EN12010200', '2012010200')])
+        # a file which is created again replaces its entry
+        first.add([entry('EN12010100', '2012010100', sha1='b')])
+
+        assert len(tmpdir.join('AVAILABLE').read().splitlines()) == 5
+        assert first.entries['EN12010100']['sha1'] == 'b'
+        assert sorted(Manifest(str(tmpdir)).read()) == \
+            ['EN12010100', 'EN12010200']
+
+    def test_grib2_conversion(self, tmpdir):
+        ofile = str(tmpdir.join('EN12010100'))
+        write_grib(ofile, 3)
+        assert describe_file(ofile) == \
+            (3, hashlib.sha1(open(ofile, 'rb').read()).hexdigest())
+
+        outputdir = tmpdir.mkdir('output')
+        path, info, error = _postprocess_file((ofile, True, str(outputdir)))
+        assert error is None
+        assert path == str(outputdir.join('EN12010100'))
+        assert info == describe_file(path)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+import pytest
+
+from Mods.api import make_control, extract
+from Mods.checks import check_request
+from Mods.plan import (mk_plan, mk_jobs, read_costs, estimate_request,
+                       DEFAULT_COSTS)
+
+
+class TestPlan(object):
+    """Test the planning mode."""
+
+    def setup_method(self):
+        self.settings = {'class': 'EI', 'dataset': 'interim',
+                         'type': ['AN', 'FC'], 'time': ['00', '12'],
+                         'step': ['00', '00'], 'dtime': 12,
+                         'start_date': '20120101', 'end_date': '20120104',
+                         'grid': '1.0', 'area': '60/-10/40/30',
+                         'level': '60', 'levelist': '1/to/60', 'prefix': 'EI',
+                         'public': True, 'request': 3, 'ppid': '7'}
+
+    def test_mk_jobs(self, tmpdir):
+        self.settings['inputdir'] = str(tmpdir)
+        c = make_control(self.settings)
+        assert mk_jobs(c) == [('20120101', '20120104')]
+        c.job_chunk = 3
+        assert mk_jobs(c) == [('20120101', '20120103'),
+                              ('20120104', '20120104')]
+
+    def test_estimate_request(self):
+        request = {'date': '20120101/to/20120102', 'time': '00/12',
+                   'step': '00', 'param': '130.128/133.128',
+                   'levelist': '1/to/60', 'grid': '1.0/1.0',
+                   'area': '60/-10/40/30', 'number': 'OFF'}
+        assert estimate_request(request, 16) == \
+            (480, 480 * (41 * 21 * 2 + 200))
+
+        request.update({'grid': 'OFF', 'resol': '159', 'levelist': '1'})
+        assert estimate_request(request, 16)[1] == \
+            8 * (160 * 161 * 2 + 200)
+
+        request.update({'grid': '80', 'gaussian': 'reduced',
+                        'number': '1/to/3'})
+        assert estimate_request(request, 8) == \
+            (24, 24 * (int(8 * 80 ** 2 * 0.65) + 200))
+
+    def test_plan(self, tmpdir):
+        self.settings['inputdir'] = str(tmpdir)
+        self.settings['job_chunk'] = 2
+        result = extract(self.settings)
+        assert result.retrieved == []
+        assert result.outputfiles == []
+
+        with open(str(tmpdir.join('plan.7.json'))) as f:
+            plan = json.load(f)
+        assert plan['costs']['source'] == 'default'
+        assert [(job['start_date'], job['end_date'])
+                for job in plan['jobs']] == [('20120101', '20120102'),
+                                             ('20120103', '20120104')]
+
+        job = plan['jobs'][0]
+        assert job['outputfiles'] == ['EI12010100', 'EI12010112',
+                                      'EI12010200', 'EI12010212']
+        assert [step['valid'] for step in job['timesteps']] == \
+            ['2012010100', '2012010112', '2012010200', '2012010212']
+        assert sum(f['bytes'] for f in job['rawfiles']) == \
+            job['estimate']['raw_bytes']
+        assert job['estimate']['fields'] == \
+            sum(r['fields'] for r in job['requests'])
+        assert plan['totals']['outputfiles'] == 8
+        assert plan['totals']['raw_bytes'] == \
+            sum(job['estimate']['raw_bytes'] for job in plan['jobs'])
+        assert os.listdir(str(tmpdir)) == ['plan.7.json']
+
+    def test_bounded_disk_peak(self, tmpdir):
+        self.settings['inputdir'] = str(tmpdir)
+        c = make_control(self.settings)
+        peak = mk_plan(c)['totals']['disk_peak']
+        c.bounded_disk = 1
+        c.date_chunk = 1
+        assert mk_plan(c)['totals']['disk_peak'] < peak
+
+    def test_read_costs(self, tmpdir):
+        assert read_costs(str(tmpdir)) == (DEFAULT_COSTS, 'default')
+
+        totals = {'request': {'wall': 8., 'bytes_written': 4 * 1024**2},
+                  'conversion': {'cpu': 1., 'cpu_children': 2.},
+                  'routing': {'bytes_read': 2 * 1024**2}}
+        tmpdir.join('profile.7.json').write(json.dumps({'totals': totals}))
+        costs, source = read_costs(str(tmpdir))
+        assert source == str(tmpdir.join('profile.7.json'))
+        assert costs['retrieval'] == 2.
+        assert costs['conversion'] == 1.5
+        assert costs['deaccumulation'] == DEFAULT_COSTS['deaccumulation']
+
+    def test_check_request(self, tmpdir):
+        check_request(3, str(tmpdir.join('mars_requests.csv')))
+        with pytest.raises(ValueError):
+            check_request(4, str(tmpdir.join('mars_requests.csv')))
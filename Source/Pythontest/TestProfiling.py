@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from Mods import profiling
+from Mods.checks import check_profiling
+
+
+class C(object):
+    pass
+
+
+class TestProfiling(object):
+    """Test the spans and the summary of the profiling."""
+
+    def setup_method(self):
+        self.c = C()
+        self.c.ppid = '9'
+        self.c.profiling = 1
+
+    def teardown_method(self):
+        profiling._active = None
+
+    def test_no_profiling(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        self.c.profiling = 0
+        profiling.start(self.c)
+        with profiling.span('retrieval') as node:
+            profiling.count(messages=1)
+        assert node is None
+        assert profiling.finish() is None
+        assert tmpdir.listdir() == []
+
+    def test_summary(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        profiling.start(self.c)
+        with profiling.span('preparation'):
+            for step in ['00', '03']:
+                with profiling.span('routing', step=step):
+                    profiling.count(messages=2, bytes_read=10,
+                                    bytes_written=5)
+        summary = profiling.finish()
+        assert summary == str(tmpdir.join('profile.9.json'))
+
+        with open(summary) as f:
+            result = json.load(f)
+        preparation = result['spans']['children'][0]
+        assert preparation['name'] == 'preparation'
+        assert [node['info']['step'] for node in preparation['children']] \
+            == ['00', '03']
+        assert result['totals']['routing']['count'] == 2
+        assert result['totals']['routing']['messages'] == 4
+        assert result['totals']['routing']['bytes_read'] == 20
+        assert result['totals']['routing']['bytes_written'] == 10
+        assert result['totals']['flex_extract']['wall'] >= \
+            result['totals']['preparation']['wall']
+
+    def test_cprofile(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        self.c.profiling = 2
+        profiling.start(self.c)
+        with profiling.span('conversion', stage=True):
+            # stages within stages are not profiled separately
+            with profiling.span('inner', stage=True):
+                sum(range(100))
+        profiling.finish()
+        assert sorted(os.path.basename(str(f)) for f in tmpdir.listdir()) \
+            == ['profile.9.1.conversion.prof', 'profile.9.json']
+
+    def test_memory(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        self.c.profiling = 0
+        self.c.memory_profiling = 1
+        profiling.start(self.c)
+        with profiling.span('deaccumulation', stage=True):
+            values = [bytearray(1024 * 1024) for _ in range(20)]
+            profiling.memory_checkpoint('deacc_fluxes')
+            del values
+        with profiling.span('conversion', stage=True):
+            with profiling.span('calc_etadot'):
+                proc = subprocess.Popen([sys.executable, '-c',
+                                         'import sys; sys.exit(3)'])
+                assert profiling.wait_process(proc) == 3
+        summary = profiling.finish()
+
+        with open(summary) as f:
+            result = json.load(f)
+        memory = result['totals']['deaccumulation']['memory']
+        assert memory['checkpoint'] == 'deacc_fluxes'
+        assert memory['traced'] >= 20
+        assert memory['traced_peak'] >= 20
+        assert memory['rss_peak'] > 0
+        assert 'TestProfiling.py' in memory['top'][0]['site']
+        assert result['totals']['calc_etadot']['memory']['rss_child'] > 0
+        assert result['totals']['conversion']['memory']['rss_child'] > 0
+        assert result['spans']['memory']['rss_peak'] >= memory['rss_peak']
+
+    def test_rss_peak(self):
+        values = bytearray(64 * 1024 * 1024)
+        values[::4096] = b'x' * len(values[::4096])
+        peak = profiling.rss_peak()
+        del values
+        assert peak >= 64
+        if profiling.reset_rss_peak():
+            assert profiling.rss_peak() < peak - 32
+
+    def test_wait_process(self):
+        # without memory profiling the process is simply waited for
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        assert profiling.wait_process(proc) == 0
+
+    def test_file_sizes(self, tmpdir):
+        tmpdir.join('a').write('x' * 10)
+        assert profiling.file_sizes([str(tmpdir.join('a')),
+                                     str(tmpdir.join('missing'))]) == 10
+
+    def test_check_profiling(self):
+        assert check_profiling('2') == 2
+        with pytest.raises(ValueError):
+            check_profiling(3)
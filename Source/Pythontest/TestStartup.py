@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# guards the start-up time of submit.py for the paths which do not
+# need the heavy dependencies (numpy, eccodes, ecmwfapi, cdsapi)
+
+import os
+import sys
+import time
+import subprocess
+
+import _config
+from . import _config_test
+
+# generous upper limit in seconds, it catches heavy imports at module load
+# but not the normal variance of a loaded machine
+MAX_STARTUP_TIME = 5.0
+
+HEAVY_MODULES = ['numpy', 'eccodes', 'gribapi', 'ecmwfapi', 'cdsapi']
+
+# runs submit.main with the given arguments and prints the heavy
+# modules which were loaded until exit
+RUN_SUBMIT = '''
+import sys
+sys.path.insert(0, %r)
+sys.argv = ['submit.py'] + sys.argv[1:]
+import submit
+try:
+    submit.main()
+except SystemExit:
+    pass
+sys.stderr.write('LOADED: ' + ','.join(
+    m for m in %r if m in sys.modules) + '\\n')
+'''
+
+
+class TestStartup(object):
+    """Test the start-up time of the submit script."""
+
+    def setup_method(self):
+        self.testdir = _config_test.PATH_TEST_DIR
+        self.controldir = _config.PATH_CONTROLFILES
+
+    def run_submit(self, args, heavy_modules, tmpdir=None):
+        cmd = [sys.executable, '-c', RUN_SUBMIT % (_config.PATH_LOCAL_PYTHON,
+                                               heavy_modules)] + args
+        start = time.time()
+        proc = subprocess.Popen(cmd, cwd=self.controldir,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        out, err = proc.communicate()
+        elapsed = time.time() - start
+        loaded = [line for line in err.splitlines()
+                  if line.startswith('LOADED: ')]
+        return out, loaded[-1][len('LOADED: '):].split(','), elapsed
+
+    def test_help_startup(self):
+        out, loaded, elapsed = self.run_submit(
+            ['--help'], HEAVY_MODULES + ['Classes.EcFlexpart'])
+        assert 'usage' in out
+        assert loaded == ['']
+        assert elapsed < MAX_STARTUP_TIME
+
+    def test_request_startup(self, tmpdir):
+        inputdir = str(tmpdir)
+        out, loaded, elapsed = self.run_submit(
+            ['--controlfile', 'CONTROL_EI', '--request', '1',
+             '--inputdir', inputdir, '--outputdir', inputdir,
+             '--start_date', '20120101', '--end_date', '20120101'],
+            HEAVY_MODULES)
+        assert 'PRINTING MARS_REQUESTS DONE!' in out
+        assert os.path.isfile(os.path.join(inputdir,
+                                           _config.FILE_MARS_REQUESTS))
+        assert loaded == ['']
+        assert elapsed < MAX_STARTUP_TIME
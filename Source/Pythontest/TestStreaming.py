@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import datetime
+
+import pytest
+from mock import patch
+
+from Classes.LocalServer import LocalServer, expand_values
+from Mods.checks import check_streaming, check_positive
+from Mods.errors import RetrievalError, FieldsNotAvailableError
+from Mods.streaming import split_request, _retrieve_step
+
+
+class C(object):
+    pass
+
+
+def write_fields(filename, steps, date=20200101, hour=12):
+    from eccodes import (codes_grib_new_from_samples, codes_set,
+                         codes_write, codes_release)
+
+    with open(filename, 'wb') as f:
+        for step in steps:
+            gid = codes_grib_new_from_samples('GRIB1')
+            codes_set(gid, 'localDefinitionNumber', 1)
+            codes_set(gid, 'marsType', 'fc')
+            codes_set(gid, 'indicatorOfTypeOfLevel', 1)
+            codes_set(gid, 'date', date)
+            codes_set(gid, 'time', hour * 100)
+            codes_set(gid, 'step', step)
+            codes_set(gid, 'paramId', 167)
+            codes_write(gid, f)
+            codes_release(gid)
+
+
+class TestStreaming(object):
+    """Test the streaming mode."""
+
+    def setup_method(self):
+        self.request = {'type': 'FC', 'levtype': 'SFC', 'param': '167.128',
+                        'date': '20200101', 'time': '12', 'step': '3',
+                        'number': 'OFF'}
+        self.c = C()
+        self.c.public = 0
+        self.c.stream_poll = 1
+
+    def test_expand_values(self):
+        assert expand_values('3/to/12/by/3') == ['3', '6', '9', '12']
+        assert expand_values('00/12') == ['00', '12']
+        assert expand_values('20200131/to/20200201') == ['20200131',
+                                                          '20200201']
+        assert expand_values('1/to/3') == ['1', '2', '3']
+
+    def test_split_request(self):
+        request = {'date': '20200101/to/20200102', 'time': '12',
+                   'step': '3/to/6/by/3',
+                   'target': '/tmp/FCOG_acc_SL.20200101.7.99.grb'}
+        requests = split_request(request)
+        assert [vtime for vtime, _ in requests] == \
+            [datetime(2020, 1, 1, 15), datetime(2020, 1, 1, 18),
+             datetime(2020, 1, 2, 15), datetime(2020, 1, 2, 18)]
+        assert requests[1][1]['target'] == \
+            '/tmp/FCOG_acc_SL.2020010112_006.7.99.grb'
+        assert requests[1][1]['step'] == '6'
+        assert requests[2][1]['date'] == '20200102'
+
+    def test_local_server(self, tmpdir):
+        pytest.importorskip('eccodes')
+        write_fields(str(tmpdir.join('fields.grb')), [3, 6])
+        server = LocalServer(str(tmpdir))
+
+        target = str(tmpdir.join('target.grb'))
+        self.request['step'] = '3/6'
+        server.execute(self.request, target)
+        assert os.path.getsize(target) == \
+            os.path.getsize(str(tmpdir.join('fields.grb')))
+
+        self.request['step'] = '6/9'
+        with pytest.raises(FieldsNotAvailableError):
+            server.execute(self.request, target)
+        assert not os.path.exists(target)
+
+    def test_retrieve_step(self, tmpdir):
+        pytest.importorskip('eccodes')
+        archive = tmpdir.mkdir('archive')
+        self.request['target'] = str(tmpdir.join('target.grb'))
+        server = LocalServer(str(archive))
+        tries = []
+
+        def arrive(seconds):
+            # the step becomes available after the second try
+            tries.append(seconds)
+            if len(tries) == 2:
+                write_fields(str(archive.join('fields.grb')), [3])
+
+        with patch('Mods.streaming.time.sleep', arrive):
+            target = _retrieve_step(server, self.c, self.request,
+                                    deadline=float('inf'))
+        assert tries == [1, 1]
+        assert os.path.getsize(target) > 0
+
+        self.request['step'] = '6'
+        with patch('Mods.streaming.time.sleep', arrive):
+            with pytest.raises(RetrievalError):
+                _retrieve_step(server, self.c, self.request, deadline=0)
+
+        # other errors are not repeated
+        del tries[:]
+        with patch('Mods.streaming.time.sleep', arrive):
+            with pytest.raises(RetrievalError) as e:
+                _retrieve_step(object(), self.c, self.request,
+                               deadline=float('inf'))
+        assert not isinstance(e.value, FieldsNotAvailableError)
+        assert tries == []
+
+    def test_check_streaming(self):
+        assert check_streaming(0, None, 1, 1) == 0
+        assert check_streaming(1, 0, 0, 0) == 1
+        with pytest.raises(ValueError):
+            check_streaming(1, None, 0, 0)
+        with pytest.raises(ValueError):
+            check_streaming(1, 12, 1, 0)
+        with pytest.raises(ValueError):
+            check_streaming(1, 12, 0, 1)
+        assert check_positive('60', 'STREAM_POLL') == 60
+        with pytest.raises(ValueError):
+            check_positive(0, 'STREAM_POLL')
@@ -27,7 +27,9 @@ from Mods.tools import (none_or_str, none_or_int, get_cmdline_args,
                         read_ecenv, clean_up, my_error, send_mail,
                         normal_exit, product, silent_remove,
                         init128, to_param_id, get_list_as_string, make_dir,
-                        put_file_to_ecserver, submit_job_to_ecserver)
+                        put_file_to_ecserver, submit_job_to_ecserver,
+                        run_dir, file_lock)
+from Mods.errors import FlexExtractError, ControlFileError, SubmissionError
 
 class TestTools(object):
     """Test the tools module."""
@@ -137,7 +139,7 @@ class TestTools(object):
 
     @patch('builtins.open', side_effect=[OSError(errno.EEXIST)])
     def test_fail_open_init128(self, mock_openfile):
-        with pytest.raises(SystemExit):
+        with pytest.raises(ControlFileError):
             table128 = init128(_config.PATH_GRIBTABLE)
 
     @pytest.mark.parametrize(
@@ -158,7 +160,7 @@ class TestTools(object):
     @patch('traceback.format_stack', return_value='empty trace')
     @patch('Mods.tools.send_mail', return_value=0)
     def test_success_my_error(self, mock_mail, mock_trace, capfd):
-        with pytest.raises(SystemExit):
+        with pytest.raises(FlexExtractError):
             my_error('Failed!')
             out, err = capfd.readouterr()
             assert out == "Failed!\n\nempty_trace\n"
@@ -185,9 +187,9 @@ class TestTools(object):
     @patch('subprocess.Popen', side_effect=[ValueError, OSError])
     @patch('os.path.expandvars', return_value='any_user')
     def test_fail_valueerror_send_mail(self, mock_osvar, mock_popen):
-        with pytest.raises(SystemExit): # ValueError
+        with pytest.raises(SubmissionError): # ValueError
             send_mail(['any-user'], 'ERROR', message='error mail')
-        with pytest.raises(SystemExit): # OSError
+        with pytest.raises(SubmissionError): # OSError
             send_mail(['any-user'], 'ERROR', message='error mail')
 
     def test_success_read_ecenv(self):
@@ -202,25 +204,71 @@ class TestTools(object):
 
     @patch('builtins.open', side_effect=[OSError(errno.EPERM)])
     def test_fail_read_ecenv(self, mock_open):
-        with pytest.raises(SystemExit):
+        with pytest.raises(ControlFileError):
             read_ecenv('any_file')
 
-    @patch('glob.glob', return_value=[])
     @patch('Mods.tools.silent_remove')
-    def test_empty_clean_up(self, mock_rm, mock_clean):
+    def test_empty_clean_up(self, mock_rm, tmpdir):
+        self.c.inputdir = str(tmpdir)
         clean_up(self.c)
         mock_rm.assert_not_called()
 
-    @patch('glob.glob', return_value=['any_file','EIfile'])
     @patch('os.remove', return_value=0)
-    def test_success_clean_up(self, mock_rm, mock_glob):
-
+    def test_success_clean_up(self, mock_rm, tmpdir):
+        tmpdir.join('ANOG__ML.20160410.1.2.grb').write('')
+        tmpdir.join('ANOG__ML.20160410.3.4.grb').write('')
+        tmpdir.join('any_file').write('')
+        tmpdir.join('EIfile').write('')
+        tmpdir.mkdir('run.1').join('fort.10').write('')
+        self.c.inputdir = str(tmpdir)
         self.c.prefix = 'EI'
+        self.c.ppid = '1'
         self.c.ecapi = False
         clean_up(self.c)
-        mock_rm.assert_has_calls([call('any_file')])
+        mock_rm.assert_has_calls(
+            [call(str(tmpdir.join('ANOG__ML.20160410.1.2.grb')))])
+        assert mock_rm.call_count == 1
+        assert not tmpdir.join('run.1').exists()
         mock_rm.reset_mock()
 
+    def test_run_dir(self):
+        self.c.inputdir = '/any/dir'
+        self.c.ppid = '42'
+        assert run_dir(self.c) == '/any/dir/run.42'
+
+    def test_file_lock(self, tmpdir):
+        lockfile = str(tmpdir.join('run.1.lock'))
+        with file_lock(lockfile):
+            assert os.path.isfile(lockfile)
+        with file_lock(lockfile):
+            pass
+
+    def test_removed_file_lock(self, tmpdir):
+        import threading
+        lockfile = str(tmpdir.join('run.1.lock'))
+        entered = []
+
+        def wait():
+            with file_lock(lockfile):
+                entered.append(os.path.isfile(lockfile))
+
+        # the holder removes the lock file, the waiting thread locks
+        # the new one
+        with file_lock(lockfile):
+            thread = threading.Thread(target=wait)
+            thread.start()
+            thread.join(0.2)
+            os.remove(lockfile)
+        thread.join()
+        assert entered == [True]
+
+    def test_lock_clean_up(self, tmpdir):
+        self.c.inputdir = str(tmpdir)
+        self.c.prefix = 'EI'
+        self.c.ppid = '1'
+        with file_lock(run_dir(self.c) + '.lock'):
+            clean_up(self.c)
+        assert tmpdir.listdir() == []
 
     def test_default_normal_exit(self, capfd):
         normal_exit()
@@ -253,7 +301,7 @@ class TestTools(object):
         [(1,1,(1,1))])
     def test_fail_product(self, input1, input2, output_list):
         index = 0
-        with pytest.raises(SystemExit):
+        with pytest.raises(FlexExtractError):
             for prod in product(input1, input2):
                 assert isinstance(prod, tuple)
                 assert prod == output_list[index]
@@ -308,7 +356,7 @@ class TestTools(object):
 
     @patch('subprocess.check_output', side_effect=[subprocess.CalledProcessError(1,'test')])
     def test_fail_put_file_to_ecserver(self, mock_co):
-        with pytest.raises(SystemExit):
+        with pytest.raises(SubmissionError):
             put_file_to_ecserver(self.testfilesdir, 'test_put_to_ecserver.txt',
                                  'ecgate', 'ex_ECUID', 'ex_ECGID')
 
@@ -333,7 +381,7 @@ class TestTools(object):
     @patch('subprocess.check_output', side_effect=[subprocess.CalledProcessError(1,'test'),
                                                    OSError])
     def test_fail_submit_job_to_ecserver(self, mock_co):
-        with pytest.raises(SystemExit):
+        with pytest.raises(SubmissionError):
             job_id = submit_job_to_ecserver('ecgate', 'job.ksh')
 
     @pytest.mark.msuser_pw
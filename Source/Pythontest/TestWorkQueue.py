@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+
+import pytest
+from mock import patch
+
+from . import _config_test
+from ._stubs import retrieve, prepare
+from Classes.ControlFile import ControlFile
+from Mods.errors import ControlFileError, ProcessingError
+from Mods.checks import check_work_queue
+from Mods.work_queue import (mk_units, queue_status, run_queue, _claim,
+                             _finish)
+
+
+class TestWorkQueue(object):
+    """Test the work-queue mode."""
+
+    def setup_method(self):
+        self.c = ControlFile(_config_test.PATH_TEST_DIR +
+                             '/Controls/CONTROL.test')
+        self.c.start_date = '20120101'
+        self.c.end_date = '20120105'
+        self.c.date_chunk = 3
+        self.c.job_chunk = 2
+        self.c.outputdir = '/data/output'
+
+    def run(self, ppid):
+        with patch('Mods.bounded_disk.get_mars_data', retrieve), \
+             patch('Mods.bounded_disk.prepare_flexpart', prepare):
+            return run_queue(ppid, self.c, poll=1)
+
+    def test_mk_units(self):
+        assert mk_units(self.c) == [['20120101', '20120102'],
+                                    ['20120103', '20120104'],
+                                    ['20120105', '20120105']]
+
+    def test_run_queue(self, tmpdir):
+        self.c.inputdir = str(tmpdir.mkdir('input'))
+        self.c.work_queue = str(tmpdir.join('queue'))
+
+        retrieved, outputfiles = self.run('1')
+        assert retrieved == \
+            [str(tmpdir.join('input', 'ANOG__ML.' + name))
+             for name in ['20120101.1_0', '20120103.1_1', '20120105.1_2']]
+        assert outputfiles == ['/data/output/EN20120102.1_0',
+                               '/data/output/EN20120104.1_1',
+                               '/data/output/EN20120105.1_2']
+        assert set(queue_status(self.c.work_queue).values()) == {'done'}
+        with open(tmpdir.join('queue', '20120103-20120104.done')) as f:
+            assert json.load(f)['outputfiles'] == ['EN20120104.1_1']
+
+        # a worker which comes late has nothing left to do
+        assert self.run('2') == ([], [])
+
+    def test_expired_claim(self, tmpdir):
+        self.c.inputdir = str(tmpdir.mkdir('input'))
+        self.c.work_queue = str(tmpdir.join('queue'))
+        claim = tmpdir.mkdir('queue').mkdir('20120101-20120102.claim')
+
+        assert not _claim(self.c.work_queue, '20120101-20120102', 60)
+        past = time.time() - 120
+        os.utime(str(claim), (past, past))
+        assert _claim(self.c.work_queue, '20120101-20120102', 60)
+        assert claim.join('owner').check()
+
+        # the worker waits for the claimed unit
+        _finish(self.c.work_queue, '20120101-20120102', 'done',
+                {'outputfiles': []})
+        assert not claim.check()
+
+        retrieved, _ = self.run('1')
+        assert retrieved == \
+            [str(tmpdir.join('input', 'ANOG__ML.' + name))
+             for name in ['20120103.1_1', '20120105.1_2']]
+
+    def test_failed_unit(self, tmpdir):
+        self.c.inputdir = str(tmpdir.mkdir('input'))
+        self.c.work_queue = str(tmpdir.join('queue'))
+        self.c.grid = 'fail'
+
+        with pytest.raises(ProcessingError) as e:
+            self.run('1')
+        assert str(e.value) == '... WORK UNITS FAILED: 20120103-20120104'
+        assert queue_status(self.c.work_queue) == \
+            {'20120101-20120102': 'done', '20120103-20120104': 'failed',
+             '20120105-20120105': 'done'}
+
+    def test_other_settings(self, tmpdir):
+        self.c.inputdir = str(tmpdir.mkdir('input'))
+        self.c.work_queue = str(tmpdir.join('queue'))
+        self.run('1')
+
+        # the workers may run on other nodes with other input directories
+        self.c.inputdir = str(tmpdir.mkdir('input2'))
+        self.c.etadot_workers = 8
+        self.run('2')
+
+        self.c.levelist = '1/to/10'
+        with pytest.raises(ControlFileError):
+            self.run('3')
+
+    def test_check_work_queue(self):
+        assert check_work_queue(None, 1, 1, 1, 'state') is None
+        with pytest.raises(ValueError):
+            check_work_queue('queue', 1, 0, 0, None)
+        with pytest.raises(ValueError):
+            check_work_queue('queue', 0, 1, 0, None)
+        with pytest.raises(ValueError):
+            check_work_queue('queue', 0, 0, 0, 'state')
+        assert check_work_queue('/tmp/queue', 0, 0, 0, None) == '/tmp/queue'
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import pytest
+
+from . import _config_test
+sys.path.append('../Python')
+
+from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace, parse_filename
+
+
+class TestWorkspace():
+    """Test class to test the Workspace methods."""
+
+    def setup_method(self):
+        self.testpath = os.path.join(_config_test.PATH_TEST_DIR, 'Dir')
+        self.names = ['FCOG__ML.20160410.40429.16424.grb',
+                      'FCOG__SL.20160410.40429.16424.grb',
+                      'FCSH__SL.20160410.40429.16424.grb']
+
+    def test_scan_workspace(self):
+        workspace = Workspace(self.testpath)
+        assert sorted(workspace.files) == self.names
+        assert sorted(workspace.dirs) == ['SubTestDir', 'SubTestDir2']
+
+    def test_missing_dir_workspace(self, tmpdir):
+        workspace = Workspace(str(tmpdir.join('missing')))
+        assert workspace.files == set()
+        assert workspace.select() == []
+
+    @pytest.mark.parametrize(
+        'name,parts',
+        [('FCOG_acc_SL.20160409.40429.16424.grb',
+          {'ftype': 'FC', 'grid': 'OG_acc_SL', 'date': '20160409',
+           'ppid': '40429', 'pid': '16424'}),
+         ('OG_OROLSM__SL.20160410.40429.16424.grb',
+          {'ftype': '', 'grid': 'OG_OROLSM__SL', 'date': '20160410',
+           'ppid': '40429', 'pid': '16424'}),
+         ('EN16041000', {}),
+         ('fort.15', {})])
+    def test_parse_filename(self, name, parts):
+        assert parse_filename(name) == parts
+
+    def test_select_workspace(self):
+        workspace = Workspace(self.testpath)
+        assert workspace.select('*SL*') == \
+            [os.path.join(self.testpath, n) for n in self.names[1:]]
+        assert workspace.select(grid='OG__ML', ppid=40429) == \
+            [os.path.join(self.testpath, self.names[0])]
+        assert workspace.select(ftype='AN') == []
+
+    def test_update_workspace(self, tmpdir):
+        tmpdir.join('ANOG__ML.20160410.1.2.grb').write('')
+        workspace = Workspace(str(tmpdir))
+        tmpdir.join('EN16041000').write('')
+        assert workspace.select('EN*') == []
+        workspace.add(str(tmpdir.join('EN16041000')))
+        assert workspace.select('EN*') == [str(tmpdir.join('EN16041000'))]
+        workspace.delete(ftype='AN')
+        assert not tmpdir.join('ANOG__ML.20160410.1.2.grb').exists()
+        assert workspace.select(ppid='1') == []
+
+    def test_uiofiles_workspace(self, tmpdir):
+        tmpdir.join('ANOG__ML.20160410.1.2.grb').write('')
+        tmpdir.mkdir('sub').join('ANOG__SL.20160410.1.2.grb').write('')
+        workspace = Workspace(str(tmpdir))
+        files = UioFiles(str(tmpdir), '*.grb', workspace)
+        assert files.files == [str(tmpdir.join('ANOG__ML.20160410.1.2.grb'))]
+        files.delete_files()
+        assert workspace.files == set()
+        assert UioFiles(str(tmpdir), '*.grb').files == \
+            [str(tmpdir.join('sub', 'ANOG__SL.20160410.1.2.grb'))]
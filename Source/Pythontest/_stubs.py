@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Replacements of the retrieval and the preparation for the tests of the
+modes which divide the period into several runs.'''
+
+import os
+
+from Mods.errors import ProcessingError
+
+
+def retrieve(c):
+    if not os.path.isdir(c.inputdir):
+        os.makedirs(c.inputdir)
+    return [os.path.join(c.inputdir, 'ANOG__ML.' + c.start_date + '.' +
+                         c.ppid)]
+
+
+def prepare(ppid, c):
+    # the run of the second period fails with GRID "fail"
+    if c.grid == 'fail' and c.start_date == '20120103':
+        raise ProcessingError('calc_etadot failed')
+    return [os.path.join(c.outputdir, 'EN' + c.end_date + '.' + ppid)]
@@ -11,6 +11,8 @@
 # @Call command:  ./run_cmp_test.sh <reference version> <new version>
 #    
 # @ChangeHistory: 
+#    October 2026 - flex_extract developers
+#        - compare the given versions and write a JSON report per case
 #
 # @Licence:
 #    (C) Copyright 2014-2019.
@@ -51,7 +53,7 @@ for case in $testcases; do
     continue
   fi 
   echo "Compare $case ..."
-  python test_cmp_grib_file.py -r 7.0.4/${case}/ -n 7.1/${case}/ -p '*' >> Log/log_$current_time 2>&1
+  python test_cmp_grib_file.py -r ${old_version}/${case}/ -n ${new_version}/${case}/ -p '*' -o Log/report_${case}_$current_time.json >> Log/log_$current_time 2>&1
 
   echo "===================================================================================================" >> Log/log_$current_time
 
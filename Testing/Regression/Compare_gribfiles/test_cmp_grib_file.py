@@ -2,14 +2,29 @@
 # -*- coding: utf-8 -*-
 """Comparison of resulting Grib files of two flex_extract versions.
 
+Both directories are listed once and each pair of files with the same
+name is compared by a pool of worker processes. The messages of a pair
+are read side by side in a single pass: the number of messages, the
+header keys (everything except the packed data) and the values are
+compared. For the values, the maximum absolute, the maximum relative and
+the root mean square difference of each field are determined; a field
+differs if any value deviates by more than
 
+    abs + rel * |reference value|
+
+with the absolute and relative tolerances of its parameter (shortName).
+The results are printed and, optionally, written to a JSON report.
 
 The script should be called like:
 
-    python test_cmp_grib_files.py -r <path-to-reference-files> -n <path-to-new-files>  -p <file-pattern>
+    python test_cmp_grib_file.py -r <path-to-reference-files> -n <path-to-new-files>  -p <file-pattern>
+        [-j <workers>] [-t <tolerances>] [-o <report>]
 
 Note
 ----
+The tolerances are given as comma separated list of
+<shortName>:<abs>:<rel>; the shortName "default" sets the tolerances of
+all other parameters, which are 0 otherwise.
 
 Licence:
 --------
@@ -26,6 +41,9 @@ Licence:
 Example
 -------
     python test_cmp_grib_file.py -r 7.0.4/EA5/ -n 7.1/EA5/ -p 'EA*'
+
+    python test_cmp_grib_file.py -r 7.0.4/EA5/ -n 7.1/EA5/ -p 'EA*' -j 8
+        -t 'default:0:1e-6,lsp:1e-7:0' -o Log/EA5.json
 """
 
 # ------------------------------------------------------------------------------
@@ -33,8 +51,17 @@ Example
 # ------------------------------------------------------------------------------
 import os
 import sys
-from datetime import datetime
-from eccodes import GribFile, GribMessage
+import json
+from multiprocessing import Pool
+
+# keys which are not compared in the header, since they describe the
+# packed data, which is compared by value
+DATA_KEYS = ['codedValues', 'values', 'bitmap', 'referenceValue',
+             'binaryScaleFactor', 'decimalScaleFactor', 'totalLength',
+             '7777']
+
+# keys which describe a field in the report
+FIELD_KEYS = ['shortName', 'level', 'dataDate', 'dataTime', 'stepRange']
 
 # ------------------------------------------------------------------------------
 # FUNCTION
@@ -46,18 +73,25 @@ def get_cmdline_params(parlist, debug=True):
     iref_path = '' # e.g. Reference_files
     inew_path = '' # e.g. New_files
     smatch = '' # e.g. files matching pattern
+    workers = os.cpu_count() or 1
+    tolerances = {}
+    report = None
+
+    usage = ('test_cmp_grib_file.py -r <ipref> -n <ipnew> -p <pattern> '
+             '[-j <workers>] [-t <tolerances>] [-o <report>]')
 
     try:
         opts, pars = getopt.getopt(parlist,
-                                   "hr:n:p:",
-                                   ["ipref=", "ipnew=", "pattern="])
+                                   "hr:n:p:j:t:o:",
+                                   ["ipref=", "ipnew=", "pattern=",
+                                    "workers=", "tolerances=", "report="])
     except getopt.GetoptError:
-        print('test_cmp_grib_file.py -r <ipref> -n <ipnew> -p <pattern>')
+        print(usage)
         sys.exit(2)
 
     for opt, par in opts:
         if opt == '-h':
-            print('test_cmp_grib_file.py -r <ipref> -n <ipnew> -p <pattern>')
+            print(usage)
             sys.exit()
         elif opt in ("-r", "--ipref"):
             iref_path = par
@@ -65,6 +99,12 @@ def get_cmdline_params(parlist, debug=True):
             inew_path = par
         elif opt in ("-p", "--pattern"):
             smatch = par
+        elif opt in ("-j", "--workers"):
+            workers = int(par)
+        elif opt in ("-t", "--tolerances"):
+            tolerances = parse_tolerances(par)
+        elif opt in ("-o", "--report"):
+            report = par
 
     if iref_path == '':
         sys.exit('NO REFERENCE INPUT PATH SET!')
@@ -72,14 +112,43 @@ def get_cmdline_params(parlist, debug=True):
         sys.exit('NO "NEW" COMPARISON INPUT PATH SET!')
     if smatch == '':
         sys.exit('NO MATCHING PATTERN FOR FILES SET!')
+    if workers < 1:
+        sys.exit('NUMBER OF WORKERS MUST BE AT LEAST 1!')
 
     if debug:
         print("\n\nWelcome!")
         print('Reference path is: ', iref_path)
         print('New path is: ', inew_path)
         print('Filepattern is: ', smatch)
+        print('Workers: ', workers)
+        print('Tolerances are: ', tolerances)
 
-    return iref_path, inew_path, smatch
+    return iref_path, inew_path, smatch, workers, tolerances, report
+
+def parse_tolerances(tolerances):
+    """
+        @Description:
+            Parses the absolute and relative tolerances per parameter.
+
+        @Input:
+            tolerances: string
+                Comma separated list of <shortName>:<abs>:<rel>.
+
+        @Return
+            tolerances: dict
+                The tuple of absolute and relative tolerance for each
+                shortName.
+    """
+    result = {}
+    for item in tolerances.split(','):
+        try:
+            param, atol, rtol = item.split(':')
+            result[param.strip()] = (float(atol), float(rtol))
+        except ValueError:
+            sys.exit('INVALID TOLERANCE "{}", EXPECTED <shortName>:<abs>:<rel>!'
+                     .format(item))
+
+    return result
 
 def get_files(ipath, matchingstring, debug=True):
     """
@@ -122,6 +191,8 @@ def cmp_files_list(flist1, flist2):
     length = len(flist1) == len(flist2)
     if not length:
         print('There are not the same amount of files.')
+        print('Only in reference: {}'.format(sorted(set(flist1) - set(flist2))))
+        print('Only in new: {}'.format(sorted(set(flist2) - set(flist1))))
         sys.exit('Message 1')
 
     # 2. same content?
@@ -132,139 +203,331 @@ def cmp_files_list(flist1, flist2):
 
     return True
 
+def cmp_trees(ipath_ref, ipath_new, filelist, tolerances, workers):
+    """
+        @Description:
+            Compares the files of both directories with a pool of
+            worker processes.
+
+        @Input:
+            ipath_ref: string
+                Path to the reference files.
 
-def cmp_number_messages(iref, flist1, inew, flist2):
+            ipath_new: string
+                Path to the new files.
 
-    ref_dict = {}
-    new_dict = {}
-    res_dict = {}
-    for file in flist1:
-        with GribFile(os.path.join(iref,file)) as grib:
-            ref_dict[file] = len(grib)
-        with GribFile(os.path.join(inew,file)) as grib:
-            new_dict[file] = len(grib)
+            filelist: list of strings
+                The names of the files in both directories.
 
-        res_dict[file] = ref_dict[file] == new_dict[file]
+            tolerances: dict
+                The absolute and relative tolerances per shortName.
 
-    for k, res in res_dict.items():
-        if not res == True:
-            print('LOG: Amount of messages in files {} are not the same!'.format(k))
+            workers: int
+                The number of worker processes.
 
-    return True
+        @Return
+            results: list of dict
+                The comparison of each file, in the order of filelist.
+    """
+    tasks = [(os.path.join(ipath_ref, f), os.path.join(ipath_new, f),
+              tolerances) for f in filelist]
 
+    if workers == 1 or len(tasks) < 2:
+        return [cmp_file(task) for task in tasks]
 
-def cmp_grib_msg_header(ipath_ref, ipath_new, filelist):
-    from subprocess import Popen, PIPE
-    # ref_dict = {}
-    # new_dict = {}
-    # for file in flist1:
-        # with GribFile(os.path.join(iref,file)) as grib:
-            # for i in range(len(grib)):
-                # msg = GribMessage(grib)
-                # ref_dict[file] = {}
-                # ref_dict[file][i] = [msg['shortName'],msg['level'],
-                                  # msg['editionNumber'],msg['dataDate'],
-                                  # msg['dataTime'],msg['marsClass'],
-                                  # msg['type'], msg['gridType'],
-                                  # msg['stepRange']]
-    error_flag = False
-    cmp_flag = False
-    for file in filelist:
-        try:
-            res = Popen(['grib_compare', '-H',
-                         ipath_ref + '/' + file,
-                         ipath_new + '/' + file],
-                        stdin=PIPE, stdout=PIPE, stderr=PIPE)
-            output, error = res.communicate()#.decode("utf-8"))
-            if error:
-                print('... ERROR: \n\t{}'.format(error.decode()))
-                error_flag = True
-            if output:
-                print('{}'.format(output.decode()))
-                cmp_flag = True
-        except ValueError as e:
-            print('... ERROR CODE: ' + str(e.returncode))
-            print('... ERROR MESSAGE:\n \t ' + str(res))
-            error_flag = True
-        except OSError as e:
-            print('... ERROR CODE: ' + str(e.errno))
-            print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
-            error_flag = True
-
-    if error_flag:
-        sys.exit('... ERROR IN GRIB MESSAGE COMPARISON!')
-    if cmp_flag:
-        sys.exit('... FILES HAVE DIFFERENCES IN GRIB MESSAGES!')
+    pool = Pool(min(workers, len(tasks)))
+    try:
+        results = pool.map(cmp_file, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
-    return True
+    return results
 
+def cmp_file(task):
+    """
+        @Description:
+            Compares the messages of a reference and a new file in a
+            single pass.
 
-def cmp_grib_msg_statistics(ipath_ref, ipath_new, filelist):
+        @Input:
+            task: tuple
+                The paths to the reference and the new file and the
+                tolerances per shortName.
 
-    from subprocess import Popen, PIPE
+        @Return
+            result: dict
+                The number of messages in both files, the header keys
+                which differ, the statistics of the differences of each
+                field and an error message, if the files could not be
+                read.
+    """
+    from eccodes import codes_grib_new_from_file, codes_release
 
-    error_flag = False
-    cmp_flag = False
-    for file in filelist:
-        try:
-            res = Popen(['grib_compare', '-c', 'statistics:n',
-                         ipath_ref + '/' + file,
-                         ipath_new + '/' + file],
-                        stdin=PIPE, stdout=PIPE, stderr=PIPE)
-            output, error = res.communicate()#.decode("utf-8"))
-            if error:
-                print('... ERROR: \n\t{}'.format(error.decode()))
-                error_flag = True
-            if output:
-                print('\nIn File: {}'.format(file))
-                print('{}'.format(output.decode()))
-                cmp_flag = True
-        except ValueError as e:
-            print('... ERROR CODE: ' + str(e.returncode))
-            print('... ERROR MESSAGE:\n \t ' + str(res))
-            error_flag = True
-        except OSError as e:
-            print('... ERROR CODE: ' + str(e.errno))
-            print('... ERROR MESSAGE:\n \t ' + str(e.strerror))
-            error_flag = True
-
-    if error_flag:
-        sys.exit('... ERROR IN GRIB MESSAGE COMPARISON!')
-    if cmp_flag:
-        sys.exit('... FILES HAVE DIFFERENT STATISTICS!')
-    return True
+    ref_path, new_path, tolerances = task
+    result = {'file': os.path.basename(new_path), 'messages_ref': 0,
+              'messages_new': 0, 'header': [], 'fields': [], 'error': None}
+
+    try:
+        with open(ref_path, 'rb') as fref, open(new_path, 'rb') as fnew:
+            while True:
+                gref = codes_grib_new_from_file(fref)
+                gnew = codes_grib_new_from_file(fnew)
+                if gref is None and gnew is None:
+                    break
+                if gref is not None:
+                    result['messages_ref'] += 1
+                if gnew is not None:
+                    result['messages_new'] += 1
+                if gref is not None and gnew is not None:
+                    cmp_message(gref, gnew, result['messages_new'],
+                                tolerances, result)
+                for gid in [gref, gnew]:
+                    if gid is not None:
+                        codes_release(gid)
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+def cmp_message(gref, gnew, number, tolerances, result):
+    """
+        @Description:
+            Compares the header keys and the values of a pair of
+            messages and adds the differences to the result of the file.
+
+        @Input:
+            gref: int
+                The reference message.
+
+            gnew: int
+                The new message.
+
+            number: int
+                The number of the message in the file, starting with 1.
+
+            tolerances: dict
+                The absolute and relative tolerances per shortName.
+
+            result: dict
+                The comparison of the file.
+
+        @Return
+            <nothing>
+    """
+    import numpy as np
+    from eccodes import codes_get, codes_get_values, codes_get_message
+
+    field = ' '.join(str(codes_get(gref, key)) for key in FIELD_KEYS)
+    atol, rtol = tolerances.get(codes_get(gref, 'shortName'),
+                                tolerances.get('default', (0., 0.)))
+
+    # identical messages need not be decoded
+    if codes_get_message(gref) == codes_get_message(gnew):
+        result['fields'].append({'message': number, 'field': field,
+                                 'max_abs': 0., 'max_rel': 0., 'rms': 0.,
+                                 'abs': atol, 'rel': rtol, 'ok': True})
+        return
+
+    href = get_header(gref)
+    hnew = get_header(gnew)
+    for key in sorted(set(href) | set(hnew)):
+        if href.get(key) != hnew.get(key):
+            result['header'].append({'message': number, 'field': field,
+                                     'key': key, 'ref': href.get(key),
+                                     'new': hnew.get(key)})
+
+    vref = codes_get_values(gref)
+    vnew = codes_get_values(gnew)
+    if vref.shape != vnew.shape:
+        result['fields'].append({'message': number, 'field': field,
+                                 'error': 'number of values {} != {}'
+                                          .format(vref.size, vnew.size),
+                                 'ok': False})
+        return
+
+    diff = np.abs(vnew - vref)
+    aref = np.abs(vref)
+    nonzero = aref > 0
+    result['fields'].append({
+        'message': number, 'field': field,
+        'max_abs': float(diff.max()) if diff.size else 0.,
+        'max_rel': float((diff[nonzero] / aref[nonzero]).max())
+                   if nonzero.any() else 0.,
+        'rms': float(np.sqrt(np.mean(diff ** 2))) if diff.size else 0.,
+        'abs': atol, 'rel': rtol,
+        'ok': bool(np.all(diff <= atol + rtol * aref))})
+
+    return
+
+def get_header(gid):
+    """
+        @Description:
+            Reads the coded header keys of a message, without the keys
+            of the packed data.
+
+        @Input:
+            gid: int
+                The message.
+
+        @Return
+            header: dict
+                The value of each key; arrays are given as lists.
+    """
+    from eccodes import (codes_keys_iterator_new, codes_skip_computed,
+                         codes_skip_duplicates, codes_keys_iterator_next,
+                         codes_keys_iterator_get_name,
+                         codes_keys_iterator_delete, codes_get_size,
+                         codes_get, codes_get_array)
+
+    keys = []
+    iterator = codes_keys_iterator_new(gid)
+    codes_skip_computed(iterator)
+    codes_skip_duplicates(iterator)
+    while codes_keys_iterator_next(iterator):
+        keys.append(codes_keys_iterator_get_name(iterator))
+    codes_keys_iterator_delete(iterator)
+
+    header = {}
+    for key in keys:
+        if key in DATA_KEYS or key.startswith('section'):
+            continue
+        if codes_get_size(gid, key) > 1:
+            header[key] = [v.item() if hasattr(v, 'item') else v
+                           for v in codes_get_array(gid, key)]
+        else:
+            value = codes_get(gid, key)
+            header[key] = value.item() if hasattr(value, 'item') else value
+
+    return header
+
+def print_results(results):
+    """
+        @Description:
+            Prints the differences of each file and counts them.
+
+        @Input:
+            results: list of dict
+                The comparison of each file.
+
+        @Return
+            summary: dict
+                The number of files, messages, files with errors or a
+                different number of messages, header differences and
+                fields which are not within the tolerances.
+    """
+    summary = {'files': len(results), 'messages': 0, 'errors': 0,
+               'count_differences': 0, 'header_differences': 0,
+               'field_differences': 0}
+
+    for result in results:
+        summary['messages'] += result['messages_new']
+        if result['error']:
+            print('... ERROR IN FILE {}: \n\t{}'.format(result['file'],
+                                                        result['error']))
+            summary['errors'] += 1
+        if result['messages_ref'] != result['messages_new']:
+            print('LOG: Amount of messages in files {} are not the same! '
+                  '({} != {})'.format(result['file'], result['messages_ref'],
+                                      result['messages_new']))
+            summary['count_differences'] += 1
+        for header in result['header']:
+            print('{} -- GRIB #{} -- {} -- [{}]: [{}] != [{}]'
+                  .format(result['file'], header['message'], header['field'],
+                          header['key'], header['ref'], header['new']))
+        summary['header_differences'] += len(result['header'])
+        for field in result['fields']:
+            if field['ok']:
+                continue
+            if 'error' in field:
+                print('{} -- GRIB #{} -- {} -- {}'
+                      .format(result['file'], field['message'],
+                              field['field'], field['error']))
+            else:
+                print('{} -- GRIB #{} -- {} -- max abs {:.6g} max rel {:.6g} '
+                      'rms {:.6g} (tolerance {:g} + {:g} * |ref|)'
+                      .format(result['file'], field['message'],
+                              field['field'], field['max_abs'],
+                              field['max_rel'], field['rms'], field['abs'],
+                              field['rel']))
+            summary['field_differences'] += 1
+
+    print('\nCompared {files} files with {messages} messages: {errors} errors, '
+          '{count_differences} files with different number of messages, '
+          '{header_differences} header differences, {field_differences} '
+          'fields out of tolerance'.format(**summary))
+
+    return summary
+
+def write_report(report, ipath_ref, ipath_new, tolerances, summary, results):
+    """
+        @Description:
+            Writes the comparison of all files as JSON report.
+
+        @Input:
+            report: string
+                Path to the report.
+
+            ipath_ref: string
+                Path to the reference files.
+
+            ipath_new: string
+                Path to the new files.
+
+            tolerances: dict
+                The absolute and relative tolerances per shortName.
+
+            summary: dict
+                The counts of the differences.
+
+            results: list of dict
+                The comparison of each file.
+
+        @Return
+            <nothing>
+    """
+    with open(report, 'w') as f:
+        json.dump({'reference': ipath_ref, 'new': ipath_new,
+                   'tolerances': {param: {'abs': atol, 'rel': rtol}
+                                  for param, (atol, rtol)
+                                  in tolerances.items()},
+                   'summary': summary, 'files': results}, f, indent=1)
+    print('Report written to ' + report)
+
+    return
 
 if __name__ == '__main__':
 
     # get the parameter list of program call
-    ref_path, new_path, fmatch = get_cmdline_params(sys.argv[1:])
+    ref_path, new_path, fmatch, nworkers, tols, report_path = \
+        get_cmdline_params(sys.argv[1:])
 
     # get the list of files of both cases
     ref_files = get_files(ref_path, fmatch)
     new_files = get_files(new_path, fmatch)
 
-    # flag to store successfull tests
-    suc = True
-
     # 1. Does the 2 cases contain the same list of files?
-    suc = True if suc and cmp_files_list(ref_files, new_files) else False
+    cmp_files_list(ref_files, new_files)
 
-    # 2. Does each file in both cases contain the same amount of messages?
-    suc = True if suc and cmp_number_messages(ref_path, ref_files, new_path, new_files) else False
-
-    # 3. Does each file has the same parameters (in Header)?
+    # 2. Does each file in both cases contain the same amount of messages,
+    # the same parameters (in Header) and the same values?
     # Since we can be sure that both cases have the same files,
     # we just use 1 filelist
-    suc = True if suc and cmp_grib_msg_header(ref_path, new_path, new_files) else False
+    file_results = cmp_trees(ref_path, new_path, new_files, tols, nworkers)
+    cmp_summary = print_results(file_results)
 
-    # 4. Are the statistics of each message the same?
-    # Since we can be sure that both cases have the same files,
-    # we just use 1 filelist
-    suc = True if suc and cmp_grib_msg_statistics(ref_path, new_path, new_files) else False
-
-    # If the program comes this far and flag "suc" = True,
-    # all tests were successful
-    if suc:
-        exit('GRIB_COMPARISON: SUCCESSFULL!')
-    else:
-        exit('GRIB_COMPARISON: FAILURE!')
+    if report_path:
+        write_report(report_path, ref_path, new_path, tols, cmp_summary,
+                     file_results)
+
+    if cmp_summary['errors']:
+        sys.exit('... ERROR IN GRIB MESSAGE COMPARISON!')
+    if cmp_summary['count_differences']:
+        sys.exit('... FILES HAVE DIFFERENT AMOUNT OF GRIB MESSAGES!')
+    if cmp_summary['header_differences']:
+        sys.exit('... FILES HAVE DIFFERENCES IN GRIB MESSAGES!')
+    if cmp_summary['field_differences']:
+        sys.exit('... FILES HAVE DIFFERENT VALUES!')
+
+    # If the program comes this far, all tests were successful
+    print('GRIB_COMPARISON: SUCCESSFULL!')
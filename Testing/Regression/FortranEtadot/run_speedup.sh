@@ -0,0 +1,106 @@
+#!/bin/bash
+
+# Measure the OpenMP speedup of the fast version of calc_etadot
+# can be called without arguments, then all cases are run with
+# 1 2 4 8 threads, or with the argument "omithigh" to omit the
+# high-resolution cases. The thread counts can be set with the
+# environment variable THREADS, e.g. THREADS="1 2 4" ./run_speedup.sh
+# The output for each thread count has to be identical to the output of
+# the run with 1 thread and to the reference output.
+
+# SPDX-License-Identifier: MIT-0
+
+export OMP_PLACES=cores
+testhome=`pwd`
+path1=../../../Source/Fortran/
+path=../${path1}
+exe=fast
+thisexe=calc_etadot_${exe}.out
+hash=$(git log --abbrev-commit --pretty=oneline -n 1  --pretty=format:'%h')
+csvfile='speedup_'${HOST}'.csv'
+threads=${THREADS:-"1 2 4 8"}
+TIMEFORMAT=$'real %R\nuser %U\nsys %S'
+numtest=0
+numpassed=0
+
+rm -f log.run_speedup failed_speedup
+
+if [ "$1" = omithigh ]; then # for fast testing, not for production
+  inputs=`ls Inputs |  grep -v high`
+else
+  inputs=`ls Inputs`
+fi
+for ref in $inputs; do
+
+  echo 'Working on test case =' $ref | tee -a log.run_speedup
+  real1=''
+
+  # loop over thread counts, the first one is the base of the speedup
+  for nthreads in $threads; do
+
+    numtest=$((numtest + 1))
+    export OMP_NUM_THREADS=$nthreads
+
+    rm -f Work/* # make shure that Work is empty
+    cd Work
+    echo '  Run with '${nthreads}' threads' | tee -a ../log.run_speedup
+
+    ln ../Inputs/${ref}/fort.* .
+    ( time ${path}${thisexe} ) >& log
+
+    grep -q CONGRATULATIONS log
+    if [ $? != "0" ]; then
+      echo '    missing CONGRATULATIONS. Test failed.' | tee -a ../log.run_speedup
+      echo $ref $nthreads 'FAILED' >> ${testhome}/failed_speedup
+      cd ..
+      continue
+    fi
+
+    # the output must not depend on the number of threads
+    outref='../Outputs/Output_ref_'${ref}'_'${exe}'/fort.15'
+    if [ -z "$real1" ]; then
+      cp fort.15 ../fort.15.speedup_base
+    fi
+    if cmp -s fort.15 ../fort.15.speedup_base && cmp -s fort.15 $outref; then
+      echo '    fort.15     identical to serial and reference output' \
+        | tee -a ../log.run_speedup
+      numpassed=$((numpassed + 1))
+    else
+      echo 'WARNING: fort.15 differs for '${nthreads}' threads' \
+        | tee -a ../log.run_speedup
+      echo $ref $nthreads 'FAILED' >> ${testhome}/failed_speedup
+    fi
+
+    # save runtimes and speedup relative to the first thread count
+    real=$(grep '^real' log | awk '{print $2}')
+    user=$(grep '^user' log | awk '{print $2}')
+    sys=$( grep '^sys'  log | awk '{print $2}')
+    if [ -z "$real1" ]; then real1=$real; fi
+    speedup=$(awk -v a=$real1 -v b=$real 'BEGIN {printf "%.2f", a/b}')
+    echo $hash, "'"${ref}'_'${exe}"'", ${nthreads}, ${real}, ${user}, ${sys}, \
+      ${speedup} >> ../${csvfile}
+    tail -1 ../${csvfile} >> ../log.run_speedup
+
+    cd ..
+    rm -f Work/* # this is for being more safe
+
+  done # end of thread loop
+
+  rm -f fort.15.speedup_base
+  echo # go to next reference run
+done # end of ref loop
+
+echo
+echo ' Speedup test: ' $numpassed 'out of' $numtest 'runs identical'. \
+  | tee -a log.run_speedup
+echo ' Columns: hash, case, threads, real, user, sys, speedup' \
+  | tee -a log.run_speedup
+echo ' Runtimes and speedups were added to '${csvfile}' under '$hash \
+  | tee -a log.run_speedup
+
+if [ -e failed_speedup ]; then
+  echo
+  echo Some runs failed, see file "failed_speedup":
+  echo
+  cat failed_speedup|sort -u
+fi
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Performance regression gate of flex_extract.
+
+The gate runs the regression inputs of the Fortran program (see
+FortranEtadot) and the benchmark cases of the Python code (see
+PythonBenchmark) and compares the wall-clock time and the peak resident
+set size of each case against a stored baseline of the host class.
+
+The baselines are stored in the "Baselines" directory, one JSON file per
+host class. A host class names machines with comparable performance; by
+default it is derived from the operating system, the architecture and the
+number of CPUs, it can be set with the option -H or the environment
+variable FLEX_EXTRACT_HOSTCLASS. A baseline is created or replaced with
+the option -u.
+
+A wall-clock time regresses if the median of the repetitions exceeds the
+median of the baseline by more than the threshold plus the noise of the
+measurements, which is three times the larger scaled median absolute
+deviation of the baseline and the current repetitions. A peak memory
+regresses if it exceeds the baseline by more than the memory threshold
+plus 2 MiB. The gate fails with a table of the regressed metrics.
+
+The script should be called like:
+
+    python run_perfgate.py [-u] [-H <hostclass>] [-r <repeats>]
+                           [-w <threshold>] [-m <memory threshold>]
+                           [-c <cases>] [-g <grids>] [-e <executable>]
+                           [-n] [--high]
+
+Licence:
+--------
+    (C) Copyright 2014-2020.
+
+    SPDX-License-Identifier: CC-BY-4.0
+
+    This work is licensed under the Creative Commons Attribution 4.0
+    International License. To view a copy of this license, visit
+    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+
+Example
+-------
+    python run_perfgate.py -u -H workstation
+    python run_perfgate.py -H workstation -w 0.15
+"""
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import getopt
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+PATH_GATE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(PATH_GATE, '../PythonBenchmark'))
+import run_benchmarks
+from run_benchmarks import git_revision
+
+# the directory of the baselines of the host classes
+PATH_BASELINES = os.path.join(PATH_GATE, 'Baselines')
+
+# the regression inputs and the executable of the Fortran program
+PATH_FORTRAN_INPUTS = os.path.join(PATH_GATE, '../FortranEtadot/Inputs')
+PATH_FORTRAN_EXE = os.path.join(PATH_GATE, '../../../Source/Fortran/'
+                                'calc_etadot_fast.out')
+
+# the number of scaled median absolute deviations which are taken as noise
+NOISE = 3.
+
+# the peak memory in MiB which is always tolerated
+MEMORY_SLACK = 2.
+
+# ------------------------------------------------------------------------------
+# FUNCTION
+# ------------------------------------------------------------------------------
+def get_cmdline_params(parlist):
+    '''Reads the command line parameters.
+
+    Parameters
+    ----------
+    parlist : list of str
+        The command line arguments.
+
+    Return
+    ------
+    options : dict
+        The settings of the gate.
+    '''
+    usage = ('run_perfgate.py [-u] [-H <hostclass>] [-r <repeats>] '
+             '[-w <threshold>] [-m <memory threshold>] [-c <cases>] '
+             '[-g <grids>] [-e <executable>] [-n] [--high]')
+    options = {'update': False,
+               'hostclass': os.environ.get('FLEX_EXTRACT_HOSTCLASS',
+                                           default_hostclass()),
+               'repeats': 5, 'threshold': 0.1, 'memthreshold': 0.1,
+               'cases': run_benchmarks.CASES, 'grids': [(72, 37)],
+               'levels': [8], 'timesteps': [8], 'members': [1],
+               'exe': PATH_FORTRAN_EXE, 'fortran': True, 'high': False}
+
+    try:
+        opts, _ = getopt.getopt(parlist, "huH:r:w:m:c:g:e:n",
+                                ["update", "hostclass=", "repeats=",
+                                 "threshold=", "memthreshold=", "cases=",
+                                 "grids=", "exe=", "nofortran", "high"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+
+    for opt, par in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-u", "--update"):
+            options['update'] = True
+        elif opt in ("-H", "--hostclass"):
+            options['hostclass'] = par
+        elif opt in ("-r", "--repeats"):
+            options['repeats'] = int(par)
+        elif opt in ("-w", "--threshold"):
+            options['threshold'] = float(par)
+        elif opt in ("-m", "--memthreshold"):
+            options['memthreshold'] = float(par)
+        elif opt in ("-c", "--cases"):
+            options['cases'] = par.split(',')
+        elif opt in ("-g", "--grids"):
+            options['grids'] = [tuple(int(n) for n in grid.split('x'))
+                                for grid in par.split(',')]
+        elif opt in ("-e", "--exe"):
+            options['exe'] = par
+        elif opt in ("-n", "--nofortran"):
+            options['fortran'] = False
+        elif opt == "--high":
+            options['high'] = True
+
+    unknown = [case for case in options['cases']
+               if case not in run_benchmarks.CASES]
+    if unknown:
+        sys.exit('UNKNOWN BENCHMARK CASES: ' + ', '.join(unknown))
+
+    return options
+
+def default_hostclass():
+    '''Returns the host class derived from the operating system, the
+    architecture and the number of CPUs, e.g. "linux-x86_64-8cpu".
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    hostclass : str
+        The name of the host class.
+    '''
+
+    return '{}-{}-{}cpu'.format(platform.system().lower(), platform.machine(),
+                                multiprocessing.cpu_count())
+
+def run_fortran(options):
+    '''Runs the Fortran program for each regression input and measures its
+    wall-clock time and peak resident set size.
+
+    The inputs with "high" in their name run for many minutes and are
+    only included on request.
+
+    Parameters
+    ----------
+    options : dict
+        The settings of the gate.
+
+    Return
+    ------
+    metrics : dict
+        The wall-clock times of the repetitions and the largest peak
+        resident set size per metric name.
+    '''
+    metrics = {}
+    if not options['fortran']:
+        return metrics
+    if not os.path.isdir(PATH_FORTRAN_INPUTS) or \
+       not os.path.isfile(options['exe']):
+        print('Fortran regression inputs or executable not found, '
+              'see FortranEtadot/readme.txt')
+        return metrics
+
+    env = os.environ.copy()
+    env.setdefault('OMP_NUM_THREADS', '4')
+    env.setdefault('OMP_PLACES', 'cores')
+
+    for case in sorted(os.listdir(PATH_FORTRAN_INPUTS)):
+        if 'high' in case and not options['high']:
+            continue
+        walls = []
+        rss = 0.
+        for _ in range(options['repeats']):
+            workdir = tempfile.mkdtemp(prefix='flex_extract_perfgate_')
+            try:
+                for filename in glob.glob(os.path.join(PATH_FORTRAN_INPUTS,
+                                                       case, 'fort.*')):
+                    os.symlink(os.path.abspath(filename),
+                               os.path.join(workdir,
+                                            os.path.basename(filename)))
+                wall, peak = _run_program(os.path.abspath(options['exe']),
+                                          workdir, env)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            walls.append(wall)
+            rss = max(rss, peak)
+        name = 'fortran:' + case
+        metrics[name] = {'wall': walls, 'rss_peak': rss}
+        print('{:<40} {:>12.6f} s {:>10.1f} MiB'.format(name, _median(walls),
+                                                        rss))
+
+    return metrics
+
+def run_python(options):
+    '''Runs the Python benchmark cases.
+
+    Parameters
+    ----------
+    options : dict
+        The settings of the gate.
+
+    Return
+    ------
+    metrics : dict
+        The wall-clock times of the repetitions and the peak resident set
+        size per metric name.
+    '''
+    metrics = {}
+    for result in run_benchmarks.run_benchmarks(options):
+        size = result['size']
+        name = 'python:{}:{}x{}:L{}:T{}:M{}'.format(
+            result['case'], size['ni'], size['nj'], size['levels'],
+            size['timesteps'], size['members'])
+        metrics[name] = {'wall': result['wall'],
+                         'rss_peak': result['rss_peak']}
+
+    return metrics
+
+def compare(baseline, metrics, threshold, memthreshold):
+    '''Compares the metrics against the baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        The metrics of the baseline.
+
+    metrics : dict
+        The current metrics.
+
+    threshold : float
+        The tolerated relative increase of the wall-clock time.
+
+    memthreshold : float
+        The tolerated relative increase of the peak memory.
+
+    Return
+    ------
+    rows : list of tuple
+        The name, the baseline and current value, the relative change,
+        the limit and the state of each metric and each quantity.
+
+    regressions : int
+        The number of regressed quantities and missing metrics.
+    '''
+    rows = []
+    regressions = 0
+    for name in sorted(set(baseline) | set(metrics)):
+        if name not in metrics:
+            # e.g. a renamed or failing case
+            rows.append((name, '', '', '', '', '', 'MISSING'))
+            regressions += 1
+            continue
+        if name not in baseline:
+            rows.append((name, '', '', '', '', '', 'NEW'))
+            continue
+
+        base = baseline[name]
+        current = metrics[name]
+
+        # the wall-clock time with the noise of both measurements
+        bwall = _median(base['wall'])
+        cwall = _median(current['wall'])
+        noise = NOISE * max(_mad(base['wall']), _mad(current['wall']))
+        limit = bwall * (1. + threshold) + noise
+        state = 'OK'
+        if cwall > limit:
+            state = 'REGRESSION'
+            regressions += 1
+        elif cwall < bwall * (1. - threshold) - noise:
+            state = 'FASTER'
+        rows.append((name, 'wall', '{:.4f} s'.format(bwall),
+                     '{:.4f} s'.format(cwall), _change(bwall, cwall),
+                     '{:.4f} s'.format(limit), state))
+
+        limit = base['rss_peak'] * (1. + memthreshold) + MEMORY_SLACK
+        state = 'OK'
+        if current['rss_peak'] > limit:
+            state = 'REGRESSION'
+            regressions += 1
+        rows.append((name, 'memory', '{:.1f} MiB'.format(base['rss_peak']),
+                     '{:.1f} MiB'.format(current['rss_peak']),
+                     _change(base['rss_peak'], current['rss_peak']),
+                     '{:.1f} MiB'.format(limit), state))
+
+    return rows, regressions
+
+def print_rows(rows, only_changes=False):
+    '''Prints the comparison as a table.
+
+    Parameters
+    ----------
+    rows : list of tuple
+        The rows of the comparison.
+
+    only_changes : boolean, optional
+        Decides if only the rows which are not OK are printed.
+        Default value is False.
+
+    Return
+    ------
+
+    '''
+    header = ('METRIC', '', 'BASELINE', 'CURRENT', 'CHANGE', 'LIMIT', '')
+    widths = [max(len(str(row[i])) for row in rows + [header])
+              for i in range(len(header))]
+    for row in [header] + [row for row in rows
+                           if not only_changes or row[-1] != 'OK']:
+        print('  '.join(str(value).ljust(width) if i < 2 or i == 6
+                        else str(value).rjust(width)
+                        for i, (value, width) in enumerate(zip(row, widths)))
+              .rstrip())
+
+    return
+
+def main():
+    '''Runs the cases and compares them against the baseline of the host
+    class or updates the baseline.'''
+
+    options = get_cmdline_params(sys.argv[1:])
+    path = os.path.join(PATH_BASELINES, options['hostclass'] + '.json')
+
+    print('Performance gate for host class ' + options['hostclass'])
+    if not options['update']:
+        # the baseline is checked before the cases are run
+        if not os.path.isfile(path):
+            sys.exit('NO BASELINE FOR HOST CLASS {}! CREATE IT WITH OPTION '
+                     '-u.'.format(options['hostclass']))
+        with open(path) as f:
+            baseline = json.load(f)
+
+    metrics = run_fortran(options)
+    metrics.update(run_python(options))
+
+    if options['update']:
+        if not os.path.isdir(PATH_BASELINES):
+            os.makedirs(PATH_BASELINES)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'hostclass': options['hostclass'],
+                       'host': platform.node(),
+                       'revision': git_revision(),
+                       'date': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+                       'metrics': metrics}, f, indent=1, sort_keys=True)
+        os.rename(path + '.tmp', path)
+        print('Baseline written to ' + path)
+        return
+
+    print('\nComparison with the baseline of revision {} from {}:'
+          .format(baseline['revision'], baseline['date']))
+    rows, regressions = compare(baseline['metrics'], metrics,
+                                options['threshold'], options['memthreshold'])
+    print_rows(rows)
+
+    if regressions:
+        print('\nRegressed metrics:')
+        print_rows([row for row in rows
+                    if row[-1] in ('REGRESSION', 'MISSING')])
+        sys.exit('... PERFORMANCE REGRESSION IN {} METRICS!'
+                 .format(regressions))
+    print('\nNo performance regression.')
+
+    return
+
+def _run_program(exe, workdir, env):
+    '''Runs a program and measures its wall-clock time and peak resident
+    set size.
+
+    Parameters
+    ----------
+    exe : str
+        Path of the program.
+
+    workdir : str
+        The working directory of the program.
+
+    env : dict
+        The environment of the program.
+
+    Return
+    ------
+    wall : float
+        The wall-clock time in seconds.
+
+    rss : float
+        The peak resident set size in MiB.
+    '''
+    with open(os.path.join(workdir, 'log'), 'w') as log:
+        wall = time.time()
+        proc = subprocess.Popen([exe], cwd=workdir, env=env, stdout=log,
+                                stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.time() - wall
+    proc.returncode = status
+
+    with open(os.path.join(workdir, 'log')) as log:
+        output = log.read()
+    if status != 0 or 'CONGRATULATIONS' not in output:
+        sys.exit('... FORTRAN PROGRAM FAILED:\n' + output[-2000:])
+
+    # macOS gives bytes, the other systems kilobytes
+    if sys.platform == 'darwin':
+        return wall, usage.ru_maxrss / 1024. / 1024.
+
+    return wall, usage.ru_maxrss / 1024.
+
+def _median(values):
+    '''Returns the median of a list of numbers.'''
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.
+
+def _mad(values):
+    '''Returns the median absolute deviation of a list of numbers, scaled
+    to the standard deviation of a normal distribution.'''
+    median = _median(values)
+
+    return 1.4826 * _median([abs(value - median) for value in values])
+
+def _change(old, new):
+    '''Returns the relative change of a value as percentage.'''
+    if not old:
+        return ''
+
+    return '{:+.1f}%'.format((new - old) / old * 100.)
+
+
+if __name__ == "__main__":
+    main()
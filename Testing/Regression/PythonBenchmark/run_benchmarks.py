@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmarks of the Python hot paths of flex_extract.
+
+Each benchmark case times a function of the preparation on synthetic
+GRIB data (see synthetic.py) for all combinations of the given grid
+sizes, numbers of levels, time steps and ensemble members. The dimensions
+which do not influence a case are not varied for it. Every measurement is
+repeated and the wall-clock and CPU times of all repetitions are written,
+together with the throughput of the median and the peak resident set
+size, into a JSON file. It carries
+the git revision and the host, so that the results of different versions
+can be compared.
+
+The cases are:
+
+    ia3             - disaggregation.IA3 for the time series of all points
+    dapoly, darain  - disaggregation of all points of four flux fields
+    deacc_fluxes    - EcFlexpart.deacc_fluxes without RRINT
+    prep_new_rrint  - EcFlexpart._prep_new_rrint, timed within deacc_fluxes
+    index           - GribUtil.index of the model level fields
+    set_keys        - GribUtil.set_keys of the model level fields
+    routing         - the routing loop of EcFlexpart.create
+    calc_extra_elda - EcFlexpart.calc_extra_elda
+
+The routing loop is timed with the profiling spans of create. The
+Fortran program is replaced by a script which writes an empty fort.15,
+so that its runtime and its requirements on the input fields do not
+enter the case. The runtimes of the Fortran program are measured by the
+regression tests in FortranEtadot.
+
+The script should be called like:
+
+    python run_benchmarks.py [-c <cases>] [-g <grids>] [-l <levels>]
+                             [-t <timesteps>] [-m <members>]
+                             [-r <repeats>] [-o <output>]
+
+Licence:
+--------
+    (C) Copyright 2014-2020.
+
+    SPDX-License-Identifier: CC-BY-4.0
+
+    This work is licensed under the Creative Commons Attribution 4.0
+    International License. To view a copy of this license, visit
+    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+
+Example
+-------
+    python run_benchmarks.py -g 72x37,144x73 -l 8 -t 8,16 -m 1,4 -r 5
+"""
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import io
+import os
+import sys
+import copy
+import json
+import time
+import glob
+import shutil
+import getopt
+import platform
+import tempfile
+import timeit
+import itertools
+import subprocess
+from datetime import datetime
+from contextlib import redirect_stdout
+
+from synthetic import Size, mk_control, write_inputs, write_members
+
+import _config
+from Mods import profiling
+from Mods import disaggregation
+from Classes.EcFlexpart import EcFlexpart
+from Classes.GribUtil import GribUtil
+from Classes.UioFiles import UioFiles
+from Classes.Workspace import Workspace
+
+# the dimensions of the size which influence a case
+DIMENSIONS = {
+    'ia3': ['ni', 'nj', 'timesteps'],
+    'dapoly': ['ni', 'nj'],
+    'darain': ['ni', 'nj'],
+    'deacc_fluxes': ['ni', 'nj', 'timesteps', 'members'],
+    'prep_new_rrint': ['ni', 'nj', 'timesteps', 'members'],
+    'index': ['ni', 'nj', 'levels', 'timesteps', 'members'],
+    'set_keys': ['ni', 'nj', 'levels', 'timesteps', 'members'],
+    'routing': ['ni', 'nj', 'levels', 'timesteps', 'members'],
+    'calc_extra_elda': ['ni', 'nj', 'levels', 'timesteps', 'members'],
+}
+
+CASES = ['ia3', 'dapoly', 'darain', 'deacc_fluxes', 'prep_new_rrint',
+         'index', 'set_keys', 'routing', 'calc_extra_elda']
+
+# ------------------------------------------------------------------------------
+# FUNCTION
+# ------------------------------------------------------------------------------
+def get_cmdline_params(parlist):
+    '''Reads the command line parameters.
+
+    Parameters
+    ----------
+    parlist : list of str
+        The command line arguments.
+
+    Return
+    ------
+    options : dict
+        The cases, the lists of the size dimensions, the number of
+        repetitions and the output file.
+    '''
+    usage = ('run_benchmarks.py -c <cases> -g <grids> -l <levels> '
+             '-t <timesteps> -m <members> -r <repeats> -o <output>')
+    options = {'cases': CASES, 'grids': [(72, 37)], 'levels': [8],
+               'timesteps': [8], 'members': [1], 'repeats': 3,
+               'output': 'benchmark_{}.json'.format(platform.node())}
+
+    try:
+        opts, _ = getopt.getopt(parlist, "hc:g:l:t:m:r:o:",
+                                ["cases=", "grids=", "levels=", "timesteps=",
+                                 "members=", "repeats=", "output="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+
+    for opt, par in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-c", "--cases"):
+            options['cases'] = par.split(',')
+        elif opt in ("-g", "--grids"):
+            options['grids'] = [tuple(int(n) for n in grid.split('x'))
+                                for grid in par.split(',')]
+        elif opt in ("-l", "--levels"):
+            options['levels'] = [int(n) for n in par.split(',')]
+        elif opt in ("-t", "--timesteps"):
+            options['timesteps'] = [int(n) for n in par.split(',')]
+        elif opt in ("-m", "--members"):
+            options['members'] = [int(n) for n in par.split(',')]
+        elif opt in ("-r", "--repeats"):
+            options['repeats'] = int(par)
+        elif opt in ("-o", "--output"):
+            options['output'] = par
+
+    unknown = [case for case in options['cases'] if case not in CASES]
+    if unknown:
+        sys.exit('UNKNOWN BENCHMARK CASES: ' + ', '.join(unknown))
+
+    return options
+
+def mk_sizes(case, options):
+    '''Returns the sizes of a case, varied only in its dimensions.
+
+    The other dimensions are set to their first value.
+
+    Parameters
+    ----------
+    case : str
+        Name of the benchmark case.
+
+    options : dict
+        The command line options.
+
+    Return
+    ------
+    sizes : list of Size
+        The distinct sizes of the case.
+    '''
+    sizes = []
+    for (ni, nj), levels, timesteps, members in itertools.product(
+            options['grids'], options['levels'], options['timesteps'],
+            options['members']):
+        size = Size(ni, nj, levels, timesteps, members)
+        size = size._replace(**dict(
+            (dim, value) for dim, value in zip(
+                Size._fields, (options['grids'][0][0],
+                               options['grids'][0][1],
+                               options['levels'][0],
+                               options['timesteps'][0],
+                               options['members'][0]))
+            if dim not in DIMENSIONS[case]))
+        if size not in sizes:
+            sizes.append(size)
+
+    return sizes
+
+def measure(func):
+    '''Measures the wall-clock and the CPU time of a function call.
+
+    Parameters
+    ----------
+    func : function
+        The function without arguments.
+
+    Return
+    ------
+    wall : float
+        The wall-clock time in seconds.
+
+    cpu : float
+        The CPU time of the process and its children in seconds.
+    '''
+    times = os.times()
+    wall = time.time()
+    func()
+    wall = time.time() - wall
+    now = os.times()
+
+    return wall, sum(now[i] - times[i] for i in range(4))
+
+def measure_call(func):
+    '''Measures the mean wall-clock and CPU time of a short function call,
+    which is repeated for at least 0.2 seconds.
+
+    Parameters
+    ----------
+    func : function
+        The function without arguments.
+
+    Return
+    ------
+    wall : float
+        The wall-clock time of a call in seconds.
+
+    cpu : float
+        The CPU time of a call in seconds.
+    '''
+    times = os.times()
+    number, wall = timeit.Timer(func).autorange()
+    now = os.times()
+
+    return wall / number, sum(now[i] - times[i] for i in range(4)) / number
+
+def measure_span(func, c, name):
+    '''Measures the wall-clock and the CPU time of the profiling spans of
+    a name within a function call.
+
+    Parameters
+    ----------
+    func : function
+        The function without arguments.
+
+    c : ControlFile
+        The settings of the run, the profiling summary is written into
+        its input directory.
+
+    name : str
+        The name of the spans.
+
+    Return
+    ------
+    wall : float
+        The wall-clock time in seconds.
+
+    cpu : float
+        The CPU time of the process and its children in seconds.
+    '''
+    c = copy.copy(c)
+    c.profiling = 1
+    profiling.start(c)
+    try:
+        func()
+    finally:
+        summary = profiling.finish()
+    with open(summary) as f:
+        total = json.load(f)['totals'][name]
+    os.remove(summary)
+
+    return total['wall'], total['cpu'] + total['cpu_children']
+
+def count_messages(files):
+    '''Counts the GRIB messages in files.
+
+    Parameters
+    ----------
+    files : list of str
+        Paths of the GRIB files.
+
+    Return
+    ------
+    messages : int
+        The number of messages.
+    '''
+    from eccodes import codes_count_in_file
+
+    messages = 0
+    for filename in files:
+        with open(filename, 'rb') as f:
+            messages += codes_count_in_file(f)
+
+    return messages
+
+def mk_inputs(size, workdir, cache, **settings):
+    '''Returns the ControlFile of a size with the synthetic input files,
+    which are written once for all cases.
+
+    Parameters
+    ----------
+    size : Size
+        The size of the case.
+
+    workdir : str
+        Path to the working directory of the benchmarks.
+
+    cache : dict
+        The ControlFiles of the sizes and settings whose input files
+        are written.
+
+    settings : dict, optional
+        Further CONTROL parameters.
+
+    Return
+    ------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+    '''
+    key = (size, tuple(sorted(settings.items())))
+    if key not in cache:
+        inputdir = os.path.join(workdir, 'input{}'.format(len(cache)))
+        cache[key] = mk_control(size, inputdir, **settings)
+        write_inputs(cache[key])
+
+    return copy.copy(cache[key])
+
+def mk_scratch(c, workdir):
+    '''Returns a copy of a ControlFile with an empty input directory for
+    the temporary files, as in the preparation.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    workdir : str
+        Path to the working directory of the benchmarks.
+
+    Return
+    ------
+    cr : ControlFile
+        The settings with the scratch directory as input directory.
+    '''
+    cr = copy.copy(c)
+    cr.inputdir = os.path.join(workdir, 'scratch')
+    if os.path.exists(cr.inputdir):
+        shutil.rmtree(cr.inputdir)
+    os.makedirs(cr.inputdir)
+
+    return cr
+
+def fluxfiles(c):
+    '''Returns the accumulated flux files of an extraction.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    Return
+    ------
+    files : UioFiles
+        The flux files.
+    '''
+
+    return UioFiles(c.inputdir, '*OG_acc_SL*.' + str(c.ppid) + '.*')
+
+# The benchmark cases bench_<case>(size, workdir, cache) prepare the data
+# of a size and return a function which runs a single measurement and
+# returns its wall-clock and CPU time, the number of processed items and
+# their unit.
+
+def bench_ia3(size, workdir, cache):
+    '''Disaggregates the precipitation time series of all points.'''
+    import numpy as np
+
+    series = np.random.RandomState(0).rand(size.ni * size.nj,
+                                           size.timesteps + 1)
+
+    def run():
+        for values in series:
+            disaggregation.IA3(values)
+
+    return lambda: measure(run), size.ni * size.nj, 'series'
+
+def bench_dapoly(size, workdir, cache, func=disaggregation.dapoly):
+    '''Disaggregates four flux fields of all points.'''
+    import numpy as np
+
+    fields = list(np.random.RandomState(0).rand(4, size.ni * size.nj))
+
+    return (lambda: measure_call(lambda: func(fields)), size.ni * size.nj,
+            'points')
+
+def bench_darain(size, workdir, cache):
+    '''Disaggregates four precipitation fields of all points.'''
+
+    return bench_dapoly(size, workdir, cache, disaggregation.darain)
+
+def bench_deacc_fluxes(size, workdir, cache):
+    '''Deaccumulates and disaggregates the flux fields.'''
+    c = mk_inputs(size, workdir, cache, rrint=0)
+    inputfiles = fluxfiles(c)
+
+    def run():
+        cr = mk_scratch(c, workdir)
+        return measure(lambda: EcFlexpart(cr, fluxes=True).deacc_fluxes(
+            inputfiles, cr))
+
+    return run, count_messages(inputfiles.files), 'messages'
+
+def bench_prep_new_rrint(size, workdir, cache):
+    '''Disaggregates the precipitation with the new method.'''
+    c = mk_inputs(size, workdir, cache, rrint=1)
+    inputfiles = fluxfiles(c)
+
+    def run():
+        cr = mk_scratch(c, workdir)
+        return measure_span(lambda: EcFlexpart(cr, fluxes=True).deacc_fluxes(
+            inputfiles, cr), cr, 'rrint')
+
+    return run, size.ni * size.nj * size.members, 'series'
+
+def bench_index(size, workdir, cache):
+    '''Indexes the model level fields by date, time and step.'''
+    from eccodes import codes_index_release
+
+    c = mk_inputs(size, workdir, cache)
+    files = glob.glob(os.path.join(c.inputdir, '*OG__ML.*'))
+    indexfile = os.path.join(workdir, 'bench.idx')
+
+    def index():
+        codes_index_release(GribUtil(files).index(
+            ['date', 'time', 'step'], indexfile))
+
+    def run():
+        if os.path.exists(indexfile):
+            os.remove(indexfile)
+        return measure(index)
+
+    return run, count_messages(files), 'messages'
+
+def bench_set_keys(size, workdir, cache):
+    '''Copies the model level fields with a changed key.'''
+    c = mk_inputs(size, workdir, cache)
+    files = glob.glob(os.path.join(c.inputdir, '*OG__ML.*'))
+    grib = GribUtil(os.path.join(workdir, 'bench.grb'))
+
+    def run():
+        return measure(lambda: grib.set_keys(files[0], keynames=['level'],
+                                             keyvalues=[1]))
+
+    return run, count_messages(files[:1]), 'messages'
+
+def bench_routing(size, workdir, cache):
+    '''Routes the fields of all time steps into the fort.* files.'''
+    c = mk_inputs(size, workdir, cache, rrint=0)
+    c.exedir = os.path.join(workdir, 'exe')
+    if not os.path.exists(c.exedir):
+        os.makedirs(c.exedir)
+        exe = os.path.join(c.exedir, _config.FORTRAN_EXECUTABLE)
+        with open(exe, 'w') as f:
+            f.write('#!/bin/sh\n: > fort.15\n')
+        os.chmod(exe, 0o755)
+
+    cr = mk_scratch(c, workdir)
+    EcFlexpart(cr, fluxes=True).deacc_fluxes(fluxfiles(c), cr)
+    inputfiles = UioFiles(c.inputdir, '????__??.*' + str(c.ppid) + '.*',
+                          Workspace(c.inputdir))
+
+    def run():
+        flexpart = EcFlexpart(cr, fluxes=False)
+        flexpart.write_namelist(cr)
+        return measure_span(lambda: flexpart.create(inputfiles, cr), cr,
+                            'routing')
+
+    return run, count_messages(inputfiles.files), 'messages'
+
+def bench_calc_extra_elda(size, workdir, cache):
+    '''Doubles the ensemble members of the ELDA stream.'''
+    path = os.path.join(workdir, 'elda_' + '_'.join(str(n) for n in size))
+    if not os.path.exists(path):
+        os.makedirs(path)
+    files = write_members(path, 'BM', size)
+
+    def run():
+        for name in glob.glob(os.path.join(path, 'BM*')):
+            if os.path.basename(name) not in files:
+                os.remove(name)
+        # only the member numbers and the output files are needed
+        flexpart = EcFlexpart.__new__(EcFlexpart)
+        flexpart.number = '0/to/{}'.format(size.members)
+        flexpart.outputfilelist = list(files)
+        flexpart.checkpoint = None
+        flexpart.manifest = {name: {'valid_time': '20' + name[2:10],
+                                    'member': int(name[-3:])}
+                             for name in files}
+        return measure(lambda: flexpart.calc_extra_elda(path, 'BM'))
+
+    return run, size.timesteps * size.members * (size.levels + 3), 'messages'
+
+def run_case(case, size, repeats, workdir, cache):
+    '''Runs a benchmark case for a size.
+
+    Parameters
+    ----------
+    case : str
+        Name of the benchmark case.
+
+    size : Size
+        The size of the case.
+
+    repeats : int
+        Number of repetitions of the measurement.
+
+    workdir : str
+        Path to the working directory of the benchmarks.
+
+    cache : dict
+        The ControlFiles of the sizes and settings whose input files
+        are written.
+
+    Return
+    ------
+    result : dict
+        The times of the repetitions, their minimum and median, the
+        throughput of the median in items per second and the peak
+        resident set size of the process in MiB during the repetitions.
+    '''
+    run, items, unit = globals()['bench_' + case](size, workdir, cache)
+
+    walls = []
+    cpus = []
+    rss = 0.
+    for _ in range(repeats):
+        profiling.reset_rss_peak()
+        wall, cpu = run()
+        walls.append(wall)
+        cpus.append(cpu)
+        rss = max(rss, profiling.rss_peak())
+
+    median = sorted(walls)[len(walls) // 2]
+
+    return {'case': case, 'size': dict(zip(Size._fields, size)),
+            'items': items, 'unit': unit, 'wall': walls, 'cpu': cpus,
+            'wall_min': min(walls), 'wall_median': median,
+            'throughput': items / median if median > 0 else None,
+            'rss_peak': rss}
+
+def git_revision():
+    '''Returns the abbreviated hash of the current git revision.
+
+    Parameters
+    ----------
+
+    Return
+    ------
+    revision : str
+        The hash or None outside a git repository.
+    '''
+    try:
+        return subprocess.check_output(
+            ['git', 'log', '-n', '1', '--pretty=format:%h'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(options):
+    '''Runs the benchmark cases for all their sizes.
+
+    Parameters
+    ----------
+    options : dict
+        The cases, the lists of the size dimensions and the number of
+        repetitions, as from the command line.
+
+    Return
+    ------
+    results : list of dict
+        The results of the cases for each size.
+    '''
+    results = []
+    workdir = tempfile.mkdtemp(prefix='flex_extract_benchmark_')
+    cache = {}
+    try:
+        for case in options['cases']:
+            for size in mk_sizes(case, options):
+                # the progress messages of flex_extract are dropped
+                with redirect_stdout(io.StringIO()):
+                    result = run_case(case, size, options['repeats'],
+                                      workdir, cache)
+                results.append(result)
+                print('{:<16} {:>5}x{:<5} L{:<4} T{:<4} M{:<4} '
+                      '{:>12.6f} s {:>14.1f} {}/s'
+                      .format(case, size.ni, size.nj, size.levels,
+                              size.timesteps, size.members,
+                              result['wall_median'],
+                              result['throughput'] or 0., result['unit']))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+def main():
+    '''Runs the benchmark cases and writes the results.'''
+
+    options = get_cmdline_params(sys.argv[1:])
+
+    results = run_benchmarks(options)
+
+    output = {'version': _config._VERSION_STR, 'revision': git_revision(),
+              'host': platform.node(), 'machine': platform.machine(),
+              'python': platform.python_version(),
+              'date': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+              'repeats': options['repeats'], 'results': results}
+    with open(options['output'], 'w') as f:
+        json.dump(output, f, indent=1, sort_keys=True)
+    print('Results written to ' + options['output'])
+
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Generators of synthetic GRIB data for the benchmarks of the Python code.
+
+The input files of a run are written as the MARS retrieval would write
+them: the requests are collected from EcFlexpart for a CONTROL setting
+which is derived from the size of the case, and each requested field is
+written with random values. Thus the files have the names, the
+parameters and the date, time and step combinations which the
+preparation expects, while the grid, the number of levels, time steps
+and ensemble members can be chosen freely.
+
+The values are reproducible. Accumulated fields are sums of positive
+increments per hour of the forecast, so that the deaccumulated fluxes
+are positive.
+
+Licence:
+--------
+    (C) Copyright 2014-2020.
+
+    SPDX-License-Identifier: CC-BY-4.0
+
+    This work is licensed under the Creative Commons Attribution 4.0
+    International License. To view a copy of this license, visit
+    http://creativecommons.org/licenses/by/4.0/ or send a letter to
+    Creative Commons, PO Box 1866, Mountain View, CA 94042, USA.
+
+Example
+-------
+    >>> from synthetic import Size, mk_control, write_inputs
+    >>> c = mk_control(Size(72, 37, 8, 8, 1), '/tmp/bench/input')
+    >>> write_inputs(c)
+"""
+
+# ------------------------------------------------------------------------------
+# MODULES
+# ------------------------------------------------------------------------------
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '../../../Source/Python'))
+from Mods.api import make_control
+from Mods.get_mars_data import mk_dates
+from Classes.EcFlexpart import EcFlexpart
+from Classes.LocalServer import expand_values
+
+# the grid spacing of the synthetic fields in degrees
+GRID = 0.25
+
+# the number of time steps per day with DTIME 3
+STEPS_PER_DAY = 8
+
+# the spectral truncation of the fields which are retrieved without grid
+RESOL = 63
+
+# the size of a benchmark case: grid points in zonal and meridional
+# direction, model levels, time steps and ensemble members
+Size = namedtuple('Size', ['ni', 'nj', 'levels', 'timesteps', 'members'])
+
+# ------------------------------------------------------------------------------
+# FUNCTION
+# ------------------------------------------------------------------------------
+def mk_control(size, inputdir, **settings):
+    '''Creates the checked ControlFile for the synthetic data of a size.
+
+    Two forecasts per day with 3-hourly steps are extracted, as in
+    CONTROL_OD.OPER.FC.twiceaday.3hourly. With more than one member the
+    perturbed forecasts of the ENFO stream are extracted.
+
+    Parameters
+    ----------
+    size : Size
+        The size of the case.
+
+    inputdir : str
+        Path to the directory of the input files.
+
+    settings : dict, optional
+        Further CONTROL parameters, e.g. "rrint".
+
+    Return
+    ------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+    '''
+    days = max(1, -(-size.timesteps // STEPS_PER_DAY))
+    start = datetime(2020, 1, 1)
+    end = start + timedelta(days=days - 1)
+
+    control = {'class': 'OD', 'stream': 'OPER', 'type': ['FC'] * 8,
+               'time': ['00'] * 4 + ['12'] * 4,
+               'step': ['00', '03', '06', '09'] * 2,
+               'dtime': '3', 'maxstep': '12', 'acctype': 'FC',
+               'acctime': '00/12', 'accmaxstep': '12',
+               'start_date': start.strftime('%Y%m%d'),
+               'end_date': end.strftime('%Y%m%d'),
+               'grid': str(GRID), 'left': '0.',
+               'right': str((size.ni - 1) * GRID), 'lower': '0.',
+               'upper': str((size.nj - 1) * GRID),
+               'level': '137',
+               'levelist': '{}/to/137'.format(138 - size.levels),
+               'resol': str(RESOL), 'prefix': 'BM',
+               'inputdir': inputdir, 'outputdir': inputdir}
+    if size.members > 1:
+        control.update({'stream': 'ENFO', 'type': ['PF'] * 8,
+                        'acctype': 'PF',
+                        'number': '1/to/{}'.format(size.members)})
+    control.update(settings)
+
+    return make_control(control)
+
+def mk_requests(c):
+    '''Collects the MARS requests of an extraction without retrieving them.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    Return
+    ------
+    requests : list of dict
+        The parameters of the MARS requests.
+    '''
+    requests = []
+    for fluxes in [True, False]:
+        start, end, _ = mk_dates(c, fluxes)
+        EcFlexpart(c, fluxes).retrieve(None, start.strftime('%Y%m%d') +
+                                       '/to/' + end.strftime('%Y%m%d'),
+                                       c.public, None, c.inputdir,
+                                       requests=requests)
+
+    return requests
+
+def write_inputs(c):
+    '''Writes the synthetic fields of all MARS requests of an extraction.
+
+    Parameters
+    ----------
+    c : ControlFile
+        Contains all the parameters of the extraction.
+
+    Return
+    ------
+    files : list of str
+        Paths of the written files.
+    '''
+    if not os.path.exists(c.inputdir):
+        os.makedirs(c.inputdir)
+
+    files = []
+    for request in mk_requests(c):
+        write_request(request, request['target'])
+        files.append(request['target'])
+
+    return files
+
+def write_request(request, target):
+    '''Writes the fields of a MARS request with random values.
+
+    Fields without grid are written as spherical harmonics with the
+    truncation RESOL, the others on the regular grid of the request.
+
+    Parameters
+    ----------
+    request : dict
+        The parameters of the MARS request.
+
+    target : str
+        Path of the GRIB file.
+
+    Return
+    ------
+
+    '''
+    import numpy as np
+    from eccodes import (codes_grib_new_from_samples, codes_set,
+                         codes_set_values, codes_get_size, codes_write,
+                         codes_release)
+
+    spectral = str(request['grid']).upper() == 'OFF'
+    numbers = [None]
+    if str(request.get('number', 'OFF')).upper() != 'OFF':
+        numbers = [int(n) for n in expand_values(request['number'])]
+    levtype = str(request['levtype']).upper()
+    levels = [int(l) for l in expand_values(request['levelist'])]
+    if levtype == 'SFC':
+        levels = [0]
+
+    accumulated = '_acc_' in os.path.basename(target)
+
+    random = np.random.RandomState(0)
+    with open(target, 'wb') as f:
+        for number in numbers:
+            for date in expand_values(request['date']):
+                for ftime in expand_values(request['time']):
+                    for step in expand_values(request['step']):
+                        for param in expand_values(request['param']):
+                            for level in levels:
+                                if spectral:
+                                    gid = codes_grib_new_from_samples(
+                                        'sh_ml_grib1')
+                                    _set_spectral(gid)
+                                else:
+                                    gid = codes_grib_new_from_samples(
+                                        'GRIB1')
+                                    _set_grid(gid, request)
+                                codes_set(gid, 'localDefinitionNumber', 1)
+                                codes_set(gid, 'marsType',
+                                          str(request['type']).lower())
+                                if number is not None:
+                                    codes_set(gid, 'number', number)
+                                codes_set(gid, 'indicatorOfTypeOfLevel',
+                                          1 if levtype == 'SFC' else 109)
+                                codes_set(gid, 'level', level)
+                                codes_set(gid, 'paramId',
+                                          int(param.split('.')[0]))
+                                codes_set(gid, 'date', int(date))
+                                codes_set(gid, 'time', int(ftime) * 100
+                                          if int(ftime) < 100
+                                          else int(ftime))
+                                codes_set(gid, 'step', int(step))
+                                size = codes_get_size(gid, 'values')
+                                if accumulated:
+                                    values = _accumulate(size, int(step))
+                                else:
+                                    values = random.rand(size)
+                                codes_set_values(gid, values)
+                                codes_write(gid, f)
+                                codes_release(gid)
+
+    return
+
+def write_members(path, prefix, size):
+    '''Writes FLEXPART input files of the control forecast and the
+    ensemble members for the doubling of the ELDA members.
+
+    The files are named <prefix>YYMMDDHH.N<member> and have a field for
+    each level and a few surface fields.
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory of the files.
+
+    prefix : str
+        The prefix of the file names.
+
+    size : Size
+        The size of the case.
+
+    Return
+    ------
+    files : list of str
+        Names of the written files.
+    '''
+    import numpy as np
+    from eccodes import (codes_grib_new_from_samples, codes_set,
+                         codes_set_values, codes_write, codes_release)
+
+    request = {'grid': '{0}/{0}'.format(GRID),
+               'area': '{}/0./0./{}'.format((size.nj - 1) * GRID,
+                                           (size.ni - 1) * GRID)}
+    random = np.random.RandomState(0)
+    start = datetime(2020, 1, 1)
+
+    files = []
+    for step in range(size.timesteps):
+        vtime = start + timedelta(hours=3 * step)
+        for number in range(size.members + 1):
+            name = '{}{}.N{:0>3}'.format(prefix, vtime.strftime('%y%m%d%H'),
+                                         number)
+            with open(os.path.join(path, name), 'wb') as f:
+                for param, level in [(130, l) for l in range(size.levels)] + \
+                                    [(134, 0), (167, 0), (228, 0)]:
+                    gid = codes_grib_new_from_samples('GRIB1')
+                    _set_grid(gid, request)
+                    codes_set(gid, 'localDefinitionNumber', 1)
+                    codes_set(gid, 'marsType', 'pf' if number else 'cf')
+                    codes_set(gid, 'number', number)
+                    codes_set(gid, 'indicatorOfTypeOfLevel',
+                              109 if level else 1)
+                    codes_set(gid, 'level', level)
+                    codes_set(gid, 'paramId', param)
+                    codes_set(gid, 'date', int(vtime.strftime('%Y%m%d')))
+                    codes_set(gid, 'time', vtime.hour * 100)
+                    codes_set_values(gid, random.rand(size.ni * size.nj))
+                    codes_write(gid, f)
+                    codes_release(gid)
+            files.append(name)
+
+    return files
+
+def _set_grid(gid, request):
+    '''Sets the regular latitude/longitude grid of a request.
+
+    Parameters
+    ----------
+    gid : int
+        The GRIB message.
+
+    request : dict
+        The parameters of the MARS request, with the grid and the area
+        north/west/south/east.
+
+    Return
+    ------
+
+    '''
+    from eccodes import codes_set
+
+    dx, dy = [float(d) for d in str(request['grid']).split('/')]
+    north, west, south, east = [float(a) for a in request['area'].split('/')]
+
+    codes_set(gid, 'Ni', int(round((east - west) / dx)) + 1)
+    codes_set(gid, 'Nj', int(round((north - south) / dy)) + 1)
+    codes_set(gid, 'latitudeOfFirstGridPointInDegrees', north)
+    codes_set(gid, 'longitudeOfFirstGridPointInDegrees', west)
+    codes_set(gid, 'latitudeOfLastGridPointInDegrees', south)
+    codes_set(gid, 'longitudeOfLastGridPointInDegrees', east)
+    codes_set(gid, 'iDirectionIncrementInDegrees', dx)
+    codes_set(gid, 'jDirectionIncrementInDegrees', dy)
+
+    return
+
+def _accumulate(size, step):
+    '''Returns the values of an accumulated field.
+
+    Parameters
+    ----------
+    size : int
+        The number of values.
+
+    step : int
+        The forecast step in hours.
+
+    Return
+    ------
+    values : numpy array of float
+        The sum of a random increment for each hour of the forecast.
+    '''
+    import numpy as np
+
+    random = np.random.RandomState(0)
+    values = np.zeros(size)
+    for _ in range(step):
+        values += random.rand(size)
+
+    return values
+
+def _set_spectral(gid):
+    '''Sets the truncation of a field of spherical harmonics.
+
+    Parameters
+    ----------
+    gid : int
+        The GRIB message.
+
+    Return
+    ------
+
+    '''
+    from eccodes import codes_set
+
+    for key in ['J', 'K', 'M']:
+        codes_set(gid, 'pentagonalResolutionParameter' + key, RESOL)
+
+    return